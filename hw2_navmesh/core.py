@@ -16,7 +16,7 @@
  * limitations under the License.
 '''
 
-import sys, pygame, math, numpy, random, time, copy
+import sys, pygame, math, numpy, random, time, copy, os, hashlib, collections, csv, json, atexit, struct, zlib, types
 from pygame.locals import * 
 
 from constants import *
@@ -53,6 +53,7 @@ class Mover(pygame.sprite.Sprite, Thing):
 	### rect: the rectangle
 	### image: the image, rotated to orientation
 	### originalImage: the image un-rotated
+	### imageName: the file the image was loaded from (rotations are looked up in the image cache by name)
 	### orientation: direction agent is facing in degrees (0 = to the right)
 	### speed: how fast the agent moves (horizontal, vertical)
 	### maxradius: the worst-case scenario for the bounding circle, accounting for rotation changing the dimensions of the agent's bounding box.
@@ -63,6 +64,7 @@ class Mover(pygame.sprite.Sprite, Thing):
 	
 	def __init__(self, image, position, orientation, speed, world):
 		pygame.sprite.Sprite.__init__(self) # call sprite initializer
+		self.imageName = image
 		self.image, self.rect = load_image(image, -1)
 		self.originalImage = self.image.copy()
 		self.orientation = orientation
@@ -100,8 +102,7 @@ class Mover(pygame.sprite.Sprite, Thing):
 			#unwind
 			angle = 360+angle
 		self.orientation = angle
-		rot_img = pygame.transform.rotate(self.originalImage, self.orientation)
-		img_rect = rot_img.get_rect()
+		rot_img, img_rect = load_rotated_image(self.imageName, -1, self.orientation)
 		img_rect.center = self.position
 		self.image = rot_img
 		self.rect = img_rect
@@ -180,6 +181,7 @@ class Bullet(Mover):
 		
 	### Update the agent every tick. Primarily does movement
 	def update(self, delta):
+		start = self.world.profiler.begin()
 		Mover.update(self, delta)
 		unwound = self.orientation
 		if unwound < 0:
@@ -189,6 +191,7 @@ class Bullet(Mover):
 		next = [m*n for m,n in zip(normalizedDirection,self.speed)]
 		self.distanceTraveled = self.distanceTraveled + distance((0,0), next)
 		self.move(next)
+		self.world.profiler.end('bullets', start)
 		return None
 
 	def collision(self, thing):
@@ -247,7 +250,8 @@ class Agent(Mover):
 	def update(self, delta):
 		Mover.update(self, delta)
 		if self.moveTarget is not None:
-			drawCross(self.world.background, self.moveTarget, (0, 0, 0), 5)
+			if not self.world.headless:
+				drawCross(self.world.background, self.moveTarget, (0, 0, 0), 5)
 			direction = [m - n for m,n in zip(self.moveTarget,self.position)]
 			# Figure out distance to moveTarget
 #			mag = reduce(lambda x, y: (x**2)+(y**2), direction)**0.5 
@@ -268,10 +272,14 @@ class Agent(Mover):
 					next = targetDistance
 				self.distanceTraveled = self.distanceTraveled + distance((0,0), next)
 				self.move(next)
+				start = self.world.profiler.begin()
 				self.navigator.update(delta)
+				self.world.profiler.end('navigatorUpdate', start)
 				# Check for shortcut
 				if self.navigator != None:
+					start = self.world.profiler.begin()
 					self.navigator.smooth()
+					self.world.profiler.end('smooth', start)
 		if self.canfire == False:
 			self.firetimer = self.firetimer + 1
 			if self.firetimer >= self.firerate:
@@ -309,7 +317,9 @@ class Agent(Mover):
 
 	def navigateTo(self, pos):
 		if self.navigator != None:
+			start = self.world.profiler.begin()
 			self.navigator.computePath(self.position, pos)
+			self.world.profiler.end('computePath', start)
 
 	### Shoot the gun. Return the bullet that was spawned, or None.
 	def shoot(self):
@@ -537,11 +547,46 @@ class PathNetworkNavigator(Navigator):
 
 	### pathnodes: the path nodes
 	### pathnetwork: the edges between path nodes
+	### request: the path request the navigator is waiting on (see requestPath()), or None
 
 	def __init__(self):
 		Navigator.__init__(self)
 		self.pathnodes = None
 		self.pathnetwork = None
+		self.request = None
+
+	### Asks the world for the path from pathnode start to pathnode end on graph (see GameWorld.requestPath()), and calls
+	### done(path) when it comes, unless the navigator has made another request or dropped this one (request = None) by
+	### then. If the answer is deferred to a later tick, the agent stands still until it comes.
+	def requestPath(self, graph, start, end, tables, done):
+		request = object()
+		self.request = request
+		def answer(path):
+			if self.request is request:
+				self.request = None
+				done(path)
+		self.world.requestPath(graph, start, end, self.world.getGates(), tables, answer)
+		if self.request is request:
+			self.agent.stopMoving()
+
+	### Called when the agent gets to a node in the path. If a gate has closed across the way to the next node, replan.
+	def checkpoint(self):
+		if self.agent.moveTarget is not None and self.destination is not None:
+			if rayTraceWorld(self.agent.getLocation(), self.agent.moveTarget, self.world.getSegmentGrid(False)) != None:
+				self.computePath(self.agent.getLocation(), self.destination)
+		return None
+
+	### Returns True if the agent can get from p1 to p2 in a straight line without its body touching an obstacle (or a
+	### gate): one test against the world's lines grown by the agent's radius.
+	def clearShot(self, p1, p2):
+		return self.world.getInflatedLines(self.agent.getMaxRadius()).clear(p1, p2)
+
+	### Returns the closest pathnode that the agent can get to from location without collision, or None. Only the few
+	### pathnodes nearest to location are tested (see PathNodeTable).
+	def getOnPathNetwork(self, location):
+		if not self.pathnodes:
+			return None
+		return self.world.getPathNodeTable(self.pathnodes, self.agent.getMaxRadius()).closest(location)
 
 	def drawPathNetwork(self, surface):
 		if self.pathnetwork is not None:
@@ -558,18 +603,35 @@ class NavMeshNavigator(PathNetworkNavigator):
 	### pathnodes: the path nodes
 	### pathnetwork: the edges between path nodes
 	### navmesh: the polygons making up the nav mesh
+	### meshIndex: point location over the navmesh polygons (NavMeshIndex)
+	### polygon: the id of the navmesh polygon the agent was in at the last update (None if off the mesh)
 	
 	def __init__(self):
 		PathNetworkNavigator.__init__(self)
 		self.navmesh = None
+		self.meshIndex = None
+		self.polygon = None
 	
 	### Set the world object
 	### self: the navigator object
 	### world: the world object
 	def setWorld(self, world):
 		Navigator.setWorld(self, world)
-		# Create the path network
-		self.createPathNetwork(world)
+		# Create the path network, or load it from the world's map bundle if it has been built before
+		bundle = world.mapBundle
+		builder = self.createPathNetwork
+		if bundle is not None and bundle.has('navmesh/nodes', builder) and bundle.has('navmesh/edges', builder) and bundle.has('navmesh/polygons', builder):
+			self.pathnodes = bundle.load('navmesh/nodes', 'points')
+			self.pathnetwork = bundle.load('navmesh/edges', 'lines')
+			self.navmesh = bundle.load('navmesh/polygons', 'polygons')
+		else:
+			self.createPathNetwork(world)
+			if bundle is not None and self.pathnodes is not None and self.pathnetwork is not None and self.navmesh is not None:
+				bundle.put('navmesh/nodes', 'points', self.pathnodes, builder)
+				bundle.put('navmesh/edges', 'lines', self.pathnetwork, builder)
+				bundle.put('navmesh/polygons', 'polygons', self.navmesh, builder)
+		self.meshIndex = NavMeshIndex(self.navmesh) if self.navmesh is not None else None
+		self.polygon = None
 		# Draw the world
 		self.drawNavMesh(self.world.debug)
 		self.drawPathNetwork(self.world.debug)
@@ -580,6 +642,47 @@ class NavMeshNavigator(PathNetworkNavigator):
 	def createPathNetwork(self, world):
 		return None
 
+	### Finds the shortest path from the source to the destination through the navmesh. The path is pulled taut through
+	### the corridor of polygons between them (see NavMeshIndex.findPath), so it needs no ray casting.
+	### self: the navigator object
+	### source: the place the agent is starting from (i.e., its current location)
+	### dest: the place the agent is told to go to
+	def computePath(self, source, dest):
+		self.setPath(None)
+		if self.agent != None and self.world != None and self.meshIndex is not None:
+			self.source = source
+			self.destination = dest
+			path = self.meshIndex.findPath(source, dest, self.agent.getMaxRadius())
+			if path is not None:
+				# Drop the source and destination; doneMoving() goes to the destination when the path runs out
+				self.setPath(path[1:-1])
+				if len(self.path) > 0:
+					first = self.path.pop(0)
+					self.agent.moveToTarget(first)
+				else:
+					self.agent.moveToTarget(dest)
+		return None
+
+	### Returns the id (index into navmesh) of the navmesh polygon containing point, or None.
+	def locate(self, point):
+		if self.meshIndex is None:
+			return None
+		return self.meshIndex.locate(point)
+
+	### Keeps track of the polygon the agent is in and calls polygonChanged() when the agent moves into another one.
+	def update(self, delta):
+		if self.agent is not None and self.meshIndex is not None:
+			polygon = self.meshIndex.locate(self.agent.getLocation())
+			if polygon != self.polygon:
+				previous = self.polygon
+				self.polygon = polygon
+				self.polygonChanged(previous, polygon)
+		return None
+
+	### Called when the agent moves from one navmesh polygon to another (either may be None: off the mesh).
+	def polygonChanged(self, previous, current):
+		return None
+
 	def drawNavMesh(self, surface):
 		if self.navmesh is not None:
 			for p in self.navmesh:
@@ -660,8 +763,7 @@ class Decoration(pygame.sprite.Sprite):
 		self.image, self.rect = load_image(image, -1)
 		## Translate to initial position
 		self.rect = self.rect.move(position)
-		rot_img = pygame.transform.rotate(self.image, orientation)
-		img_rect = rot_img.get_rect()
+		rot_img, img_rect = load_rotated_image(image, -1, orientation)
 		img_rect.center = self.rect.center
 		self.image = rot_img
 		self.rect = img_rect
@@ -696,7 +798,8 @@ class RandomObstacle(Obstacle):
 			points.append(((int(math.cos(rad)*dist)+radius), int((math.sin(rad)*dist)+radius)))
 		# Create surface
 		s = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA, 32)
-		s = s.convert_alpha()
+		if pygame.display.get_surface() is not None:
+			s = s.convert_alpha()
 		# Draw polygon on surface
 		pygame.draw.lines(s, color, True, points, linewidth)
 		# translate points to absolute space
@@ -748,7 +851,8 @@ class ManualObstacle(Obstacle):
 		maxpt = ( max(map(lambda p: p[0], points)), max(map(lambda p: p[1], points)) )
 		# create surface
 		s = pygame.Surface((maxpt[0]+linewidth, maxpt[1]+linewidth), pygame.SRCALPHA, 32)
-		s = s.convert_alpha()
+		if pygame.display.get_surface() is not None:
+			s = s.convert_alpha()
 		pygame.draw.lines(s, color, True, points, linewidth)
 		self.surface = s
 		self.rect = s.get_rect()
@@ -786,6 +890,409 @@ class ManualObstacle(Obstacle):
 		Obstacle.draw(self, parent)
 		self.sprites.draw(self.surface)
 
+############################
+### PathScheduler
+###
+### World-level queue of path requests. A request is a generator made by one of the PathGraph *Steps methods; the
+### scheduler advances the oldest request until the per-tick budget is spent, so that a wave of requests (e.g., a Base
+### spawning its minions) is spread over several ticks instead of stalling one. Identical requests in flight share one
+### search, and every requester gets the result through its callback.
+
+class PathScheduler(object):
+
+	### jobs: the requests in flight, oldest first, as [key, steps, callbacks]
+	### waiting: the requests in flight by key, so that identical requests can be coalesced
+	### budget: microseconds of searching per update(), or None to finish every request as soon as it is submitted
+	### completed: number of searches finished
+	### coalesced: number of requests that joined a search already in flight
+
+	def __init__(self, budget = None):
+		self.jobs = []
+		self.waiting = {}
+		self.budget = budget
+		self.completed = 0
+		self.coalesced = 0
+
+	def setBudget(self, budget):
+		self.budget = budget
+		if budget is None:
+			self.flush()
+
+	### Queues steps under key, unless an identical request is already in flight. callback(result) is called with the
+	### value the generator returns.
+	def submit(self, key, steps, callback):
+		job = self.waiting.get(key)
+		if job is not None:
+			job[2].append(callback)
+			self.coalesced = self.coalesced + 1
+			return None
+		job = [key, steps, [callback]]
+		if self.budget is None:
+			self.finish(job, finishSteps(steps))
+		else:
+			self.waiting[key] = job
+			self.jobs.append(job)
+		return None
+
+	### Number of requests in flight
+	def pending(self):
+		return len(self.jobs)
+
+	### Advances the requests in flight, oldest first, until the budget is spent. At least one step is taken per call so
+	### that a small budget still makes progress.
+	def update(self):
+		if len(self.jobs) == 0:
+			return None
+		if self.budget is None:
+			return self.flush()
+		deadline = time.perf_counter() + self.budget / 1000000.0
+		while len(self.jobs) > 0:
+			job = self.jobs[0]
+			try:
+				next(job[1])
+			except StopIteration as stop:
+				self.jobs.pop(0)
+				del self.waiting[job[0]]
+				self.finish(job, stop.value)
+			if time.perf_counter() >= deadline:
+				break
+		return None
+
+	### Finishes every request in flight
+	def flush(self):
+		while len(self.jobs) > 0:
+			job = self.jobs.pop(0)
+			del self.waiting[job[0]]
+			self.finish(job, finishSteps(job[1]))
+		return None
+
+	def finish(self, job, result):
+		self.completed = self.completed + 1
+		for callback in job[2]:
+			callback(result)
+
+############################
+### TickProfiler
+###
+### Times the phases of every tick: the run loop's handleEvents, update, sprites and draw, and the work they do for the
+### world and its agents (worldCollisionTest, pathScheduler, getVisible, bullets, the navigator's computePath, smooth and
+### navigatorUpdate, and the FSM/behavior tree execute). Instrumented code brackets a phase with begin() and end(); while
+### the profiler is disabled begin() returns None and end() does nothing, so profiling costs next to nothing when off.
+### Phases nest: time spent in worldCollisionTest is also counted in update, and time spent in computePath is counted in
+### whatever phase asked for the path. The totals of the last PROFILERTICKS ticks are kept in a ring buffer for the
+### overlay (see GameWorld.drawProfile()) and for export.
+
+PROFILERTICKS = 600
+
+class TickProfiler(object):
+
+	### enabled: True if phases are being timed
+	### current: {phase: [seconds, calls]} for the tick in progress
+	### history: (tick, {phase: [seconds, calls]}) for the last PROFILERTICKS ticks, oldest first
+	### totals: {phase: [seconds, calls]} over every tick profiled
+	### ticks: number of ticks profiled
+
+	def __init__(self, ticks = PROFILERTICKS):
+		self.enabled = False
+		self.current = {}
+		self.history = collections.deque(maxlen = ticks)
+		self.totals = {}
+		self.ticks = 0
+
+	def setEnabled(self, enabled):
+		self.enabled = enabled
+		self.current = {}
+
+	### Returns the start time of a phase, or None if the profiler is disabled
+	def begin(self):
+		if self.enabled:
+			return time.perf_counter()
+		return None
+
+	### Charges the time since start (from begin()) and one call to phase
+	def end(self, phase, start):
+		if start is not None:
+			elapsed = time.perf_counter() - start
+			counter = self.current.get(phase)
+			if counter is None:
+				self.current[phase] = [elapsed, 1]
+			else:
+				counter[0] = counter[0] + elapsed
+				counter[1] = counter[1] + 1
+
+	### Called by the world at the end of every tick: moves the counters of the tick into the ring buffer
+	def endTick(self, tick):
+		if self.enabled:
+			for phase, (seconds, calls) in self.current.items():
+				total = self.totals.setdefault(phase, [0.0, 0])
+				total[0] = total[0] + seconds
+				total[1] = total[1] + calls
+			self.history.append((tick, self.current))
+			self.ticks = self.ticks + 1
+			self.current = {}
+
+	### Returns [(phase, milliseconds per tick, calls per tick)] over the last n ticks in the ring buffer (or over every
+	### tick profiled if n is None), slowest phase first
+	def summary(self, n = None):
+		if n is None:
+			counters = self.totals
+			ticks = self.ticks
+		else:
+			counters = {}
+			recent = list(self.history)[-n:]
+			for tick, phases in recent:
+				for phase, (seconds, calls) in phases.items():
+					counter = counters.setdefault(phase, [0.0, 0])
+					counter[0] = counter[0] + seconds
+					counter[1] = counter[1] + calls
+			ticks = len(recent)
+		if ticks == 0:
+			return []
+		rows = [(phase, seconds*1000.0/ticks, calls/float(ticks)) for phase, (seconds, calls) in counters.items()]
+		rows.sort(key = lambda row: row[1], reverse = True)
+		return rows
+
+	### Writes the ring buffer as CSV, one row per tick and phase: tick, phase, milliseconds, calls
+	def exportCSV(self, filename):
+		with open(filename, 'w', newline = '') as f:
+			out = csv.writer(f)
+			out.writerow(['tick', 'phase', 'milliseconds', 'calls'])
+			for tick, phases in self.history:
+				for phase in sorted(phases):
+					seconds, calls = phases[phase]
+					out.writerow([tick, phase, '%.4f' % (seconds*1000.0), calls])
+
+	### Writes the per tick averages over every tick profiled, and the ring buffer, as JSON
+	def exportJSON(self, filename):
+		data = {'ticks': self.ticks,
+				'summary': [{'phase': phase, 'milliseconds': ms, 'calls': calls} for phase, ms, calls in self.summary()],
+				'history': [{'tick': tick, 'phases': {phase: [seconds*1000.0, calls] for phase, (seconds, calls) in phases.items()}} for tick, phases in self.history]}
+		with open(filename, 'w') as f:
+			json.dump(data, f)
+
+	### Writes prefix.csv and prefix.json
+	def export(self, prefix):
+		self.exportCSV(prefix + '.csv')
+		self.exportJSON(prefix + '.json')
+
+############################
+### Match logs
+###
+### A match is reproduced from its seeds (corerandom's seed and the wall clock time that seeds random), the delta of
+### every tick, the events handled on every tick (with the mouse position they were handled at), and is checked against
+### the NPCs spawned. MatchRecorder writes them to a log as the match is played; MatchReplay reads the log back and
+### re-runs the same ticks headless, as fast as possible (see runreplay.py). The next GameWorld made after recordMatch()
+### or replayMatch() attaches to the log; worlds made after that don't.
+###
+### Log format: MATCHLOGMAGIC, then a 4 byte length and a JSON header (script, argv, seed, time), then a stream of records,
+### each a type byte followed by its fields (little endian):
+###   MATCHLOGTICK:  delta (uint16 milliseconds); starts a tick, everything up to the next one happens during it
+###   MATCHLOGKEY:   key (int32), mouse x, mouse y (int16)
+###   MATCHLOGMOUSE: button (uint8), mouse x, mouse y (int16)
+###   MATCHLOGSPAWN: crc32 of the class name (uint32), x, y (float32); spawns before the first tick are the setup
+###   MATCHLOGQUIT:  no fields; the window was closed, which ends the match partway through the tick
+### A tick with no events costs 3 bytes.
+###
+### NOTE: ticks are only reproduced exactly with no path budget (see GameWorld.setPathBudget()), since a budget makes
+### path answers depend on how fast the machine is.
+
+MATCHLOGMAGIC = b'MLOG\x01'
+MATCHLOGTICK = 0
+MATCHLOGKEY = 1
+MATCHLOGMOUSE = 2
+MATCHLOGSPAWN = 3
+MATCHLOGQUIT = 4
+MATCHLOGFIELDS = {MATCHLOGTICK: struct.Struct('<H'), MATCHLOGKEY: struct.Struct('<ihh'), MATCHLOGMOUSE: struct.Struct('<Bhh'), MATCHLOGSPAWN: struct.Struct('<Iff'), MATCHLOGQUIT: struct.Struct('<')}
+
+### The log that the next GameWorld attaches to, see recordMatch() and replayMatch()
+match_log = None
+
+### Records the next GameWorld's match to filename. script and argv are stored so that runreplay.py can run it again.
+def recordMatch(filename, script = None, argv = []):
+	global match_log
+	match_log = MatchRecorder(filename, script, argv)
+	return match_log
+
+### Replays the match recorded in filename on the next GameWorld
+def replayMatch(filename):
+	global match_log
+	match_log = MatchReplay(filename)
+	return match_log
+
+def spawnRecord(npc):
+	x, y = npc.getLocation()
+	return zlib.crc32(type(npc).__name__.encode()), x, y
+
+
+class MatchRecorder(object):
+
+	### filename: where the log is written
+	### header: the JSON header, filled in when a world attaches
+	### file: the open log, or None
+	### world: the world being recorded
+
+	def __init__(self, filename, script = None, argv = []):
+		self.filename = filename
+		self.header = {'script': script, 'argv': list(argv)}
+		self.file = None
+		self.world = None
+
+	### Called by GameWorld.__init__(): notes the seeds and starts the log. Returns the seed, time and headless flag the
+	### world should use.
+	def attach(self, world, seed, now, headless):
+		global match_log
+		match_log = None
+		self.world = world
+		self.header['seed'] = seed
+		self.header['time'] = now
+		header = json.dumps(self.header).encode()
+		self.file = open(self.filename, 'wb')
+		self.file.write(MATCHLOGMAGIC + struct.pack('<I', len(header)) + header)
+		atexit.register(self.close)
+		return seed, now, headless
+
+	def write(self, kind, *fields):
+		if self.file is not None:
+			self.file.write(bytes((kind,)) + MATCHLOGFIELDS[kind].pack(*fields))
+
+	def startTick(self, delta):
+		self.write(MATCHLOGTICK, min(max(int(delta), 0), 65535))
+
+	### Returns pygame's events, logging the ones handleEvents() acts on
+	def getEvents(self):
+		events = pygame.event.get()
+		for event in events:
+			if event.type == QUIT:
+				self.write(MATCHLOGQUIT)
+			elif event.type == KEYDOWN:
+				x, y = pygame.mouse.get_pos()
+				self.write(MATCHLOGKEY, event.key, x, y)
+			elif event.type == MOUSEBUTTONUP:
+				x, y = pygame.mouse.get_pos()
+				self.write(MATCHLOGMOUSE, event.button, x, y)
+		return events
+
+	def getMousePosition(self):
+		return pygame.mouse.get_pos()
+
+	def spawn(self, npc):
+		self.write(MATCHLOGSPAWN, *spawnRecord(npc))
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+
+class MatchReplay(object):
+
+	### header: the JSON header of the log (script, argv, seed, time)
+	### setup: the spawns recorded before the first tick, as spawnRecord() tuples
+	### ticks: (delta, events, spawns) for every recorded tick; events are (type, key or button, (x, y)), where a QUIT
+	### event ends the replay
+	### tick: index of the tick being replayed, -1 during setup
+	### mouse: the mouse position of the event being handled
+	### spawned: the spawns seen so far in the current tick (or setup)
+	### divergence: (tick, recorded spawn, replayed spawn) for the first spawn that didn't match, or None
+	### world: the world the match is replayed on
+
+	def __init__(self, filename):
+		with open(filename, 'rb') as f:
+			data = f.read()
+		if not data.startswith(MATCHLOGMAGIC):
+			raise ValueError(filename + " is not a match log")
+		offset = len(MATCHLOGMAGIC)
+		size, = struct.unpack_from('<I', data, offset)
+		offset = offset + 4
+		self.header = json.loads(data[offset:offset+size].decode())
+		offset = offset + size
+		self.setup = []
+		self.ticks = []
+		spawns = self.setup
+		while offset < len(data):
+			kind = data[offset]
+			fields = MATCHLOGFIELDS[kind].unpack_from(data, offset + 1)
+			offset = offset + 1 + MATCHLOGFIELDS[kind].size
+			if kind == MATCHLOGTICK:
+				spawns = []
+				self.ticks.append((fields[0], [], spawns))
+			elif kind == MATCHLOGKEY:
+				self.ticks[-1][1].append((KEYDOWN, fields[0], fields[1:]))
+			elif kind == MATCHLOGMOUSE:
+				self.ticks[-1][1].append((MOUSEBUTTONUP, fields[0], fields[1:]))
+			elif kind == MATCHLOGSPAWN:
+				spawns.append(fields)
+			elif kind == MATCHLOGQUIT:
+				self.ticks[-1][1].append((QUIT, None, (0, 0)))
+		self.tick = -1
+		self.mouse = (0, 0)
+		self.spawned = 0
+		self.divergence = None
+		self.world = None
+
+	### Called by GameWorld.__init__(): the world gets the recorded seeds, and is headless
+	def attach(self, world, seed, now, headless):
+		global match_log
+		match_log = None
+		self.world = world
+		return self.header['seed'], self.header['time'], True
+
+	### The replay sets the delta itself, see play()
+	def startTick(self, delta):
+		return None
+
+	### Returns the events recorded for the current tick, setting the mouse position as each one is handled
+	def getEvents(self):
+		if self.tick >= 0:
+			for type, code, mouse in self.ticks[self.tick][1]:
+				self.mouse = mouse
+				if type == KEYDOWN:
+					yield pygame.event.Event(type, key = code)
+				elif type == MOUSEBUTTONUP:
+					yield pygame.event.Event(type, button = code, pos = mouse)
+				else:
+					yield pygame.event.Event(type)
+
+	def getMousePosition(self):
+		return self.mouse
+
+	### Checks a spawn against the log. Spawns are compared in order within a tick; positions are stored as float32.
+	def spawn(self, npc):
+		recorded = self.setup if self.tick < 0 else self.ticks[self.tick][2]
+		replayed = spawnRecord(npc)
+		expected = recorded[self.spawned] if self.spawned < len(recorded) else None
+		self.spawned = self.spawned + 1
+		if self.divergence is None:
+			if expected is None or expected[0] != replayed[0] or distance(expected[1:], replayed[1:]) > 0.01:
+				self.divergence = (self.tick, expected, replayed)
+
+	### Runs the recorded ticks on the world as fast as possible, the way the run loop would (without drawing), up to the
+	### end of the log or the recorded QUIT. Returns the wall time taken, in seconds.
+	def play(self):
+		world = self.world
+		if world.sprites is None:
+			world.initializeSprites()
+		self.checkSpawned()
+		start = time.perf_counter()
+		for self.tick in range(len(self.ticks)):
+			self.spawned = 0
+			try:
+				world.runTick(self.ticks[self.tick][0])
+			except SystemExit:
+				# handleEvents() got the QUIT
+				break
+			world.profiler.endTick(world.ticks)
+			world.ticks = world.ticks + 1
+			self.checkSpawned()
+		return time.perf_counter() - start
+
+	### Notes a divergence if the current tick (or setup) had fewer spawns than were recorded
+	def checkSpawned(self):
+		recorded = self.setup if self.tick < 0 else self.ticks[self.tick][2]
+		if self.divergence is None and self.spawned < len(recorded):
+			self.divergence = (self.tick, recorded[self.spawned], None)
+
+
 ############################
 ### GameWorld
 
@@ -805,28 +1312,44 @@ class GameWorld():
 	### movers: all things that can collide with other things and implement collision()
 	### destinations: places that are not inside of obstacles. 
 	### clock: elapsed time in game
-
-	def __init__(self, seed, worlddimensions, screendimensions):
+	### ticks: number of updates run so far
+	### headless: no display, no rendering; the world is advanced with step(), runUntil() or run(ticks, until)
+	### pathScheduler: the path requests in flight, see requestPath()
+	### profiler: per tick timing of the world's phases, see setProfiling()
+	### showProfile: draw the profiler's numbers on the screen ('p' toggles)
+	### matchLog: the MatchRecorder or MatchReplay the world is attached to, or None
+
+	def __init__(self, seed, worlddimensions, screendimensions, headless = False):
 		#initialize random seed
 		self.time = time.time()
+		self.matchLog = match_log
+		if self.matchLog is not None:
+			seed, self.time, headless = self.matchLog.attach(self, seed, self.time, headless)
 		corerandom.seed(seed or self.time)
 		random.seed(self.time)
 		#initialize Pygame and set up screen and background surface
 		pygame.init()
-		self.font = pygame.font.SysFont("monospace", 15)
-		screen = pygame.display.set_mode(screendimensions)
-		# Background surface that will hold everything
-#		background = pygame.Surface(screen.get_size())
-		background = pygame.Surface(worlddimensions)
-		background = background.convert()
-		background.fill((255, 255, 255))
-		# Debug surface
-		debug = pygame.Surface(worlddimensions)
-		debug = debug.convert()
-		debug.fill((255, 255, 255))
-		background.blit(debug, (0, 0))
-		screen.blit(background, (0, 0))
-		pygame.display.flip()
+		if headless:
+			# Nothing is ever presented, so 1x1 surfaces are enough to absorb (and clip away) any debug drawing
+			self.font = None
+			screen = None
+			background = pygame.Surface((1, 1))
+			debug = pygame.Surface((1, 1))
+		else:
+			self.font = pygame.font.SysFont("monospace", 15)
+			screen = pygame.display.set_mode(screendimensions)
+			# Background surface that will hold everything
+#			background = pygame.Surface(screen.get_size())
+			background = pygame.Surface(worlddimensions)
+			background = background.convert()
+			background.fill((255, 255, 255))
+			# Debug surface
+			debug = pygame.Surface(worlddimensions)
+			debug = debug.convert()
+			debug.fill((255, 255, 255))
+			background.blit(debug, (0, 0))
+			screen.blit(background, (0, 0))
+			pygame.display.flip()
 		#store stuff
 		self.screen = screen
 		self.seed = seed or self.time
@@ -844,10 +1367,25 @@ class GameWorld():
 		self.debugging = False
 		self.movers = []
 		self.clock = 0
+		self.ticks = 0
+		self.headless = headless
+		# bumped whenever the terrain (or the gates) change, see getVersion()
+		self.version = 0
+		# immutable views of the terrain built for the current version, see getView()
+		self.views = {}
+		# line of sight between movers, see getSight()
+		self.sight = None
 		# camera
 		self.camera = [0, 0]
 		# unobstructed places
 		self.destinations = {}
+		# navigation artifacts saved on disk, see setMapBundle()
+		self.mapBundle = None
+		# path searches, run as they are requested until setPathBudget() is called
+		self.pathScheduler = PathScheduler()
+		# phase timings, off until setProfiling() is called
+		self.profiler = TickProfiler()
+		self.showProfile = False
 	
 	def getPoints(self):
 		return self.points
@@ -855,13 +1393,85 @@ class GameWorld():
 	def getLines(self):
 		return self.lines
 	
+	### A counter that changes whenever getLines()/getPoints() would return something different. Callers can key their
+	### own caches of world geometry on it.
+	def getVersion(self):
+		return self.version
+
+	### Call after changing the terrain (or the gates) so that cached views get rebuilt.
+	def terrainChanged(self):
+		self.version = self.version + 1
+		self.views = {}
+
+	### Returns the view stored under key, calling make() to build it if the world has changed since it was last built.
+	### Views are shared, so they should be immutable (tuples, read-only arrays, SegmentGrids).
+	def getView(self, key, make):
+		self.getVersion()
+		if key not in self.views:
+			self.views[key] = make()
+		return self.views[key]
+
+	### Returns a SegmentGrid over getLines() (or getLinesWithoutBorders() if borders is False) that can be handed to rayTraceWorld
+	### in place of the lines. The grid is built once and rebuilt only when the terrain or the gates change.
+	def getSegmentGrid(self, borders = True):
+		return self.getView(('segmentGrid', borders), lambda: SegmentGrid(self.getLines() if borders else self.getLinesWithoutBorders()))
+
+	### Returns getLinesWithoutBorders() grown by radius (InflatedLines), so that clearance for an agent of that radius is a
+	### single ray test. Built once per radius and rebuilt only when the terrain or the gates change.
+	def getInflatedLines(self, radius):
+		return self.getView(('inflatedLines', radius), lambda: InflatedLines(self.getLinesWithoutBorders(), radius))
+
+	### Returns the PathNodeTable that snaps points to the given path nodes for agents of the given radius. Built once per
+	### set of path nodes and radius, and rebuilt when the terrain or the gates change.
+	def getPathNodeTable(self, pathnodes, radius):
+		return self.getView(('pathNodeTable', tuple(pathnodes), radius), lambda: PathNodeTable(pathnodes, self.getInflatedLines(radius), self.dimensions))
+
+	### Returns the DistanceField of the world (signed distance to the nearest of getLines(), negative inside obstacles)
+	### with samples every resolution pixels. Built once per resolution and rebuilt when the terrain or the gates change.
+	def getDistanceField(self, resolution = DISTANCEFIELDRESOLUTION):
+		return self.getView(('distanceField', resolution), lambda: DistanceField(self.dimensions, self.getLines(), [o.getPoints() for o in self.obstacles], resolution))
+
+	### True if point is inside an obstacle
+	def insideObstacle(self, point):
+		return self.getDistanceField().isInside(point)
+
+	### getLines() as a read-only (n, 2, 2) float array, for the batch ray tracers
+	def getLineArray(self):
+		def make():
+			lines = numpy.array(self.getLines(), dtype = float).reshape(-1, 2, 2)
+			lines.setflags(write = False)
+			return lines
+		return self.getView('lineArray', make)
+
+	### Limits the time spent on path searches to budget microseconds per tick; searches that don't fit are resumed on the
+	### next tick. None (the default) runs every search to the end when it is requested.
+	def setPathBudget(self, budget):
+		self.pathScheduler.setBudget(budget)
+
+	### Turns the tick profiler on or off. If export is given, the profile is written to export.csv and export.json
+	### when the program exits (see TickProfiler.export()).
+	def setProfiling(self, enabled, export = None):
+		self.profiler.setEnabled(enabled)
+		if export is not None:
+			atexit.register(self.profiler.export, export)
+
+	### Asks for the path from pathnode start to pathnode end on graph (a PathGraph) with the gates up, using the shortest
+	### path tables if tables is True. callback(path) is called with a list of pathnodes (empty if there is no path)
+	### right away if there is no path budget, or from a later update() otherwise. Identical requests made before the
+	### first one is answered share its search.
+	def requestPath(self, graph, start, end, gates, tables, callback):
+		gates = tuple(gates)
+		self.pathScheduler.submit((id(graph), start, end, gates, tables), graph.cachedPathSteps(start, end, gates, tables), lambda result: callback(list(result[0])))
+
+	### Worlds without gates have none
+	def getGates(self):
+		return []
+
 	def getLinesWithoutBorders(self):
-		corners = [(0, 0), (self.dimensions[0], 0), (self.dimensions[0], self.dimensions[1]), (0, self.dimensions[1])]
-		lines = []
-		for l in self.getLines():
-			if not (l[0] in corners and l[1] in corners):
-				lines.append(l)
-		return lines
+		def make():
+			corners = set([(0, 0), (self.dimensions[0], 0), (self.dimensions[0], self.dimensions[1]), (0, self.dimensions[1])])
+			return tuple(l for l in self.getLines() if not (tuple(l[0]) in corners and tuple(l[1]) in corners))
+		return self.getView('linesWithoutBorders', make)
 
 	
 	def getObstacles(self):
@@ -898,6 +1508,7 @@ class GameWorld():
 		self.obstacles = obstacles
 		self.points = points
 		self.lines = lines 
+		self.terrainChanged()
 		
 	# Make Terrain
 	# polys = list of list points (poly1, poly2, ...) = ((p11, p12, ...), (p21, p22, ...), ...)
@@ -917,6 +1528,7 @@ class GameWorld():
 		self.obstacles = obstacles
 		self.points = points
 		self.lines = lines
+		self.terrainChanged()
 
 
 	def initializeResources(self, points, resource = RESOURCE):
@@ -930,18 +1542,15 @@ class GameWorld():
 			pos = (0, 0)
 			while True:
 				pos = (corerandom.randint(0, self.dimensions[0]), corerandom.randint(0, self.dimensions[1]))
-				inside = False
-				for o in self.obstacles:
-					if pointInsidePolygonPoints(pos, o.getPoints()):
-						inside = True
-				if inside == False:
+				if not self.insideObstacle(pos):
 					break
 			r = SimpleResource(resource, pos, 0, self)
 			self.addResource(r)
 #			self.resources.add(r)
 #			self.movers.add(r)
 
-	def run(self):
+	### Put the player agent and all movers into the sprite group that gets updated every tick
+	def initializeSprites(self):
 		self.sprites = pygame.sprite.RenderPlain((self.agent))
 #		for r in self.resources:
 #			self.sprites.add(r)
@@ -949,6 +1558,53 @@ class GameWorld():
 #			self.sprites.add(n)
 		for m in self.movers:
 			self.sprites.add(m)
+
+	### Advance the world n ticks as fast as possible, with a fixed delta (milliseconds) per tick.
+	### No events are handled and nothing is drawn.
+	def step(self, n = 1, delta = 1000//TICK):
+		if self.sprites is None:
+			self.initializeSprites()
+		for _ in range(n):
+			if self.matchLog is not None:
+				self.matchLog.startTick(delta)
+			start = self.profiler.begin()
+			self.update(delta)
+			self.profiler.end('update', start)
+			start = self.profiler.begin()
+			self.sprites.update(delta)
+			self.profiler.end('sprites', start)
+			self.profiler.endTick(self.ticks)
+			self.ticks = self.ticks + 1
+
+	### run() for a headless world: steps the world until until(world) is true or ticks ticks have run, whichever comes
+	### first. At least one of them must be given. Returns True if until was satisfied.
+	def runHeadless(self, ticks = None, until = None):
+		if ticks is None and until is None:
+			raise ValueError("a headless world never ends: give run() ticks or until, or use step() or runUntil()")
+		if until is None:
+			self.step(ticks)
+			return False
+		if ticks is None:
+			while not until(self):
+				self.step()
+			return True
+		return self.runUntil(until, ticks)
+
+	### Step the world until predicate(world) is true or maxTicks ticks have run.
+	### Returns True if the predicate was satisfied.
+	def runUntil(self, predicate, maxTicks, delta = 1000//TICK):
+		for _ in range(maxTicks):
+			if predicate(self):
+				return True
+			self.step(1, delta)
+		return predicate(self)
+
+	### Runs the game loop, which only ends when the window is closed. Headless (see runHeadless()) there is no window, so
+	### the world is stepped until until(world) is true or ticks ticks have run, and run() returns.
+	def run(self, ticks = None, until = None):
+		if self.headless:
+			return self.runHeadless(ticks, until)
+		self.initializeSprites()
 		clock = pygame.time.Clock()
 		
 		# Draw obstacles. Only need to do this once
@@ -958,16 +1614,32 @@ class GameWorld():
 		while True:
 			clock.tick(TICK)
 			delta = clock.get_rawtime()
-			self.handleEvents()
-			self.update(delta)
-			self.sprites.update(delta) 
+			self.runTick(delta)
 			#print("obstacles")
 			#for o in self.obstacles:
 			#	print(o.pos)
 			#	o.pos[0] = o.pos[0] + 1.0
 			#	o.pos[1] = o.pos[1] + 1.0
+			start = self.profiler.begin()
 			self.drawWorld()
 			pygame.display.flip()
+			self.profiler.end('draw', start)
+			self.profiler.endTick(self.ticks)
+			self.ticks = self.ticks + 1
+
+	### The run loop's work for one tick, short of drawing: handle events, update the world, update the sprites
+	def runTick(self, delta):
+		if self.matchLog is not None:
+			self.matchLog.startTick(delta)
+		start = self.profiler.begin()
+		self.handleEvents()
+		self.profiler.end('handleEvents', start)
+		start = self.profiler.begin()
+		self.update(delta)
+		self.profiler.end('update', start)
+		start = self.profiler.begin()
+		self.sprites.update(delta)
+		self.profiler.end('sprites', start)
 			
 	def drawWorld(self):
 		#self.screen.blit(self.background, (0, 0))
@@ -981,6 +1653,7 @@ class GameWorld():
 		for o in self.obstacles:
 			o.draw(self.background)
 		self.drawMousePosition()
+		self.drawProfile()
 		#pygame.display.flip()
 
 	def drawMousePosition(self):
@@ -990,9 +1663,18 @@ class GameWorld():
 		label = self.font.render("Mouse: " + str(offsetX) + "," + str(offsetY), True, (255, 0, 0))
 		textPosition = (10, 10)
 		self.screen.blit(label, textPosition)
+
+	### Draws the profiler's milliseconds and calls per tick, averaged over the last second, below the mouse position
+	def drawProfile(self):
+		if self.showProfile:
+			y = 30
+			for phase, ms, calls in self.profiler.summary(TICK):
+				label = self.font.render("%-18s %7.2f ms %6.1f" % (phase, ms, calls), True, (255, 0, 0))
+				self.screen.blit(label, (10, y))
+				y = y + 15
 		
 	def handleEvents(self): 
-		events = pygame.event.get()
+		events = self.getEvents()
 		for event in events:
 			if event.type == QUIT:
 				sys.exit(0) 
@@ -1001,94 +1683,117 @@ class GameWorld():
 			elif event.type == KEYDOWN:
 				self.doKeyDown(event.key)
 				
+	### The events to handle this tick: pygame's, or the recorded ones when a match is replayed
+	def getEvents(self):
+		if self.matchLog is not None:
+			return self.matchLog.getEvents()
+		return pygame.event.get()
+
+	def getMousePosition(self):
+		if self.matchLog is not None:
+			return self.matchLog.getMousePosition()
+		return pygame.mouse.get_pos()
+
 	def doMouseUp(self):
 		offsetX, offsetY = self.getWorldMousePosition()
 		self.agent.navigateTo([offsetX, offsetY])
 
 	def getWorldMousePosition(self):
-		pos = pygame.mouse.get_pos()
+		pos = self.getMousePosition()
 		offsetX = pos[0] + self.agent.position[0] - self.camera[0]
 		offsetY = pos[1] + self.agent.position[1] - self.camera[1]
 		return offsetX, offsetY
 		
 
 	def doKeyDown(self, key):
-		pos = pygame.mouse.get_pos()
+		pos = self.getMousePosition()
 		if key == 32: #space
 			self.agent.shoot()
 		elif key == 100: #d
 			print("distance traveled", self.agent.distanceTraveled)
+		elif key == 112: #p
+			self.showProfile = not self.showProfile
+			if self.showProfile and not self.profiler.enabled:
+				self.profiler.setEnabled(True)
 		elif key == 101: #e
 			point = (pos[0] + self.agent.rect.center[0] - self.camera[0], pos[1] + self.agent.rect.center[1] - self.camera[1])
 			self.agent.navigator.doDebug(self, point)
 
 	def worldCollisionTest(self):
 		collisions = []
-		for m1 in self.movers:
-			if m1 in self.movers:
-				# Collision against world boundaries
-				if m1.position[0] < 0 or m1.position[0] > self.dimensions[0] or m1.position[1] < 0 or m1.position[1] > self.dimensions[1]:
-					collisions.append((m1, self))
-				# Collision against obstacles
-				for o in self.obstacles:
-					c = False
-					needCheckVertex = False
-					if isinstance(m1, Agent) and m1.moveTarget != None:
-						moverRadius = m1.getRadius()
-						lines = o.getLines()
-						direction = numpy.subtract(m1.moveTarget, m1.position)
-						magnitude = numpy.linalg.norm(direction)
-						if magnitude > 0:
-							direction = direction / magnitude
-						nextPosition = tuple(numpy.add(m1.position, direction * (m1.speed[0] + moverRadius)))
-						p = rayTraceWorldNoEndPoints(m1.position, nextPosition, lines)
-						if p == None:
-							needCheckVertex = True
+		# Movers against movers: only pairs whose rects share a grid cell are tested
+		moverPairs = collidingRectPairs([m.rect for m in self.movers])
+		seen = set()
+		for i, m1 in enumerate(self.movers):
+			# Collision against world boundaries
+			if m1.position[0] < 0 or m1.position[0] > self.dimensions[0] or m1.position[1] < 0 or m1.position[1] > self.dimensions[1]:
+				collisions.append((m1, self))
+			# Collision against obstacles
+			for o in self.obstacles:
+				c = False
+				needCheckVertex = False
+				if isinstance(m1, Agent) and m1.moveTarget != None:
+					moverRadius = m1.getRadius()
+					lines = o.getLines()
+					direction = numpy.subtract(m1.moveTarget, m1.position)
+					magnitude = numpy.linalg.norm(direction)
+					if magnitude > 0:
+						direction = direction / magnitude
+					nextPosition = tuple(numpy.add(m1.position, direction * (m1.speed[0] + moverRadius)))
+					p = rayTraceWorldNoEndPoints(m1.position, nextPosition, lines)
+					if p == None:
+						needCheckVertex = True
+				if needCheckVertex:
+					for v in o.getPoints():
+						# check v between m1.position and nextPosition
+						if between(v[0], m1.position[0], nextPosition[0]) and between(v[1], m1.position[1], nextPosition[1]):
+							d = minimumDistance((m1.position, nextPosition), v)
+							if d < moverRadius:
+								needCheckVertex = False
+								break
 					if needCheckVertex:
-						for v in o.getPoints():
-							# check v between m1.position and nextPosition
-							if between(v[0], m1.position[0], nextPosition[0]) and between(v[1], m1.position[1], nextPosition[1]):
-								d = minimumDistance((m1.position, nextPosition), v)
-								if d < moverRadius:
-									needCheckVertex = False
-									break
-						if needCheckVertex:
-							for l in lines:
-								if minimumDistance(l, nextPosition) < moverRadius:
-									needCheckVertex = False
-									break
-					if not needCheckVertex:
-						for l in o.getLines():
-							for r in ((m1.rect.topleft, m1.rect.topright), (m1.rect.topright, m1.rect.bottomright), (m1.rect.bottomright, m1.rect.bottomleft), (m1.rect.bottomleft, m1.rect.topleft)):
-								hit = calculateIntersectPoint(l[0], l[1], r[0], r[1])
-								if hit is not None:
-									c = True
-					if c:
-						collisions.append((m1, o))
-				# Movers against movers
-				for m2 in self.movers:
-					if m2 in self.movers:
-						if m1 != m2:
-							if (m1, m2) not in collisions and (m2, m1) not in collisions:
-								if m1.rect.colliderect(m2.rect):
-									collisions.append((m1, m2))
+						for l in lines:
+							if minimumDistance(l, nextPosition) < moverRadius:
+								needCheckVertex = False
+								break
+				if not needCheckVertex:
+					for l in o.getLines():
+						for r in ((m1.rect.topleft, m1.rect.topright), (m1.rect.topright, m1.rect.bottomright), (m1.rect.bottomright, m1.rect.bottomleft), (m1.rect.bottomleft, m1.rect.topleft)):
+							hit = calculateIntersectPoint(l[0], l[1], r[0], r[1])
+							if hit is not None:
+								c = True
+				if c:
+					collisions.append((m1, o))
+			# Movers against movers
+			for j in moverPairs.get(i, []):
+				m2 = self.movers[j]
+				if m1 != m2:
+					if (id(m1), id(m2)) not in seen and (id(m2), id(m1)) not in seen:
+						seen.add((id(m1), id(m2)))
+						collisions.append((m1, m2))
 		for c in collisions:
 			c[0].collision(c[1])
 			c[1].collision(c[0])
 		
 	def update(self, delta):
 		self.clock = self.clock + delta
+		start = self.profiler.begin()
+		self.pathScheduler.update()
+		self.profiler.end('pathScheduler', start)
+		start = self.profiler.begin()
 		self.worldCollisionTest()
+		self.profiler.end('worldCollisionTest', start)
 		return None
 		
 	def collision(self, thing):
 		return None
 		
+	### Lines and points are returned as tuples that are shared until the terrain changes; don't modify them.
 	def getLines(self):
-		return self.lines[:]
+		return self.getView('lines', lambda: tuple(self.lines))
 
 	def getPoints(self):
-		return self.points[:]
+		return self.getView('points', lambda: tuple(self.points))
 		
 	def addBullet(self, bullet):
 		self.bullets.append(bullet)
@@ -1120,6 +1825,8 @@ class GameWorld():
 		if self.sprites is not None:
 			self.sprites.add(npc)
 		self.movers.append(npc)
+		if self.matchLog is not None:
+			self.matchLog.spawn(npc)
 		
 	def deleteNPC(self, npc):
 		if npc in self.npcs:
@@ -1136,36 +1843,72 @@ class GameWorld():
 				other = m.getLocation()
 				if other != position:
 					# other is not me
-					if viewangle < 360:
-						# viewangle less than 360
-						orient = (math.cos(math.radians(orientation)), -math.sin(math.radians(orientation)))
-						vect = (other[0]-position[0], other[1]-position[1])
-						x = dotProduct(orient, vect) / (vectorMagnitude(orient) * vectorMagnitude(vect))
-						if x >= 1.0:
-							angle = 0.0
-						else:
-							angle = math.degrees(math.acos(x))
-						if angle < viewangle/2.0:
-							hit = rayTraceWorld(position, other, self.getLines())
-							if hit == None:
-								visible.append(m)
-					else:
-						# viewangle is 360
-						hit = rayTraceWorld(position, other, self.getLines())
+					if inViewCone(position, orientation, viewangle, other):
+						hit = rayTraceWorld(position, other, self.getSegmentGrid())
 						if hit == None:
 							visible.append(m)
 		return visible
 
+	### Line of sight between every pair of movers, ray traced in one batch the first time it is asked for in a tick.
+	### Returns (tick, movers, index, positions, sight): index maps id(mover) to its row, positions are the locations the
+	### rays were cast between, and sight[i][j] is True if movers i and j can see each other.
+	def getSight(self):
+		if self.sight is None or self.sight[0] != self.ticks:
+			movers = list(self.movers)
+			positions = [m.getLocation() for m in movers]
+			index = dict((id(m), i) for i, m in enumerate(movers))
+			n = len(movers)
+			sight = numpy.zeros((n, n), dtype = bool)
+			if n > 1:
+				first, second = numpy.triu_indices(n, 1)
+				points = numpy.array(positions, dtype = float)
+				clear = ~anyHitBatch(numpy.stack([points[first], points[second]], axis = 1), self.getLineArray())
+				sight[first, second] = clear
+				sight[second, first] = clear
+			self.sight = (self.ticks, movers, index, positions, sight)
+		return self.sight
+
+	### Same as getVisible(viewer.getLocation(), viewer.getOrientation(), viewangle, type), but served from the per-tick
+	### line of sight snapshot (getSight()). Movers added since the snapshot are ray traced individually.
+	def getVisibleFrom(self, viewer, viewangle, type = None):
+		tick, movers, index, positions, sight = self.getSight()
+		i = index.get(id(viewer))
+		if i is None or movers[i] is not viewer:
+			return self.getVisible(viewer.getLocation(), viewer.getOrientation(), viewangle, type)
+		position = positions[i]
+		visible = []
+		for m in self.movers:
+			if type == None or isinstance(m, type):
+				j = index.get(id(m))
+				if j is not None and movers[j] is m:
+					other = positions[j]
+					if other != position and inViewCone(position, viewer.getOrientation(), viewangle, other) and sight[i][j]:
+						visible.append(m)
+				else:
+					other = m.getLocation()
+					if other != position and inViewCone(position, viewer.getOrientation(), viewangle, other):
+						if rayTraceWorld(position, other, self.getSegmentGrid()) == None:
+							visible.append(m)
+		return visible
+
 	def computeFreeLocations(self, agent):
 		if type(agent) not in self.destinations:
-			destinations = []
 			grid = agent.getRadius()*2.0
-			for x in range(1, int(self.dimensions[0]/grid)):
-				for y in range(1, int(self.dimensions[1]/grid)):
-					point = (x*grid, y*grid)
-					if isGood(point, self, grid):
-						destinations.append(point)
-			self.destinations[type(agent)] = destinations
+			def build():
+				# Same points as testing isGood(point, self, grid) on each, with one vectorized distance computation (on just
+				# these points: a whole DistanceField would be far more samples)
+				points = [(x*grid, y*grid) for x in range(1, int(self.dimensions[0]/grid)) for y in range(1, int(self.dimensions[1]/grid))]
+				distances = signedDistances(points, self.getLineArray(), [o.getPoints() for o in self.obstacles])
+				return [point for point, d in zip(points, distances) if d >= grid]
+			if self.mapBundle is not None:
+				self.destinations[type(agent)] = self.mapBundle.get('free/%s/%r' % (type(agent).__name__, grid), 'points', build)
+			else:
+				self.destinations[type(agent)] = build()
+
+	### Use a MapBundle (see loadMapBundle()) to save and reload the navigation artifacts of this map: free locations,
+	### potential gates and nav meshes. Set it after the terrain is initialized and before navigators are given the world.
+	def setMapBundle(self, bundle):
+		self.mapBundle = bundle
 		
 	def getFreeLocations(self, agent):
 		if type(agent) in self.destinations:
@@ -1233,23 +1976,44 @@ class GatedWorld(GameWorld):
 	### alarm: when timer is greater than this number, gate switches
 	### gate: the active gate
 
-	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm):
-		GameWorld.__init__(self, seed, worlddimensions, screendimensions)
+	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless = False):
+		GameWorld.__init__(self, seed, worlddimensions, screendimensions, headless)
 		self.potentialGates = []
 		self.timer = 0
 		self.alarm = alarm
 		self.gates = []
 		self.numGates = numgates
+		# the gates that were up when the version was last bumped
+		self.versionGates = ()
 	
 	def getNumGates(self):
 		return self.numGates
 	
 	def getGates(self):
 		return map(getGateLine, self.gates)
+
+	### Opening or closing a gate changes the lines of the world, so it counts as a new version. Gates are compared by
+	### identity, which catches code that edits self.gates in place.
+	def getVersion(self):
+		gates = tuple(self.gates)
+		if gates != self.versionGates:
+			self.versionGates = gates
+			self.terrainChanged()
+		return self.version
 	
 	def makePotentialGates(self):
+		if self.obstacles != None:
+			if self.mapBundle is not None:
+				self.potentialGates = self.potentialGates + self.mapBundle.get('potentialGates', 'lines', self.findPotentialGates)
+			else:
+				self.potentialGates = self.potentialGates + self.findPotentialGates()
+
+	### Lines between obstacle points (not both screen corners, not on the same obstacle) that don't cross anything
+	def findPotentialGates(self):
+		potentialGates = []
 		if self.obstacles != None:
 			dangerpoints = [(0, 0), (self.dimensions[0], 0), (self.dimensions[0], self.dimensions[1]), (0, self.dimensions[1])]
+			candidates = []
 			for p1 in self.getPoints():
 				for p2 in self.getPoints():
 					if p1 != p2: # and p2 != (0, 0) and p2 != (self.dimensions[0], 0) and p2 != (self.dimensions[0], self.dimensions[1]) and p2 != (0, self.dimensions[1]):
@@ -1260,10 +2024,13 @@ class GatedWorld(GameWorld):
 									samepoly = True
 							if samepoly == False:
 								if not insideObstacle(((p1[0]+p2[0])/2.0, (p1[1]+p2[1])/2.0), self.obstacles):
-									
-									hit = rayTraceWorldNoEndPoints(p1, p2, self.getLines())
-									if hit == None:
-										self.potentialGates.append((p1, p2))
+									candidates.append((p1, p2))
+			# Ray trace all the candidates against the world in one batch
+			hits = anyHitBatch(candidates, self.getLineArray(), False)
+			for line, hit in zip(candidates, hits):
+				if not hit:
+					potentialGates.append(line)
+		return potentialGates
 
 	def drawWorld(self):
 		GameWorld.drawWorld(self)
@@ -1307,10 +2074,7 @@ class GatedWorld(GameWorld):
 		
 	### NOTE: really should get the bounding box and return the lines of the bounding box
 	def getLines(self):
-		lines = GameWorld.getLines(self)
-		for g in self.gates:
-			lines.append(g.line)
-		return lines
+		return self.getView('lines', lambda: tuple(self.lines) + tuple(g.line for g in self.gates))
 
 	def doKeyDown(self, key):
 		GameWorld.doKeyDown(self, key)
@@ -1337,10 +2101,191 @@ class GatedWorld(GameWorld):
 			if len(self.gates) > self.numGates:
 				self.gates.pop(0)
 
+############################
+### MapBundle
+###
+### The navigation artifacts of one map (path networks, nav meshes, potential gates, free locations, ...) kept on disk so that
+### they are not rebuilt on every launch. A bundle is a compressed NumPy archive named after a hash of everything the artifacts
+### are built from: the terrain, the agent's radius, MAPBUNDLEVERSION and anything else the caller adds. Changing the map thus
+### simply gives a new file. Each artifact is also stored with a hash of the code that built it (see builderKey()), and is
+### rebuilt when that code changes, e.g., after editing mybuildpathnetwork.py. Bump MAPBUNDLEVERSION when the layout of
+### the bundle changes. Arrays are only read from the archive when asked for, and new artifacts are kept in memory until
+### save() writes them all at once (loadMapBundle() saves its bundles when the program exits).
+
+MAPBUNDLEVERSION = 2
+MAPBUNDLEDIR = 'mapcache'
+
+class MapBundle(object):
+
+	### key: the hash the artifacts are valid for, see mapBundleKey()
+	### path: the archive file
+	### archive: the open archive, or None if there isn't a valid one yet
+	### arrays: artifacts stored during this run and not saved yet
+
+	def __init__(self, key, path):
+		self.key = key
+		self.path = path
+		self.archive = None
+		self.arrays = {}
+		if os.path.exists(path):
+			archive = numpy.load(path)
+			if 'key' in archive.files and str(archive['key']) == key:
+				self.archive = archive
+			else:
+				archive.close()
+
+	### True if an artifact is stored under name, and (if builder is given) was built by the current code of builder
+	def has(self, name, builder = None):
+		if name not in self.arrays and (self.archive is None or name not in self.archive.files):
+			return False
+		if builder is None:
+			return True
+		key = name + '/builder'
+		stored = self.arrays[key] if key in self.arrays else self.archive[key] if self.archive is not None and key in self.archive.files else None
+		return stored is not None and str(stored) == builderKey(builder)
+
+	def getArray(self, name):
+		if name in self.arrays:
+			return self.arrays[name]
+		return self.archive[name]
+
+	### Returns the artifact stored under name as a list. kind is how it is stored:
+	### 'points' [(x, y), ...], 'lines' [((x1, y1), (x2, y2)), ...] or 'polygons' [[(x, y), ...], ...]
+	def load(self, name, kind):
+		if kind == 'points':
+			return [tuple(p) for p in self.getArray(name).tolist()]
+		elif kind == 'lines':
+			return [(tuple(l[0]), tuple(l[1])) for l in self.getArray(name).tolist()]
+		elif kind == 'polygons':
+			points = [tuple(p) for p in self.getArray(name + '/points').tolist()]
+			polygons = []
+			start = 0
+			for size in self.getArray(name + '/sizes').tolist():
+				polygons.append(points[start:start+size])
+				start = start + size
+			return polygons
+		raise ValueError('unknown kind of artifact: ' + str(kind))
+
+	### Stores an artifact (see load() for the kinds), to be written to disk by the next save(). If builder is given, the
+	### artifact is only used while the code of builder is unchanged (see has()).
+	def put(self, name, kind, value, builder = None):
+		if builder is not None:
+			self.arrays[name + '/builder'] = numpy.array(builderKey(builder))
+		if kind == 'points':
+			self.arrays[name] = numpy.asarray(list(value)).reshape(-1, 2)
+		elif kind == 'lines':
+			self.arrays[name] = numpy.asarray(list(value)).reshape(-1, 2, 2)
+		elif kind == 'polygons':
+			value = [list(p) for p in value]
+			self.arrays[name + '/points'] = numpy.asarray([point for p in value for point in p]).reshape(-1, 2)
+			self.arrays[name + '/sizes'] = numpy.asarray([len(p) for p in value], dtype = int)
+			self.arrays[name] = numpy.zeros(0)
+		else:
+			raise ValueError('unknown kind of artifact: ' + str(kind))
+
+	### Returns the artifact stored under name, calling build() and storing what it returns if there isn't one, or if the
+	### code of build has changed since it was stored.
+	def get(self, name, kind, build):
+		if not self.has(name, build):
+			self.put(name, kind, build(), build)
+		return self.load(name, kind)
+
+	### Writes the artifacts stored since the last save() into the archive, if there are any
+	def save(self):
+		if len(self.arrays) == 0:
+			return None
+		arrays = {}
+		if self.archive is not None:
+			for name in self.archive.files:
+				arrays[name] = self.archive[name]
+			self.archive.close()
+		arrays.update(self.arrays)
+		arrays['key'] = numpy.array(self.key)
+		directory = os.path.dirname(self.path)
+		if directory != '' and not os.path.exists(directory):
+			os.makedirs(directory)
+		# Write next to the bundle and rename, so that a crash never leaves half a bundle behind
+		temp = self.path + '.tmp'
+		with open(temp, 'wb') as f:
+			numpy.savez_compressed(f, **arrays)
+		os.replace(temp, self.path)
+		self.archive = numpy.load(self.path)
+		self.arrays = {}
+
+### Hash of what a map's navigation artifacts are built from: the world's dimensions and obstacles, the agent's radius (if an
+### agent is given), MAPBUNDLEVERSION and extra (anything else, e.g., hand-placed path nodes).
+def mapBundleKey(world, agent = None, extra = None):
+	obstacles = [list(o.getPoints()) for o in (world.obstacles or [])]
+	radius = agent.getMaxRadius() if agent is not None else None
+	return hashlib.sha1(repr((MAPBUNDLEVERSION, tuple(world.dimensions), obstacles, radius, extra)).encode('utf-8')).hexdigest()
+
+### Hash of the source files of builder (a function, method or lambda) and of the functions and classes it uses, found
+### through the global names in its code, its closure and its default arguments. Only files in the builder's own directory
+### count (the assignment's code, not the libraries). Editing the builder, or anything it calls, gives a new hash.
+def builderKey(builder):
+	func = getattr(builder, '__func__', builder)
+	directory = os.path.dirname(os.path.abspath(func.__code__.co_filename))
+	files = set()
+	seen = set()
+	pending = [func]
+	while len(pending) > 0:
+		obj = pending.pop()
+		if id(obj) in seen:
+			continue
+		seen.add(id(obj))
+		if isinstance(obj, (staticmethod, classmethod, types.MethodType)):
+			pending.append(obj.__func__)
+		elif isinstance(obj, type):
+			module = sys.modules.get(obj.__module__)
+			filename = getattr(module, '__file__', None)
+			if filename is not None and os.path.dirname(os.path.abspath(filename)) == directory:
+				files.add(os.path.abspath(filename))
+				pending.extend(vars(obj).values())
+				pending.extend(obj.__bases__)
+		elif isinstance(obj, types.FunctionType):
+			filename = os.path.abspath(obj.__code__.co_filename)
+			if os.path.dirname(filename) == directory:
+				files.add(filename)
+				codes = [obj.__code__]
+				while len(codes) > 0:
+					code = codes.pop()
+					pending.extend(obj.__globals__[n] for n in code.co_names if n in obj.__globals__)
+					codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+				pending.extend(cell.cell_contents for cell in (obj.__closure__ or ()) if cell.cell_contents is not None)
+				pending.extend(obj.__defaults__ or ())
+	digest = hashlib.sha1()
+	for filename in sorted(files):
+		# Only the name: every file is in the builder's directory, wherever that is checked out
+		digest.update(os.path.basename(filename).encode('utf-8'))
+		with open(filename, 'rb') as f:
+			digest.update(f.read())
+	return digest.hexdigest()
+
+### Returns the MapBundle for the world's terrain (and agent and extra, see mapBundleKey()), stored in directory
+def loadMapBundle(world, agent = None, extra = None, directory = MAPBUNDLEDIR):
+	key = mapBundleKey(world, agent, extra)
+	bundle = MapBundle(key, os.path.join(directory, key + '.npz'))
+	atexit.register(bundle.save)
+	return bundle
+
+
 #######################################
 ### HELPERS
 	
 
+### Is other inside the cone of vision (viewangle degrees wide, centered on orientation) of something at position?
+def inViewCone(position, orientation, viewangle, other):
+	if viewangle >= 360:
+		return True
+	orient = (math.cos(math.radians(orientation)), -math.sin(math.radians(orientation)))
+	vect = (other[0]-position[0], other[1]-position[1])
+	x = dotProduct(orient, vect) / (vectorMagnitude(orient) * vectorMagnitude(vect))
+	if x >= 1.0:
+		angle = 0.0
+	else:
+		angle = math.degrees(math.acos(x))
+	return angle < viewangle/2.0
+
 def insideObstacle(point, obstacles):
 	for o in obstacles:
 		if pointInsidePolygonPoints(point, o.getPoints()):
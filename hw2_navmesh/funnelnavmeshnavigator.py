@@ -0,0 +1,44 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import sys, pygame, math, numpy, random, time, copy
+from pygame.locals import * 
+
+from constants import *
+from utils import *
+from core import *
+from mycreatepathnetwork import *
+
+
+################
+### FunnelNavMeshNavigator
+###
+### Builds the nav mesh with myCreatePathNetwork and moves the agent along the shortest path through it: the corridor of
+### polygons between the source and destination, pulled taut through their shared edges (NavMeshNavigator.computePath).
+
+class FunnelNavMeshNavigator(NavMeshNavigator):
+
+	def __init__(self):
+		NavMeshNavigator.__init__(self)
+
+	### Create the nav mesh (the path network is only drawn)
+	### self: the navigator object
+	### world: the world object
+	def createPathNetwork(self, world):
+		self.pathnodes, self.pathnetwork, self.navmesh = myCreatePathNetwork(world, self.agent)
+		return None
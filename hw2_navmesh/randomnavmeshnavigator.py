@@ -34,7 +34,7 @@ from mycreatepathnetwork import *
 class RandomNavMeshNavigator(NavMeshNavigator):
 
 	def __init__(self):
-		Navigator.__init__(self)
+		NavMeshNavigator.__init__(self)
 
 	### Create the path node network and pre-compute all shortest paths along the network
 	### self: the navigator object
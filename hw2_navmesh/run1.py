@@ -25,9 +25,11 @@ from core import *
 from astarnavigator2 import *
 # from mybuildpathnetwork import *
 from randomnavmeshnavigator import *			
+from funnelnavmeshnavigator import *
 
 # nav = AStarNavigator2()
 nav = RandomNavMeshNavigator()
+# nav = FunnelNavMeshNavigator()
 			
 			
 world = GameWorld(SEED, (1000, 1000), (1000, 1000))
@@ -38,6 +40,8 @@ world.initializeTerrain([[(150, 100), (390, 100), (390, 150), (295, 220), (295,
                          [(900, 585), (660, 585), (660, 813), (900, 813)]]) 
 world.setPlayerAgent(agent)
 agent.setNavigator(nav)
+# The nav mesh is built once per map and then loaded from disk
+world.setMapBundle(loadMapBundle(world, agent))
 nav.setWorld(world)
 world.initializeRandomResources(NUMRESOURCES)
 world.debugging = True
@@ -0,0 +1,333 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import math
+
+from utils import *
+
+###########################
+### Constrained triangulation of free space
+###
+### Builds a nav mesh for a world directly from its obstacle polygons:
+### 1. Delaunay-triangulate the world rectangle and every obstacle vertex (Bowyer-Watson, one point at a time,
+###    locating each point by walking from the last triangle made).
+### 2. Recover every obstacle edge as a constraint by re-triangulating the triangles it crosses.
+### 3. Throw away the triangles inside obstacles.
+### 4. Merge triangles into convex polygons (Hertel-Mehlhorn): remove a shared edge whenever the polygon on both sides
+###    stays convex. Shared edges are found through a hash map from edge to the polygon on each side.
+###
+### Triangles are kept counterclockwise (positive orientation()) and stored as a map from each directed edge (a, b)
+### to the third vertex c of triangle (a, b, c). The neighbor across (a, b) is therefore the triangle holding (b, a).
+### Predicates are exact for integer coordinates.
+
+### Twice the signed area of (a, b, c). Positive if c is to the left of a->b.
+def orientation(a, b, c):
+	return (b[0]-a[0])*(c[1]-a[1]) - (b[1]-a[1])*(c[0]-a[0])
+
+### Positive if d is inside the circle through a, b, c (a, b, c counterclockwise).
+def inCircle(a, b, c, d):
+	adx, ady = a[0]-d[0], a[1]-d[1]
+	bdx, bdy = b[0]-d[0], b[1]-d[1]
+	cdx, cdy = c[0]-d[0], c[1]-d[1]
+	return ((adx*adx + ady*ady) * (bdx*cdy - cdx*bdy)
+		- (bdx*bdx + bdy*bdy) * (adx*cdy - cdx*ady)
+		+ (cdx*cdx + cdy*cdy) * (adx*bdy - bdx*ady))
+
+
+class Triangulation(object):
+
+	### points: vertex id -> (x, y)
+	### ids: (x, y) -> vertex id
+	### apex: directed edge (a, b) -> c for every counterclockwise triangle (a, b, c)
+	### out: vertex id -> the vertices b such that (a, b) is in apex
+	### constrained: the (min, max) vertex pairs of edges that must stay in the triangulation
+	### last: an edge of the most recently made triangle, where point location starts walking
+
+	### Starts with the world rectangle split into two triangles.
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		self.points = []
+		self.ids = {}
+		self.apex = {}
+		self.out = []
+		self.constrained = set()
+		self.last = None
+		for p in ((0, 0), (width, 0), (width, height), (0, height)):
+			self.addVertex(p)
+		self.addTriangle(0, 1, 2)
+		self.addTriangle(0, 2, 3)
+
+	def addVertex(self, p):
+		v = len(self.points)
+		self.points.append(p)
+		self.ids[p] = v
+		self.out.append(set())
+		return v
+
+	def addTriangle(self, a, b, c):
+		self.apex[(a, b)] = c
+		self.apex[(b, c)] = a
+		self.apex[(c, a)] = b
+		self.out[a].add(b)
+		self.out[b].add(c)
+		self.out[c].add(a)
+		self.last = (a, b)
+
+	def removeTriangle(self, a, b, c):
+		for s, t in ((a, b), (b, c), (c, a)):
+			del self.apex[(s, t)]
+			self.out[s].discard(t)
+
+	### Inserts the points, ordered so that consecutive points are near each other (which keeps the walks short).
+	### Points outside the world rectangle are ignored. Returns the vertex id of every point (None if ignored).
+	def insertPoints(self, points):
+		band = max(1.0, math.sqrt(self.width * self.height / float(max(1, len(points)))))
+		def order(p):
+			row = int(p[1] // band)
+			return (row, p[0] if row % 2 == 0 else -p[0])
+		for p in sorted(set(points), key=order):
+			self.insertPoint(p)
+		return [self.ids.get(p) for p in points]
+
+	def insertPoint(self, p):
+		if p in self.ids:
+			return self.ids[p]
+		if p[0] < 0 or p[0] > self.width or p[1] < 0 or p[1] > self.height:
+			return None
+		a, b = self.locate(p)
+		# The cavity: every triangle whose circumcircle holds p, grown outward from the triangle that contains p
+		first = (a, b, self.apex[(a, b)])
+		bad = set([first])
+		stack = [first]
+		while len(stack) > 0:
+			x, y, z = stack.pop()
+			for s, t in ((x, y), (y, z), (z, x)):
+				w = self.apex.get((t, s))
+				if w is not None:
+					n = (t, s, w)
+					if (n not in bad and (s, w, t) not in bad and (w, t, s) not in bad
+						and inCircle(self.points[t], self.points[s], self.points[w], p) > 0):
+						bad.add(n)
+						stack.append(n)
+		boundary = []
+		for x, y, z in bad:
+			for s, t in ((x, y), (y, z), (z, x)):
+				w = self.apex.get((t, s))
+				if w is None or ((t, s, w) not in bad and (s, w, t) not in bad and (w, t, s) not in bad):
+					boundary.append((s, t))
+		for tri in bad:
+			self.removeTriangle(*tri)
+		v = self.addVertex(p)
+		for s, t in boundary:
+			# p on the world border splits the border edge; no triangle on that side
+			if orientation(self.points[s], self.points[t], p) > 0:
+				self.addTriangle(s, t, v)
+		return v
+
+	### Returns an edge (a, b) of a triangle that contains p.
+	def locate(self, p):
+		if self.last not in self.apex:
+			self.last = next(iter(self.apex))
+		a, b = self.last
+		c = self.apex[(a, b)]
+		for _ in range(len(self.apex)):
+			moved = False
+			for s, t in ((a, b), (b, c), (c, a)):
+				if orientation(self.points[s], self.points[t], p) < 0:
+					n = self.apex.get((t, s))
+					if n is not None:
+						a, b, c = t, s, n
+						moved = True
+						break
+			if not moved:
+				return a, b
+		# Walk did not settle; look at every triangle
+		for (a, b), c in self.apex.items():
+			if (orientation(self.points[a], self.points[b], p) >= 0 and orientation(self.points[b], self.points[c], p) >= 0
+				and orientation(self.points[c], self.points[a], p) >= 0):
+				return a, b
+		return self.last
+
+	### Makes the segment between vertices u and v an edge of the triangulation. A vertex lying on the segment splits it.
+	### Returns False if the segment crosses an edge that is already constrained (e.g., overlapping obstacles).
+	def insertSegment(self, u, v):
+		while u != v:
+			if (u, v) in self.apex or (v, u) in self.apex:
+				self.constrained.add((min(u, v), max(u, v)))
+				return True
+			end = self.recoverSegment(u, v)
+			if end is None:
+				return False
+			u = end
+		return True
+
+	### Re-triangulates the triangles crossed by the segment from u toward v. Stops early at a vertex lying on the
+	### segment. Returns the vertex it reached, or None if a constrained edge is in the way.
+	def recoverSegment(self, u, v):
+		pu = self.points[u]
+		pv = self.points[v]
+		# Find the triangle at u that the segment leaves through
+		start = None
+		for b in self.out[u]:
+			c = self.apex[(u, b)]
+			pb = self.points[b]
+			pc = self.points[c]
+			ob = orientation(pu, pb, pv)
+			if ob == 0 and (pb[0]-pu[0])*(pv[0]-pu[0]) + (pb[1]-pu[1])*(pv[1]-pu[1]) > 0:
+				self.constrained.add((min(u, b), max(u, b)))
+				return b
+			if ob > 0 and orientation(pu, pc, pv) < 0:
+				start = (u, b, c)
+				break
+		if start is None:
+			return None
+		crossed = [start]
+		right = [start[1]]
+		left = [start[2]]
+		s, t = start[1], start[2]
+		end = None
+		while end is None:
+			if (min(s, t), max(s, t)) in self.constrained:
+				return None
+			w = self.apex[(t, s)]
+			crossed.append((t, s, w))
+			if w == v:
+				end = v
+				break
+			o = orientation(pu, pv, self.points[w])
+			if o < 0:
+				right.append(w)
+				s = w
+			elif o > 0:
+				left.append(w)
+				t = w
+			else:
+				end = w
+		for tri in crossed:
+			self.removeTriangle(*tri)
+		self.fillPseudoPolygon(u, end, left)
+		self.fillPseudoPolygon(end, u, list(reversed(right)))
+		self.constrained.add((min(u, end), max(u, end)))
+		return end
+
+	### Delaunay-triangulates the polygon a, b, chain[-1], ..., chain[0] (chain is to the left of a->b, ordered from a's
+	### end to b's end).
+	def fillPseudoPolygon(self, a, b, chain):
+		if len(chain) == 0:
+			return
+		pa = self.points[a]
+		pb = self.points[b]
+		c = 0
+		for i in range(1, len(chain)):
+			if inCircle(pa, pb, self.points[chain[c]], self.points[chain[i]]) > 0:
+				c = i
+		self.fillPseudoPolygon(a, chain[c], chain[:c])
+		self.fillPseudoPolygon(chain[c], b, chain[c+1:])
+		self.addTriangle(a, b, chain[c])
+
+	### Returns every triangle once, as a tuple of vertex ids.
+	def getTriangles(self):
+		return [(a, b, c) for (a, b), c in self.apex.items() if a < b and a < c]
+
+
+### Triangulates the free space of a world of the given dimensions around the obstacles (lists of points).
+### Returns (triangulation, triangles), where triangles are the vertex id tuples outside every obstacle.
+def triangulateFreeSpace(dimensions, obstacles):
+	mesh = Triangulation(dimensions[0], dimensions[1])
+	ids = mesh.insertPoints([p for obstacle in obstacles for p in obstacle])
+	index = 0
+	for obstacle in obstacles:
+		n = len(obstacle)
+		for i in range(n):
+			u = ids[index + i]
+			v = ids[index + (i+1) % n]
+			if u is not None and v is not None and u != v:
+				mesh.insertSegment(u, v)
+		index = index + n
+	bounds = []
+	for obstacle in obstacles:
+		xs = [p[0] for p in obstacle]
+		ys = [p[1] for p in obstacle]
+		bounds.append((min(xs), min(ys), max(xs), max(ys)))
+	free = []
+	for tri in mesh.getTriangles():
+		a, b, c = [mesh.points[v] for v in tri]
+		centroid = ((a[0]+b[0]+c[0])/3.0, (a[1]+b[1]+c[1])/3.0)
+		inside = False
+		for obstacle, (x1, y1, x2, y2) in zip(obstacles, bounds):
+			if x1 <= centroid[0] <= x2 and y1 <= centroid[1] <= y2 and pointInsidePolygonPoints(centroid, obstacle):
+				inside = True
+				break
+		if not inside:
+			free.append(tri)
+	return mesh, free
+
+### Merges triangles into convex polygons (Hertel-Mehlhorn). Edges in constrained are never removed.
+### Returns (polygons, adjacency): polygons are lists of vertex ids (counterclockwise) and adjacency[i] is a list of
+### (j, (a, b)) for every polygon j that shares the edge (a, b) with polygon i.
+def mergeConvex(points, triangles, constrained = ()):
+	polys = dict(enumerate([list(tri) for tri in triangles]))
+	# owner: directed edge (a, b) -> the polygon that has a followed by b
+	owner = {}
+	for i, poly in polys.items():
+		for k in range(len(poly)):
+			owner[(poly[k], poly[(k+1) % len(poly)])] = i
+	constrained = set(constrained)
+	diagonals = [(a, b) for (a, b) in owner if a < b and (b, a) in owner and (a, b) not in constrained]
+	# Removing the longest diagonals first leaves fewer slivers
+	diagonals.sort(key=lambda e: -((points[e[0]][0]-points[e[1]][0])**2 + (points[e[0]][1]-points[e[1]][1])**2))
+	for a, b in diagonals:
+		i = owner[(a, b)]
+		j = owner[(b, a)]
+		if i == j:
+			continue
+		p = polys[i]
+		q = polys[j]
+		k = p.index(b)
+		p = p[k:] + p[:k]
+		k = q.index(a)
+		q = q[k:] + q[:k]
+		# p runs b ... a, q runs a ... b; the merged polygon is convex if the corners at a and b are
+		if (orientation(points[p[-2]], points[a], points[q[1]]) >= 0
+			and orientation(points[q[-2]], points[b], points[p[1]]) >= 0):
+			merged = p + q[1:-1]
+			polys[i] = merged
+			del polys[j]
+			del owner[(a, b)]
+			del owner[(b, a)]
+			for k in range(len(q) - 1):
+				owner[(q[k], q[k+1])] = i
+	index = dict((i, n) for n, i in enumerate(sorted(polys.keys())))
+	polygons = [polys[i] for i in sorted(polys.keys())]
+	adjacency = [[] for _ in polygons]
+	for (a, b), i in owner.items():
+		j = owner.get((b, a))
+		if j is not None and j != i:
+			adjacency[index[i]].append((index[j], (a, b)))
+	return polygons, adjacency
+
+### Builds a nav mesh for the free space of a world of the given dimensions around the obstacles (lists of points).
+### Returns (polygons, adjacency): polygons are lists of points (convex, counterclockwise) and adjacency[i] is a list
+### of (j, (p1, p2)) for every polygon j that shares the edge from p1 to p2 with polygon i.
+def buildNavMesh(dimensions, obstacles):
+	mesh, triangles = triangulateFreeSpace(dimensions, obstacles)
+	polys, adjacency = mergeConvex(mesh.points, triangles, mesh.constrained)
+	polygons = [[mesh.points[v] for v in poly] for poly in polys]
+	portals = [[(j, (mesh.points[a], mesh.points[b])) for j, (a, b) in adj] for adj in adjacency]
+	return polygons, portals
@@ -53,12 +53,13 @@ class NavMeshUtils:
 	@staticmethod
 	def myDoDebug(nav, world, point):
 		drawCross(world.debug, point, (0, 255, 0), 10, 2)
-		for poly in nav.navmesh:
-			if pointInsidePolygonPoints(point, poly):
-				drawPolygon(poly, world.debug, (255, 0, 0), 3, False)
-				#centroid = getCentroid(poly) 
-				centroid = [sum(p)/len(poly) for p in zip(*poly)]
-				drawCross(world.debug, centroid, (255, 0, 0), 5, 2)
+		i = nav.locate(point)
+		if i is not None:
+			poly = nav.navmesh[i]
+			drawPolygon(poly, world.debug, (255, 0, 0), 3, False)
+			#centroid = getCentroid(poly) 
+			centroid = [sum(p)/len(poly) for p in zip(*poly)]
+			drawCross(world.debug, centroid, (255, 0, 0), 5, 2)
 
 	@staticmethod
 	# Draws the locations of centroids for all passed-in obstacles.
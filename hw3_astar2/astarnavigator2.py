@@ -39,6 +39,7 @@ class AStarNavigator2(PathNetworkNavigator):
 	### dest: the place the agent is told to go to
 	def computePath(self, source, dest):
 		self.setPath(None)
+		self.request = None
 		### Make sure the next and dist matrices exist
 		# print("main", dest)
 		if self.agent != None and self.world != None: 
@@ -48,34 +49,37 @@ class AStarNavigator2(PathNetworkNavigator):
 			### Determine if there are no obstacles between source and destination (hint: cast rays against world.getLines(), check for clearance).
 			### Tell the agent to move to dest
 			
-			hold = clearShot(source, dest, self.world.getLinesWithoutBorders(), self.world.getPoints(), self.agent)
+			hold = clearShot(source, dest, self.world, self.agent)
 			# print("main clear",hold)
 			if hold:
 				self.agent.moveToTarget(dest)
 			else:
 				### Step 2: If there is an obstacle, create the path that will move around the obstacles.
 				### Find the path nodes closest to source and destination.
-				start = getOnPathNetwork(source, self.pathnodes, self.world.getLinesWithoutBorders(), self.agent)
-				end = getOnPathNetwork(dest, self.pathnodes, self.world.getLinesWithoutBorders(), self.agent)
+				start = getOnPathNetwork(source, self.pathnodes, self.world, self.agent)
+				end = getOnPathNetwork(dest, self.pathnodes, self.world, self.agent)
 				# print("start",start)
 				# print("end",end)
 				if start != None and end != None:
-					### Remove edges from the path network that intersect gates
-					newnetwork = unobstructedNetwork(self.pathnetwork, self.world.getGates(), self.world)
-					# print("\n",newnetwork)
-					closedlist = []
-					### Create the path by traversing the pathnode network until the path node closest to the destination is reached
-					path, closedlist = astar(start, end, newnetwork)
-					if path is not None and len(path) > 0:
-						### Determine whether shortcuts are available
-						path = shortcutPath(source, dest, path, self.world, self.agent)
-						### Store the path by calling self.setPath()
-						self.setPath(path)
-						if self.path is not None and len(self.path) > 0:
-							### Tell the agent to move to the first node in the path (and pop the first node off the path)
-							first = self.path.pop(0)
-							self.agent.moveToTarget(first)
+					### Skip edges of the path network that intersect gates. Paths are cached per path network and gate set,
+					### so repeated queries (e.g., from clones heading for the same places) are lookups.
+					### Create the path by traversing the pathnode network until the path node closest to the destination is reached.
+					### The search is queued with the world's path scheduler, so the path may arrive on a later tick.
+					graph = getPathGraph(self.pathnetwork)
+					self.requestPath(graph, start, end, False, lambda path: self.followPath(source, dest, path))
 		return None
+
+	### Called with the path requested by computePath()
+	def followPath(self, source, dest, path):
+		if path is not None and len(path) > 0:
+			### Determine whether shortcuts are available
+			path = shortcutPath(source, dest, path, self.world, self.agent)
+			### Store the path by calling self.setPath()
+			self.setPath(path)
+			if self.path is not None and len(self.path) > 0:
+				### Tell the agent to move to the first node in the path (and pop the first node off the path)
+				first = self.path.pop(0)
+				self.agent.moveToTarget(first)
 		
 	### Called when the agent gets to a node in the path.
 	### self: the navigator object
@@ -104,65 +108,14 @@ def unobstructedNetwork(network, worldLines, world):
 	return newnetwork
 
 
-def offSets(node1, node2, agent_radius):
-    # Offset by the agent's radius in both horizontal and vertical directions
-    offsetNode1Top = (
-        node1[0],
-        node1[1] + agent_radius
-    )
-    offsetNode2Top = (
-        node2[0],
-        node2[1] + agent_radius
-    )
-    offsetNode1Bottom = (
-        node1[0],
-        node1[1] - agent_radius
-    )
-    offsetNode2Bottom = (
-        node2[0],
-        node2[1] - agent_radius
-    )
-
-    offsetNode1Right = (
-        node1[0] + agent_radius,
-        node1[1]
-    )
-    offsetNode2Right = (
-        node2[0] + agent_radius,
-        node2[1]
-    )
-
-    offsetNode1Left = (
-        node1[0] - agent_radius,
-        node1[1]
-    )
-    offsetNode2Left = (
-        node2[0] - agent_radius,
-        node2[1]
-    )
-
-    return {
-        "top": (offsetNode1Top, offsetNode2Top),
-        "bottom": (offsetNode1Bottom, offsetNode2Bottom),
-        "right": (offsetNode1Right, offsetNode2Right),
-        "left": (offsetNode1Left, offsetNode2Left)
-    }
-
 ### Returns true if the agent can get from p1 to p2 directly without running into an obstacle.
+### The world's lines grown by the agent's radius are cached per radius, so this is a single ray test.
 ### p1: the current location of the agent
 ### p2: the destination of the agent
-### worldLines: all the lines in the world
+### world: pointer to the world
 ### agent: the Agent object
-def clearShot(p1, p2, worldLines, worldPoints, agent, offset_nodes=None):
-    if offset_nodes is None:
-        offset_nodes = offSets(p1, p2, agent.getMaxRadius())
-
-    for offset1, offset2 in offset_nodes.values():
-        hit = rayTraceWorldNoEndPoints(offset1, offset2, worldLines)
-        if hit is not None:
-            return False
-
-    return True
+def clearShot(p1, p2, world, agent):
+    return world.getInflatedLines(agent.getMaxRadius()).clear(p1, p2)
 
 def hitsObstacles(p1, p2, lines):
     hit = rayTraceWorldNoEndPoints(p1, p2, lines)
@@ -175,20 +128,12 @@ def hitsObstacles(p1, p2, lines):
 ### location: the location to check from (typically where the agent is starting from or where the agent wants to go to) as an (x, y) point
 ### pathnodes: a list of pathnodes, where each pathnode is an (x, y) point
 ### world: pointer to the world
-def getOnPathNetwork(location, pathnodes, worldLines, agent):
-    closest_node = None
-    min_distance = float('inf')  # Initialize with infinity
-
-    for node in pathnodes:
-        if clearShot(location, node, worldLines, [], agent):
-            # print("Location 1", location)
-            # print("node",node)
-            dist = distance(location, node)
-            if dist < min_distance:
-                closest_node = node
-                min_distance = dist
-
-    return closest_node
+### The world keeps a table from each cell of a coarse grid to the pathnodes ordered by distance, so only the closest few
+### pathnodes are tested.
+def getOnPathNetwork(location, pathnodes, world, agent):
+    if len(pathnodes) == 0:
+        return None
+    return world.getPathNodeTable(pathnodes, agent.getMaxRadius()).closest(location)
 
 ### Implement the a-star algorithm
 ### Given:
@@ -222,48 +167,10 @@ def getOnPathNetwork(location, pathnodes, worldLines, agent):
 #             break
 
 #     return path, closed
-def backTrack(trackNodes, currentNode, parentNode):
-	path = []
-	while currentNode is not None:
-		path.append(currentNode)
-		currentNode = parentNode
-
-		if parentNode is None:
-			break
-		else:
-			parentNode = next((tn[2] for tn in trackNodes if tn[1] == parentNode), None)
-	path.reverse()
- 
-	return path
 def astar(init, goal, network):
+	return getPathGraph(network).search(init, goal)
 
 
-    path = []
-    open = [(0, init, None)]
-    close = []
-    visited = copy.deepcopy(open)
-
-    while open:
-        holdScore, currentNode, parentNode = heapq.heappop(open)
-        
-        if currentNode == goal:
-            path = backTrack(visited, currentNode, parentNode)
-            return path, close
-
-        visited.append((holdScore, currentNode, parentNode))
-        close.append(currentNode)
-
-        for edge in network:
-            if currentNode in edge:
-                nextNode = edge[1] if currentNode == edge[0] else edge[0]
-                if nextNode not in close:
-                    holdScore = distance(nextNode, init)
-                    hScore = distance(nextNode, goal)
-                    fScore = holdScore + hScore
-                    heapq.heappush(open, (fScore, nextNode, currentNode))
-
-    return path, close
-
 # Navigator
 ### Path: the planned path of nodes
 ### World: a pointer to the world object
@@ -305,10 +212,10 @@ def myCheckpoint(nav):
     target = nav.agent.moveTarget
     agent_radius = nav.agent.getMaxRadius()
     # print("path calling",nav.path)
-    if rayTraceWorld(currPos, target, nav.world.getLinesWithoutBorders()):
+    if rayTraceWorld(currPos, target, nav.world.getSegmentGrid(False)):
         nav.computePath(currPos, nav.destination)
     elif nav.path and len(nav.path) > 2:
-        if rayTraceWorld(nav.path[0], nav.path[1], nav.world.getLinesWithoutBorders()):
+        if rayTraceWorld(nav.path[0], nav.path[1], nav.world.getSegmentGrid(False)):
             nav.computePath(currPos, nav.destination)
     return None
 
@@ -324,7 +231,7 @@ def shortcutPath(source, dest, path, world, agent):
     pathCopy = copy.deepcopy(path)
     agentRadius = agent.getMaxRadius()
     
-    if clearShot(source, dest, world.getLinesWithoutBorders(), [], agent):
+    if clearShot(source, dest, world, agent):
         return []
 
     pathCopy = [source] + pathCopy + [dest]
@@ -332,7 +239,7 @@ def shortcutPath(source, dest, path, world, agent):
     for currentIdx in range(len(pathCopy)):
         nextIdx = currentIdx + 2
         while nextIdx < len(pathCopy):
-            if clearShot(pathCopy[currentIdx], pathCopy[nextIdx], world.getLinesWithoutBorders(), [], agent):
+            if clearShot(pathCopy[currentIdx], pathCopy[nextIdx], world, agent):
                 pathCopy.pop(nextIdx - 1)
             else:
                 nextIdx += 1
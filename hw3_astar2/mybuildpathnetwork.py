@@ -16,7 +16,7 @@
  * limitations under the License.
 '''
 
-import sys, pygame, math, numpy, random, time, copy, operator
+import sys, pygame, math, numpy, random, time, copy, operator, multiprocessing
 from pygame.locals import *
 
 from constants import *
@@ -24,68 +24,23 @@ from utils import *
 from core import *
 
 # Creates the path network as a list of lines between all path nodes that are traversable by the agent.
+# A pair of path nodes is connected if an agent of this size can move straight from one to the other without touching
+# an obstacle: the line between them must not enter the obstacle lines grown by the agent's radius (InflatedLines).
+# The lines for every pair are tested in one batch, in chunks spread over a process pool (see parallelMap()).
 def myBuildPathNetwork(pathnodes, world, agent=None):
     lines = []  
     agent_radius = agent.getMaxRadius() # Get the agent's physical size
-    # print(agent_radius)
-    # print(agent_radius*2)
-    
-    # check for obstacles
-    def hasObstacleBetween(point1, point2):
-        for obstacle in world.obstacles:
-            # for edge in obstacle.getLines():
-                if not (rayTraceWorld(point1, point2, list(obstacle.getLines())) is None):
-                    return True
-        return False
-    
-    for i in range(len(pathnodes)):
-        for j in range(i + 1, len(pathnodes)):
-            node1 = pathnodes[i]
-            node2 = pathnodes[j]
-            # print(node1, node2)
 
-            # Check for obstacles between the given line 
-            if not hasObstacleBetween(node1, node2):
-                # Offset by the agent's radius in both horizontal and vertical directions
-                offsetNode1Top = (
-                    node1[0],
-                    node1[1] + agent_radius
-                )
-                offsetNode2Top = (
-                    node2[0],
-                    node2[1] + agent_radius
-                )
-                offsetNode1Bottom = (
-                    node1[0],
-                    node1[1] - agent_radius
-                )
-                offsetNode2Bottom = (
-                    node2[0],
-                    node2[1] - agent_radius
-                )
+    # obstacle lines only, the screen borders don't count
+    obstacleLines = [line for obstacle in world.obstacles for line in obstacle.getLines()]
+    inflated = InflatedLines(obstacleLines, agent_radius)
 
-                offsetNode1Right = (
-                    node1[0] + agent_radius,
-                    node1[1]
-                )
-                offsetNode2Right = (
-                    node2[0] + agent_radius,
-                    node2[1]
-                )
+    pairs = [(pathnodes[i], pathnodes[j]) for i in range(len(pathnodes)) for j in range(i + 1, len(pathnodes))]
+    clear = inflated.clearMany(pairs, processes = multiprocessing.cpu_count())
 
-                offsetNode1Left = (
-                    node1[0] - agent_radius,
-                    node1[1]
-                )
-                offsetNode2Left = (
-                    node2[0] - agent_radius,
-                    node2[1]
-                )
-
-                # Check for enough space on all sides 
-                if (not hasObstacleBetween(offsetNode1Top, offsetNode2Top) and not hasObstacleBetween(offsetNode1Bottom, offsetNode2Bottom) and
-                    not hasObstacleBetween(offsetNode1Right, offsetNode2Right) and not hasObstacleBetween(offsetNode1Left, offsetNode2Left)):
-                    lines.append((node1, node2))
+    # Check for enough space on all sides
+    for k, (node1, node2) in enumerate(pairs):
+        if clear[k]:
+            lines.append((node1, node2))
 
     return lines
-
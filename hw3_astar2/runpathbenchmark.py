@@ -0,0 +1,235 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import sys, math, numpy, random, time, copy, re, io, json, argparse, contextlib, statistics, tracemalloc
+import utils
+from utils import *
+from runromania import AStarRunner, dic2Nodes, dic2Network, locations, romania
+
+############################
+### Pathfinding benchmark
+###
+### Times path queries on the Romania graph, the path networks of the runastarnavigator*.py maps and generated large
+### graphs, with each of the searches a navigator can use: plain A* (PathGraph.search), the all-pairs tables (tablePath)
+### and the path cache before and after it has seen the query (cachedPath). For every query it records the wall time
+### (median of several runs), the nodes expanded, the heap operations, the peak memory allocated and the path cost.
+### Results can be written as JSON and compared against an earlier run to flag regressions.
+### Usage: python runpathbenchmark.py [--repeat N] [--queries N] [--sizes N,N] [--out file] [--baseline file] [--tolerance T]
+
+MAPS = ['runastarnavigator0.py', 'runastarnavigator1.py', 'runastarnavigator2.py', 'runastarnavigator3.py']
+VARIANTS = ['astar', 'apsp', 'cached-cold', 'cached-warm']
+### Number of pathnodes in the generated graphs, and how many nearest neighbors each pathnode is linked to
+GRAPHSIZES = [200, 800]
+GRAPHDEGREE = 6
+GRAPHSEED = 1
+### Graphs with more pairs than this are benchmarked on a seeded sample of pairs
+QUERIES = 200
+REPEAT = 5
+### A variant is flagged when its mean time per query grows by more than this fraction over the baseline
+TOLERANCE = 0.25
+### ...and by more than this many microseconds, since the fastest queries take only a few
+TIMENOISE = 5.0
+
+
+### Returns the pathnodes and path network a runastarnavigator*.py script sets up, running the script headless up to
+### (but not including) world.run()
+def loadRunMap(script):
+	source = open(script).read()
+	source = source[:source.index('\nworld.run()')]
+	source = re.sub(r'^(world = \w*World\(.*)\)\s*$', r'\1, headless = True)', source, flags = re.M)
+	scope = {'__name__': 'runmap'}
+	with contextlib.redirect_stdout(io.StringIO()):
+		exec(compile(source, script, 'exec'), scope)
+	return scope['nav'].pathnodes, scope['nav'].pathnetwork
+
+### A seeded random graph: num pathnodes spread over a square world, each linked to its degree nearest neighbors
+def makeGraph(num, degree = GRAPHDEGREE, seed = GRAPHSEED):
+	rand = random.Random(seed)
+	size = 10000
+	pathnodes = list(set((rand.randint(0, size), rand.randint(0, size)) for _ in range(num)))
+	pathnodes.sort()
+	points = numpy.array(pathnodes, dtype = float)
+	dists = numpy.linalg.norm(points[:, None, :] - points[None, :, :], axis = 2)
+	network = set()
+	for i in range(len(pathnodes)):
+		for j in numpy.argsort(dists[i])[1:degree+1]:
+			network.add((pathnodes[min(i, j)], pathnodes[max(i, j)]))
+	return pathnodes, sorted(network)
+
+def pathCost(path):
+	if len(path) == 0:
+		return None
+	return sum(distance(path[i], path[i+1]) for i in range(len(path) - 1))
+
+### Stands in for utils.heapq while a query is instrumented, counting pushes and pops
+class CountingHeap(object):
+
+	def __init__(self):
+		self.count = 0
+
+	def heappush(self, heap, item):
+		self.count = self.count + 1
+		heapq.heappush(heap, item)
+
+	def heappop(self, heap):
+		self.count = self.count + 1
+		return heapq.heappop(heap)
+
+
+############################
+### PathBenchmark
+###
+### An AStarRunner that runs each variant over the pairs (every pair, or a sample of them on big graphs) on a graph of
+### its own and records measurements instead of printing paths.
+
+class PathBenchmark(AStarRunner):
+
+	### name: the name of the graph in the results
+	### graph: the PathGraph compiled from the network for this benchmark only, so that caches start empty
+	### compileTime: seconds spent compiling graph
+	### queries: the (init, goal) pairs to run
+
+	def __init__(self, name, pathnodes, network, queries = QUERIES):
+		AStarRunner.__init__(self, pathnodes, network)
+		self.name = name
+		start = time.perf_counter()
+		self.graph = PathGraph(network)
+		self.compileTime = time.perf_counter() - start
+		self.queries = list(self.pairs())
+		if len(self.queries) > queries:
+			self.queries = random.Random(GRAPHSEED).sample(self.queries, queries)
+
+	### Returns (setup time in seconds, query function, function to call before each query) for a variant
+	def prepare(self, variant):
+		graph = self.graph
+		if variant == 'astar':
+			return self.compileTime, lambda init, goal: graph.search(init, goal), None
+		if variant == 'apsp':
+			start = time.perf_counter()
+			graph.getShortestPaths()
+			return self.compileTime + time.perf_counter() - start, lambda init, goal: graph.tablePath(init, goal), None
+		if variant == 'cached-cold':
+			return self.compileTime, lambda init, goal: graph.cachedPath(init, goal, []), graph.pathCache.clear
+		if variant == 'cached-warm':
+			for init, goal in self.queries:
+				graph.cachedPath(init, goal, [])
+			return self.compileTime, lambda init, goal: graph.cachedPath(init, goal, []), None
+		raise ValueError("unknown variant " + variant)
+
+	### Runs every query of one variant and returns (summary, records)
+	def run(self, variant, repeat = REPEAT):
+		setup, search, reset = self.prepare(variant)
+		records = []
+		for init, goal in self.queries:
+			times = []
+			for _ in range(repeat):
+				if reset is not None:
+					reset()
+				start = time.perf_counter()
+				path, closed = search(init, goal)
+				times.append(time.perf_counter() - start)
+			# One more run, instrumented, for the heap operations and memory (kept out of the timings)
+			if reset is not None:
+				reset()
+			counter = CountingHeap()
+			utils.heapq = counter
+			tracemalloc.start()
+			try:
+				before = tracemalloc.get_traced_memory()[0]
+				search(init, goal)
+				peak = tracemalloc.get_traced_memory()[1] - before
+			finally:
+				tracemalloc.stop()
+				utils.heapq = heapq
+			records.append(dict(graph = self.name, variant = variant, start = list(init), end = list(goal),
+				time = statistics.median(times) * 1000000.0, expanded = len(closed), heapOps = counter.count,
+				peakMemory = peak, cost = pathCost(path)))
+		self.nodesExpanded = sum(r['expanded'] for r in records)
+		summary = dict(graph = self.name, variant = variant, nodes = len(self.graph.nodes), edges = len(self.graph.edges),
+			queries = len(records), setupTime = setup * 1000.0,
+			meanTime = statistics.mean(r['time'] for r in records) if records else 0.0,
+			meanExpanded = self.nodesExpanded / float(max(len(records), 1)),
+			meanHeapOps = sum(r['heapOps'] for r in records) / float(max(len(records), 1)),
+			peakMemory = max([r['peakMemory'] for r in records] or [0]),
+			totalCost = sum(r['cost'] for r in records if r['cost'] is not None))
+		return summary, records
+
+
+### Returns the graphs to benchmark as (name, pathnodes, network)
+def benchmarkGraphs(sizes):
+	graphs = [('romania', dic2Nodes(locations), dic2Network(locations, romania))]
+	for script in MAPS:
+		pathnodes, network = loadRunMap(script)
+		graphs.append((script[:-3], pathnodes, network))
+	for num in sizes:
+		pathnodes, network = makeGraph(num)
+		graphs.append(('random%d' % num, pathnodes, network))
+	return graphs
+
+### Compares summaries against the summaries of a baseline run and returns a list of messages, one per regression.
+### Times may grow by tolerance (or TIMENOISE); nodes expanded, heap operations and path costs must not change for the worse.
+def findRegressions(summaries, baseline, tolerance = TOLERANCE):
+	old = dict(((s['graph'], s['variant']), s) for s in baseline['summaries'])
+	regressions = []
+	for s in summaries:
+		b = old.get((s['graph'], s['variant']))
+		if b is None:
+			continue
+		name = "%s/%s" % (s['graph'], s['variant'])
+		if s['meanTime'] > b['meanTime'] * (1.0 + tolerance) and s['meanTime'] - b['meanTime'] > TIMENOISE:
+			regressions.append("%s: %.1fus per query, was %.1fus" % (name, s['meanTime'], b['meanTime']))
+		if s['meanExpanded'] > b['meanExpanded'] + EPSILON:
+			regressions.append("%s: %.1f nodes expanded per query, was %.1f" % (name, s['meanExpanded'], b['meanExpanded']))
+		if s['meanHeapOps'] > b['meanHeapOps'] + EPSILON:
+			regressions.append("%s: %.1f heap operations per query, was %.1f" % (name, s['meanHeapOps'], b['meanHeapOps']))
+		if abs(s['totalCost'] - b['totalCost']) > 0.001:
+			regressions.append("%s: total path cost %.3f, was %.3f" % (name, s['totalCost'], b['totalCost']))
+	return regressions
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Benchmark path queries across graphs and search variants.")
+	parser.add_argument('--repeat', type = int, default = REPEAT, help = "timed runs per query (the median is kept)")
+	parser.add_argument('--queries', type = int, default = QUERIES, help = "maximum queries per graph")
+	parser.add_argument('--sizes', default = ','.join(map(str, GRAPHSIZES)), help = "pathnodes in the generated graphs")
+	parser.add_argument('--out', help = "write the results to this JSON file")
+	parser.add_argument('--baseline', help = "JSON file written by an earlier run to compare against")
+	parser.add_argument('--tolerance', type = float, default = TOLERANCE, help = "allowed growth in mean time per query")
+	args = parser.parse_args()
+	sizes = [int(x) for x in args.sizes.split(',') if x]
+	summaries = []
+	records = []
+	print("%-20s %-12s %6s %6s %8s %10s %10s %9s %9s %10s %12s" % ("graph", "variant", "nodes", "edges", "queries", "setup(ms)", "us/query", "expanded", "heapops", "peak(B)", "cost"))
+	for name, pathnodes, network in benchmarkGraphs(sizes):
+		bench = PathBenchmark(name, pathnodes, network, args.queries)
+		for variant in VARIANTS:
+			summary, results = bench.run(variant, args.repeat)
+			summaries.append(summary)
+			records.extend(results)
+			print("%-20s %-12s %6d %6d %8d %10.2f %10.1f %9.1f %9.1f %10d %12.1f" % (name, variant, summary['nodes'], summary['edges'], summary['queries'], summary['setupTime'], summary['meanTime'], summary['meanExpanded'], summary['meanHeapOps'], summary['peakMemory'], summary['totalCost']))
+	results = dict(python = sys.version.split()[0], repeat = args.repeat, summaries = summaries, queries = records)
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(results, f, indent = 1)
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = findRegressions(summaries, json.load(f), args.tolerance)
+		for r in regressions:
+			print("REGRESSION " + r)
+		if len(regressions) > 0:
+			sys.exit(1)
+		print("no regressions against " + args.baseline)
@@ -21,23 +21,28 @@ from astarnavigator2 import astar
 
 class AStarRunner:
 
-	def __init__(self, pathnodes, network):
+	### search: the search to run on every pair, called as search(init, goal, network) and returning (path, closed)
+	def __init__(self, pathnodes, network, search = astar):
 		self.nodesExpanded = 0
 		self.pathnodes = pathnodes
 		self.network = network
+		self.search = search
+
+	### Every pair of distinct pathnodes, each pair once (in one direction only)
+	def pairs(self):
+		for i, p1 in enumerate(self.pathnodes):
+			for p2 in self.pathnodes[i+1:]:
+				if p1 != p2:
+					yield p1, p2
 
 	def run(self):
-		old_pairs = []
-		for p1 in self.pathnodes:
-			for p2 in self.pathnodes:
-				if p1 != p2 and (p2, p1) not in old_pairs:
-					path, closed = astar(p1, p2, self.network)
-					print("start: ", loc2Name(p1, locations), " end: ", loc2Name(p2, locations))
-					print("path: ", list(map(lambda x: loc2Name(x, locations), path)))
-					print("closed: ", list(map(lambda x: loc2Name(x, locations), closed)))
-					print("number of nodes expanded", len(closed), "\n")
-					self.nodesExpanded += len(closed)
-					old_pairs.append((p1, p2))
+		for p1, p2 in self.pairs():
+			path, closed = self.search(p1, p2, self.network)
+			print("start: ", loc2Name(p1, locations), " end: ", loc2Name(p2, locations))
+			print("path: ", list(map(lambda x: loc2Name(x, locations), path)))
+			print("closed: ", list(map(lambda x: loc2Name(x, locations), closed)))
+			print("number of nodes expanded", len(closed), "\n")
+			self.nodesExpanded += len(closed)
 		print("number of total nodes expanded", self.nodesExpanded)
 
 def dic2Nodes(locations):
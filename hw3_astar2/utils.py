@@ -20,18 +20,41 @@ import sys, pygame, math, numpy, random, time, copy
 from pygame.locals import * 
 from constants import *
 from functools import reduce
+import heapq, collections, multiprocessing, signal
 
 
 ########################
 ### PYGAME STUFF
 
+### Decoded images, keyed by (name, colorkey, converted for the display). Shared by every load_image call in the process.
+IMAGECACHE = {}
+### Rotated images, keyed by the IMAGECACHE key plus the angle rounded to ROTATIONSTEP degrees.
+ROTATIONCACHE = {}
+ROTATIONSTEP = 1
+
 def load_image(name, colorkey=None):
-  image = pygame.image.load(name)
-  image = image.convert()
-  if colorkey is not None:
-    if colorkey is -1:
-      colorkey = image.get_at((0,0))
-    image.set_colorkey(colorkey, RLEACCEL)
+  key = (name, colorkey, pygame.display.get_surface() is not None)
+  if key not in IMAGECACHE:
+    image = pygame.image.load(name)
+    if key[2]:
+      image = image.convert()
+    if colorkey is not None:
+      if colorkey is -1:
+        colorkey = image.get_at((0,0))
+      image.set_colorkey(colorkey, RLEACCEL)
+    IMAGECACHE[key] = image
+  # Hand out a copy so nobody can draw on the cached image
+  image = IMAGECACHE[key].copy()
+  return image, image.get_rect()
+
+### The image loaded by load_image(name, colorkey), rotated counterclockwise by angle degrees (quantized to ROTATIONSTEP).
+def load_rotated_image(name, colorkey, angle):
+  step = int(round(angle / float(ROTATIONSTEP))) * ROTATIONSTEP % 360
+  key = (name, colorkey, pygame.display.get_surface() is not None, step)
+  if key not in ROTATIONCACHE:
+    image, rect = load_image(name, colorkey)
+    ROTATIONCACHE[key] = pygame.transform.rotate(image, step)
+  image = ROTATIONCACHE[key].copy()
   return image, image.get_rect()
 
 
@@ -146,6 +169,8 @@ def rayTrace(p1, p2, line):
 	#pygame.draw.line(background, (0, 0, 0), p1, p2)
 	
 def rayTraceWorld(p1, p2, worldLines):
+	if isinstance(worldLines, SegmentGrid):
+		return worldLines.rayTrace(p1, p2)
 	for l in worldLines:
 		hit = rayTrace(p1, p2, l)
 		if hit != None:
@@ -168,12 +193,538 @@ def rayTraceNoEndpoints(p1, p2, line):
 
 # Check whether the line between p1 and p2 intersects any line anywhere except an endpoint of any of the lines.
 def rayTraceWorldNoEndPoints(p1, p2, worldLines):
+	if isinstance(worldLines, SegmentGrid):
+		return worldLines.rayTraceNoEndPoints(p1, p2)
 	for l in worldLines:
 		hit = rayTraceNoEndpoints(p1, p2, l)
 		if hit != None:
 			return hit
 	return None
 
+# Returns [function(item) for item in items], with the calls spread over a pool of up to processes worker processes
+# where processes can be forked. Elsewhere (and with processes = 1) everything runs here, so run scripts without a
+# __main__ guard stay safe. The workers inherit function and items when they are forked: only the item indices and the
+# results are sent between processes. The workers are closed and joined rather than terminated: pygame catches SIGTERM,
+# so a terminated worker that has already initialized pygame can keep running and leave the join waiting forever.
+def parallelMap(function, items, processes = 1):
+	global _parallelWork
+	items = list(items)
+	if processes <= 1 or len(items) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+		return [function(item) for item in items]
+	_parallelWork = (function, items)
+	try:
+		with multiprocessing.get_context('fork').Pool(min(processes, len(items)), _parallelStart) as pool:
+			results = pool.map(_parallelCall, range(len(items)))
+			pool.close()
+			pool.join()
+			return results
+	finally:
+		_parallelWork = None
+
+### Forked workers go back to the default SIGTERM, so Pool.terminate() still stops them if map() fails
+def _parallelStart():
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+_parallelWork = None
+
+def _parallelCall(i):
+	function, items = _parallelWork
+	return function(items[i])
+
+
+############################
+### Batch ray tracing
+###
+### Vectorized versions of rayTrace and rayTraceNoEndpoints for N rays against M segments at once.
+### Rays and segments are array-likes of shape (N, 2, 2) and (M, 2, 2): ((x1, y1), (x2, y2)) per row.
+### Uses the parametric form p1 + t*(p2-p1) = q1 + u*(q2-q1) with a tolerance of EPSILON pixels along each segment.
+### endpoints = False gives the rayTraceNoEndpoints rules: a ray identical to a segment (either direction) always hits it,
+### and a ray sharing an endpoint with a segment never does.
+
+def _batchCross(ax, ay, bx, by):
+	return ax * by - ay * bx
+
+### Returns (hit, t): N x M boolean matrix of hits and the ray parameter t of the first point of contact (inf where there is no hit).
+def _rayTraceBatchParams(rays, segments, endpoints = True):
+	rays = numpy.asarray(rays, dtype = float).reshape(-1, 2, 2)
+	segments = numpy.asarray(segments, dtype = float).reshape(-1, 2, 2)
+	px, py = rays[:, 0, 0][:, None], rays[:, 0, 1][:, None]
+	rx, ry = (rays[:, 1, 0] - rays[:, 0, 0])[:, None], (rays[:, 1, 1] - rays[:, 0, 1])[:, None]
+	qx, qy = segments[:, 0, 0][None, :], segments[:, 0, 1][None, :]
+	sx, sy = (segments[:, 1, 0] - segments[:, 0, 0])[None, :], (segments[:, 1, 1] - segments[:, 0, 1])[None, :]
+	rlen = numpy.hypot(rx, ry)
+	slen = numpy.hypot(sx, sy)
+	dx, dy = qx - px, qy - py
+	denom = _batchCross(rx, ry, sx, sy)
+	with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+		# Proper crossings
+		t = _batchCross(dx, dy, sx, sy) / denom
+		u = _batchCross(dx, dy, rx, ry) / denom
+		rtol = EPSILON / rlen
+		stol = EPSILON / slen
+		crossing = (numpy.abs(denom) > EPSILON) & (t >= -rtol) & (t <= 1 + rtol) & (u >= -stol) & (u <= 1 + stol)
+		# Collinear overlaps: project the segment onto the ray
+		collinear = (numpy.abs(denom) <= EPSILON) & (numpy.abs(_batchCross(dx, dy, rx, ry)) <= EPSILON * numpy.maximum(rlen, 1.0)) & (rlen > 0)
+		rr = rx * rx + ry * ry
+		ta = (dx * rx + dy * ry) / rr
+		tb = ((dx + sx) * rx + (dy + sy) * ry) / rr
+		lo = numpy.minimum(ta, tb)
+		hi = numpy.maximum(ta, tb)
+		overlap = collinear & (hi >= -rtol) & (lo <= 1 + rtol)
+		# Zero-length rays hit a segment if the point lies on it
+		ss = sx * sx + sy * sy
+		w = numpy.clip(-(dx * sx + dy * sy) / ss, 0.0, 1.0)
+		onSegment = (rlen == 0) & (numpy.hypot(dx + w * sx, dy + w * sy) <= EPSILON)
+	hit = crossing | overlap | onSegment
+	params = numpy.where(crossing, t, numpy.where(overlap, numpy.maximum(lo, 0.0), 0.0))
+	if not endpoints:
+		a1 = (rays[:, 0, :][:, None, :] == segments[:, 0, :][None, :, :]).all(axis = 2)
+		a2 = (rays[:, 1, :][:, None, :] == segments[:, 1, :][None, :, :]).all(axis = 2)
+		b1 = (rays[:, 0, :][:, None, :] == segments[:, 1, :][None, :, :]).all(axis = 2)
+		b2 = (rays[:, 1, :][:, None, :] == segments[:, 0, :][None, :, :]).all(axis = 2)
+		same = (a1 & a2) | (b1 & b2)
+		shared = a1 | a2 | b1 | b2
+		hit = same | (hit & ~shared)
+		params = numpy.where(same, 0.0, params)
+	return hit, numpy.where(hit, numpy.clip(params, 0.0, 1.0), INFINITY)
+
+### N x M boolean matrix: does ray i hit segment j?
+def rayTraceBatch(rays, segments, endpoints = True):
+	return _rayTraceBatchParams(rays, segments, endpoints)[0]
+
+### N booleans: does ray i hit any segment? Rays are processed in chunks to bound memory.
+def anyHitBatch(rays, segments, endpoints = True, chunk = 1024):
+	rays = numpy.asarray(rays, dtype = float).reshape(-1, 2, 2)
+	result = numpy.zeros(len(rays), dtype = bool)
+	if len(segments) == 0:
+		return result
+	for start in range(0, len(rays), chunk):
+		result[start:start+chunk] = rayTraceBatch(rays[start:start+chunk], segments, endpoints).any(axis = 1)
+	return result
+
+### For each ray, the hit closest to its start. Returns (points, t, index): N x 2 hit points (nan where there is no hit),
+### the ray parameters of those points (inf where there is no hit) and the index of the segment hit (-1 where there is no hit).
+def nearestHitBatch(rays, segments, endpoints = True):
+	rays = numpy.asarray(rays, dtype = float).reshape(-1, 2, 2)
+	if len(segments) == 0:
+		return numpy.full((len(rays), 2), numpy.nan), numpy.full(len(rays), INFINITY), numpy.full(len(rays), -1)
+	hit, params = _rayTraceBatchParams(rays, segments, endpoints)
+	index = params.argmin(axis = 1)
+	t = params[numpy.arange(len(rays)), index]
+	found = numpy.isfinite(t)
+	points = rays[:, 0, :] + numpy.where(found, t, 0.0)[:, None] * (rays[:, 1, :] - rays[:, 0, :])
+	points[~found] = numpy.nan
+	return points, t, numpy.where(found, index, -1)
+
+
+############################
+### SegmentGrid
+###
+### Uniform grid over a fixed set of lines, so that a ray is only tested against the lines that pass through the cells it crosses.
+### Answers the same queries as rayTraceWorld and rayTraceWorldNoEndPoints (first hit, in line order) and can be passed to them in place of a list of lines.
+
+class SegmentGrid(object):
+
+	### lines: the lines, in the order given
+	### cellsize: the width and height of a cell
+	### cells: dictionary mapping (column, row) to the indices of the lines passing through that cell
+
+	def __init__(self, lines, cellsize = None):
+		self.lines = list(lines)
+		if cellsize is None:
+			cellsize = 16.0
+			if len(self.lines) > 0:
+				xs = [p[0] for l in self.lines for p in l]
+				ys = [p[1] for l in self.lines for p in l]
+				cellsize = max(cellsize, max(max(xs) - min(xs), max(ys) - min(ys)) / 32.0)
+		self.cellsize = float(cellsize)
+		self.cells = {}
+		for i, l in enumerate(self.lines):
+			for cell in self.segmentCells(l[0], l[1]):
+				self.cells.setdefault(cell, []).append(i)
+
+	def getLines(self):
+		return self.lines
+
+	### The cells touched by the segment from p1 to p2, padded by a pixel on every side so that near-misses within EPSILON are still tested.
+	def segmentCells(self, p1, p2):
+		size = self.cellsize
+		pad = 1.0
+		dx = p2[0] - p1[0]
+		dy = p2[1] - p1[1]
+		minx = min(p1[0], p2[0]) - pad
+		maxx = max(p1[0], p2[0]) + pad
+		cells = []
+		for cx in range(int(math.floor(minx / size)), int(math.floor(maxx / size)) + 1):
+			# The part of the segment that falls within this column
+			if abs(dx) < EPSILON:
+				ya, yb = p1[1], p2[1]
+			else:
+				ta = min(1.0, max(0.0, (max(minx, cx * size) - p1[0]) / dx))
+				tb = min(1.0, max(0.0, (min(maxx, (cx + 1) * size) - p1[0]) / dx))
+				ya, yb = p1[1] + ta * dy, p1[1] + tb * dy
+			for cy in range(int(math.floor((min(ya, yb) - pad) / size)), int(math.floor((max(ya, yb) + pad) / size)) + 1):
+				cells.append((cx, cy))
+		return cells
+
+	### Indices of the lines that share a cell with the segment from p1 to p2, in line order
+	def candidates(self, p1, p2):
+		found = set()
+		for cell in self.segmentCells(p1, p2):
+			if cell in self.cells:
+				found.update(self.cells[cell])
+		return sorted(found)
+
+	### Same as rayTraceWorld(p1, p2, lines): the hit on the first line (in line order) that the ray intersects, or None
+	def rayTrace(self, p1, p2):
+		for i in self.candidates(p1, p2):
+			hit = rayTrace(p1, p2, self.lines[i])
+			if hit != None:
+				return hit
+		return None
+
+	### Same as rayTraceWorldNoEndPoints(p1, p2, lines)
+	def rayTraceNoEndPoints(self, p1, p2):
+		for i in self.candidates(p1, p2):
+			hit = rayTraceNoEndpoints(p1, p2, self.lines[i])
+			if hit != None:
+				return hit
+		return None
+
+	### True if the ray from p1 to p2 hits any line. endpoints = False ignores touching at endpoints, as in rayTraceNoEndpoints.
+	def anyHit(self, p1, p2, endpoints = True):
+		test = rayTrace if endpoints else rayTraceNoEndpoints
+		for cell in self.segmentCells(p1, p2):
+			for i in self.cells.get(cell, ()):
+				if test(p1, p2, self.lines[i]) != None:
+					return True
+		return False
+
+
+############################
+### InflatedLines
+###
+### The lines grown by a radius (their Minkowski sum with a disk), so that "can an agent of that radius move from p1 to p2
+### without touching a line" becomes one ray test. Each line becomes the convex outline of the line swept by a regular
+### polygon with INFLATESIDES sides that contains the disk, stored as counterclockwise edges (inside on the left).
+### A ray is blocked if it enters an outline from the outside, or if it crosses one of the lines themselves: a ray that
+### starts within radius of a line may still move away from it, but not through it.
+
+INFLATESIDES = 12
+
+class InflatedLines(object):
+
+	### radius: the radius the lines were grown by
+	### edges: read-only (n, 2, 2) array of outline edges
+	### grid: SegmentGrid over the outline edges, for single queries
+	### lines: read-only (m, 2, 2) array of the lines before they were grown
+	### core: SegmentGrid over the lines before they were grown, for single queries
+
+	def __init__(self, lines, radius, sides = INFLATESIDES):
+		self.radius = radius
+		edges = []
+		if radius > 0:
+			r = radius / math.cos(math.pi / sides)
+			disk = [(r * math.cos(2 * math.pi * k / sides), r * math.sin(2 * math.pi * k / sides)) for k in range(sides)]
+			for (a, b) in lines:
+				hull = convexHull([(a[0] + dx, a[1] + dy) for dx, dy in disk] + [(b[0] + dx, b[1] + dy) for dx, dy in disk])
+				edges.extend((hull[k-1], hull[k]) for k in range(len(hull)))
+		else:
+			for (a, b) in lines:
+				edges.append((tuple(a), tuple(b)))
+				edges.append((tuple(b), tuple(a)))
+		self.edges = numpy.array(edges, dtype = float).reshape(-1, 2, 2)
+		self.edges.setflags(write = False)
+		self.grid = SegmentGrid([(tuple(e[0]), tuple(e[1])) for e in edges])
+		lines = [(tuple(a), tuple(b)) for (a, b) in lines]
+		self.lines = numpy.array(lines, dtype = float).reshape(-1, 2, 2)
+		self.lines.setflags(write = False)
+		self.core = SegmentGrid(lines)
+
+	### True if an agent of this radius can move in a straight line from p1 to p2.
+	def clear(self, p1, p2):
+		lines = self.grid.lines
+		for i in self.grid.candidates(p1, p2):
+			a, b = lines[i]
+			if enters(p1, p2, a, b):
+				return False
+		return not self.core.anyHit(p1, p2)
+
+	### clear() for many rays ((x1, y1), (x2, y2)) at once, as an array of booleans. The rays are tested in chunks of chunk
+	### rays, spread over processes worker processes (see parallelMap()).
+	def clearMany(self, rays, chunk = 1024, processes = 1):
+		rays = numpy.asarray(rays, dtype = float).reshape(-1, 2, 2)
+		if len(rays) == 0:
+			return numpy.ones(0, dtype = bool)
+		return numpy.concatenate(parallelMap(self.clearChunk, [rays[start:start+chunk] for start in range(0, len(rays), chunk)], processes))
+
+	### clearMany() for one chunk of rays (an (n, 2, 2) array)
+	def clearChunk(self, rays, chunk = 1024):
+		result = numpy.ones(len(rays), dtype = bool)
+		if len(self.edges) == 0:
+			return result
+		ax, ay = self.edges[:, 0, 0][None, :], self.edges[:, 0, 1][None, :]
+		ex, ey = (self.edges[:, 1, 0] - self.edges[:, 0, 0])[None, :], (self.edges[:, 1, 1] - self.edges[:, 0, 1])[None, :]
+		for start in range(0, len(rays), chunk):
+			part = rays[start:start+chunk]
+			px, py = part[:, 0, 0][:, None], part[:, 0, 1][:, None]
+			qx, qy = part[:, 1, 0][:, None], part[:, 1, 1][:, None]
+			rx, ry = qx - px, qy - py
+			outside = _batchCross(ex, ey, px - ax, py - ay) < 0
+			inside = _batchCross(ex, ey, qx - ax, qy - ay) > 0
+			straddle = _batchCross(rx, ry, ax - px, ay - py) * _batchCross(rx, ry, ax + ex - px, ay + ey - py) <= 0
+			result[start:start+chunk] = ~(outside & inside & straddle).any(axis = 1)
+		# Rays that start inside an outline are still blocked by the line itself
+		result[result] = ~anyHitBatch(rays[result], self.lines, True, chunk)
+		return result
+
+### True if the segment from p1 to p2 crosses the edge from a to b going from its outside (right) to its inside (left)
+def enters(p1, p2, a, b):
+	ex = b[0] - a[0]
+	ey = b[1] - a[1]
+	if ex * (p1[1] - a[1]) - ey * (p1[0] - a[0]) >= 0 or ex * (p2[1] - a[1]) - ey * (p2[0] - a[0]) <= 0:
+		return False
+	rx = p2[0] - p1[0]
+	ry = p2[1] - p1[1]
+	return (rx * (a[1] - p1[1]) - ry * (a[0] - p1[0])) * (rx * (b[1] - p1[1]) - ry * (b[0] - p1[0])) <= 0
+
+### Convex hull of points (Andrew's monotone chain), counterclockwise, without collinear points
+def convexHull(points):
+	points = sorted(set(points))
+	if len(points) < 3:
+		return points
+	def half(points):
+		chain = []
+		for p in points:
+			while len(chain) >= 2 and crossProduct(chain[-2], chain[-1], p) <= 0:
+				chain.pop()
+			chain.append(p)
+		return chain
+	lower = half(points)
+	upper = half(list(reversed(points)))
+	return lower[:-1] + upper[:-1]
+
+
+############################
+### DistanceField
+###
+### Signed distance from points of the world to the nearest line, negative inside obstacles. Computed with numpy for a
+### grid of samples every resolution pixels (exact point-to-segment distances, as minimumDistance), so that clearance
+### and inside-obstacle lookups at any point are array indexing. signedDistances() gives exact values for arbitrary
+### points without building a field.
+###
+### Points are grouped into square blocks (DISTANCEBLOCKSIZE pixels, or larger for sparse points so that a block holds
+### about DISTANCEBLOCKPOINTS of them). A point is never further than half the block's diagonal from the block's center,
+### so the only lines that can be nearest to a point of the block are those within half the diagonal (plus the largest
+### distance from a point of the block to the line nearest the center) of the center. Only those lines are measured for
+### the block's points, which makes the cost grow with the number of points times the lines near them, instead of times
+### all the lines. Likewise, only the points within an obstacle's x range are tested against it.
+
+DISTANCEFIELDRESOLUTION = 4
+DISTANCEBLOCKSIZE = 64
+DISTANCEBLOCKPOINTS = 64
+
+### Squared distances (n, m) from each of points (n, 2) to each of lines (m, 2, 2)
+def segmentDistancesSquared(points, lines):
+	px, py = points[:, 0][:, None], points[:, 1][:, None]
+	ax, ay = lines[:, 0, 0][None, :], lines[:, 0, 1][None, :]
+	sx, sy = (lines[:, 1, 0] - lines[:, 0, 0])[None, :], (lines[:, 1, 1] - lines[:, 0, 1])[None, :]
+	ss = sx * sx + sy * sy
+	inverse = numpy.divide(1.0, ss, out = numpy.zeros_like(ss), where = ss > 0)
+	dx, dy = px - ax, py - ay
+	t = numpy.clip((dx * sx + dy * sy) * inverse, 0.0, 1.0)
+	dx, dy = dx - t * sx, dy - t * sy
+	return dx * dx + dy * dy
+
+### Distance from each of points (n, 2) to the nearest of lines (m, 2, 2), INFINITY if there are no lines
+def nearestLineDistances(points, lines, block = DISTANCEBLOCKSIZE, chunk = 256):
+	points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	lines = numpy.asarray(lines, dtype = float).reshape(-1, 2, 2)
+	result = numpy.full(len(points), INFINITY)
+	if len(points) == 0 or len(lines) == 0:
+		return result
+	area = max(numpy.ptp(points[:, 0]), block) * max(numpy.ptp(points[:, 1]), block)
+	block = max(block, math.sqrt(area * DISTANCEBLOCKPOINTS / len(points)))
+	keys = numpy.floor(points / block).astype(numpy.int64)
+	order = numpy.lexsort((keys[:, 1], keys[:, 0]))
+	keys = keys[order]
+	starts = numpy.concatenate([[0], numpy.nonzero(numpy.any(keys[1:] != keys[:-1], axis = 1))[0] + 1, [len(points)]])
+	centers = (keys[starts[:-1]] + 0.5) * block
+	diagonal = block * math.sqrt(2.0)
+	for first in range(0, len(centers), chunk):
+		near = numpy.sqrt(segmentDistancesSquared(centers[first:first+chunk], lines))
+		nearest = near.argmin(axis = 1)
+		for b in range(len(near)):
+			index = order[starts[first+b]:starts[first+b+1]]
+			# No point of the block is further than bound from the line nearest the center, and no line is nearer to
+			# any point of the block than its distance from the center less half the diagonal
+			bound = math.sqrt(segmentDistancesSquared(points[index], lines[nearest[b]:nearest[b]+1]).max())
+			candidates = lines[near[b] <= bound + diagonal / 2.0]
+			result[index] = segmentDistancesSquared(points[index], candidates).min(axis = 1)
+	return numpy.sqrt(result)
+
+### Signed distances for an array-like of points (n, 2): the distance to the nearest of lines, negated inside any of
+### polygons (lists or arrays of points)
+def signedDistances(points, lines, polygons, block = DISTANCEBLOCKSIZE):
+	points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	result = nearestLineDistances(points, lines, block)
+	inside = numpy.zeros(len(points), dtype = bool)
+	order = numpy.argsort(points[:, 0], kind = 'stable')
+	xs = points[order, 0]
+	for poly in polygons:
+		poly = numpy.asarray(poly, dtype = float).reshape(-1, 2)
+		if len(poly) < 3:
+			continue
+		index = order[numpy.searchsorted(xs, poly[:, 0].min(), 'left'):numpy.searchsorted(xs, poly[:, 0].max(), 'right')]
+		inside[index] |= pointsInPolygon(points[index], poly)
+	return numpy.where(inside, -result, result)
+
+class DistanceField(object):
+
+	### dimensions: the size of the world
+	### resolution: the distance between samples
+	### lines: read-only (n, 2, 2) array of the lines distances are measured to
+	### polygons: the obstacles (lists of points); points inside any of them get negative distances
+	### field: read-only array of the signed distance at sample (column * resolution, row * resolution), indexed [row, column]
+	### margin: lookups further than this from zero have the same sign at every point nearest to the sample
+
+	def __init__(self, dimensions, lines, polygons, resolution = DISTANCEFIELDRESOLUTION):
+		self.dimensions = dimensions
+		self.resolution = float(resolution)
+		self.lines = numpy.array(lines, dtype = float).reshape(-1, 2, 2)
+		self.lines.setflags(write = False)
+		self.polygons = [list(p) for p in polygons]
+		self.polygonArrays = [numpy.array(p, dtype = float).reshape(-1, 2) for p in self.polygons]
+		self.margin = self.resolution
+		columns = int(math.ceil(dimensions[0] / self.resolution)) + 1
+		rows = int(math.ceil(dimensions[1] / self.resolution)) + 1
+		xs, ys = numpy.meshgrid(numpy.arange(columns) * self.resolution, numpy.arange(rows) * self.resolution)
+		self.field = self.signedDistance(numpy.stack([xs.ravel(), ys.ravel()], axis = 1)).reshape(rows, columns)
+		self.field.setflags(write = False)
+
+	### Signed distances for an array-like of points (n, 2): the distance to the nearest line, negated inside obstacles.
+	def signedDistance(self, points):
+		return signedDistances(points, self.lines, self.polygonArrays)
+
+	### The signed distance at the sample nearest to point
+	def lookup(self, point):
+		rows, columns = self.field.shape
+		column = min(max(int(round(point[0] / self.resolution)), 0), columns - 1)
+		row = min(max(int(round(point[1] / self.resolution)), 0), rows - 1)
+		return self.field[row, column]
+
+	### Approximate clearance at point (within resolution of the true distance to the nearest line), negative inside obstacles
+	def getClearance(self, point):
+		return float(self.lookup(point))
+
+	### True if point is inside an obstacle. Same answer as pointInsidePolygonPoints on every obstacle, which is only called
+	### for points within margin of a line.
+	def isInside(self, point):
+		d = self.lookup(point)
+		if d > self.margin:
+			return False
+		if d < -self.margin:
+			return True
+		for poly in self.polygons:
+			if pointInsidePolygonPoints(point, poly):
+				return True
+		return False
+
+	### The samples with at least clearance to every line, as a list of points
+	def getFreeSamples(self, clearance = 0):
+		rows, columns = numpy.nonzero(self.field >= clearance)
+		return [(c * self.resolution, r * self.resolution) for r, c in zip(rows, columns)]
+
+	### A random sample point with at least clearance to every line (using rand, a random.Random), or None if there is none
+	def randomFreePoint(self, rand, clearance = 0):
+		rows, columns = numpy.nonzero(self.field >= clearance)
+		if len(rows) == 0:
+			return None
+		k = rand.randrange(len(rows))
+		return (columns[k] * self.resolution, rows[k] * self.resolution)
+
+### Crossing-number test for many points (n, 2) against one polygon (m, 2); boolean array of the points inside
+def pointsInPolygon(points, polygon):
+	inside = numpy.zeros(len(points), dtype = bool)
+	if len(polygon) < 3:
+		return inside
+	px, py = points[:, 0], points[:, 1]
+	box = (px >= polygon[:, 0].min()) & (px <= polygon[:, 0].max()) & (py >= polygon[:, 1].min()) & (py <= polygon[:, 1].max())
+	index = numpy.nonzero(box)[0]
+	if len(index) == 0:
+		return inside
+	px, py = px[index][:, None], py[index][:, None]
+	x1, y1 = numpy.roll(polygon, 1, axis = 0).T
+	x2, y2 = polygon.T
+	with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+		crosses = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * (x2 - x1) / (y2 - y1))
+	inside[index] = crosses.sum(axis = 1) % 2 == 1
+	return inside
+
+
+############################
+### PathNodeTable
+###
+### Finds the closest path node that an agent can move to in a straight line (getOnPathNetwork). The path nodes are
+### bucketed in a grid of square cells (about one node per cell, and no smaller than PATHNODECELLSIZE pixels). A query
+### searches the cells in rings around its own, and tests the nodes found in order of distance, as soon as no node in an
+### unsearched ring could be closer. So only the nodes closer than the answer (usually one or two) are ray tested, and
+### building the table is a single pass over the nodes.
+
+PATHNODECELLSIZE = 50
+
+class PathNodeTable(object):
+
+	### nodes: the path nodes
+	### inflated: the InflatedLines that decide whether a node is clear
+	### cellSize: the width and height of a cell
+	### buckets: (column, row) -> indices of the nodes in that cell
+
+	def __init__(self, pathnodes, inflated, dimensions, cellSize = PATHNODECELLSIZE):
+		self.nodes = [tuple(n) for n in pathnodes]
+		self.inflated = inflated
+		if len(self.nodes) > 0:
+			cellSize = max(cellSize, math.sqrt(dimensions[0] * dimensions[1] / float(len(self.nodes))))
+		self.cellSize = float(cellSize)
+		self.buckets = {}
+		for i, node in enumerate(self.nodes):
+			self.buckets.setdefault(self.getCell(node), []).append(i)
+
+	### The (column, row) of the cell holding point
+	def getCell(self, point):
+		return int(math.floor(point[0] / self.cellSize)), int(math.floor(point[1] / self.cellSize))
+
+	### The cells at ring (Chebyshev distance) r around (column, row) that hold nodes
+	def ringCells(self, column, row, r):
+		if r == 0:
+			cells = [(column, row)]
+		else:
+			cells = [(column + d, row - r) for d in range(-r, r + 1)] + [(column + d, row + r) for d in range(-r, r + 1)]
+			cells = cells + [(column - r, row + d) for d in range(-r + 1, r)] + [(column + r, row + d) for d in range(-r + 1, r)]
+		return [c for c in cells if c in self.buckets]
+
+	### Returns the closest node that is clear from point, or None
+	def closest(self, point):
+		column, row = self.getCell(point)
+		candidates = []
+		found = 0
+		r = 0
+		while True:
+			if found < len(self.nodes):
+				for cell in self.ringCells(column, row, r):
+					for i in self.buckets[cell]:
+						heapq.heappush(candidates, (distance(point, self.nodes[i]), i))
+						found = found + 1
+				# Nodes in the rings not searched yet are at least this far away
+				bound = r * self.cellSize if found < len(self.nodes) else INFINITY
+			elif len(candidates) == 0:
+				return None
+			while len(candidates) > 0 and candidates[0][0] <= bound:
+				d, i = heapq.heappop(candidates)
+				if self.inflated.clear(point, self.nodes[i]):
+					return self.nodes[i]
+			r = r + 1
+
 
 # Return minimum distance between line segment and point
 def minimumDistance(line, point):
@@ -370,6 +921,757 @@ def findClosestUnobstructed(p, nodes, worldLines):
 				dist = d
 	return best
 	
+# Broadphase for rectangle overlap tests. Hashes every rect into each cell of a uniform grid that it covers, and only
+# tests rects that share a cell. Cells are as large as the median rect, so that a few large rects (which simply cover
+# more cells) don't make the cells large for everyone. Returns a dictionary mapping each index i to the sorted list of
+# indices j > i whose rects collide with rects[i].
+def collidingRectPairs(rects):
+	pairs = {}
+	if len(rects) == 0:
+		return pairs
+	sizes = sorted(max(r.width, r.height) for r in rects)
+	size = max(1, sizes[len(sizes)//2])
+	cells = {}
+	for i, r in enumerate(rects):
+		for x in range(r.left//size, r.right//size + 1):
+			for y in range(r.top//size, r.bottom//size + 1):
+				cells.setdefault((x, y), []).append(i)
+	candidates = set()
+	for members in cells.values():
+		for a in range(len(members)):
+			for b in range(a + 1, len(members)):
+				candidates.add((members[a], members[b]))
+	for i, j in sorted(candidates):
+		if rects[i].colliderect(rects[j]):
+			pairs.setdefault(i, []).append(j)
+	return pairs
+
+
+############################
+### PathGraph
+###
+### The path network compiled for searching: path nodes are numbered, and each node keeps a list of its neighbors
+### along with the id and length of the edge that leads there. Build it once per path network with getPathGraph().
+
+### Maximum number of paths remembered per path network, see PathCache
+PATHCACHESIZE = 1024
+### Maximum number of flow fields remembered per path network, see PathGraph.getFlowField()
+FLOWFIELDCACHESIZE = 64
+### Node expansions between pauses of a search run as a generator, see PathGraph.searchSteps()
+PATHSEARCHSTEPS = 32
+
+### Runs a generator made by one of the *Steps methods to the end and returns its result
+def finishSteps(steps):
+	try:
+		while True:
+			next(steps)
+	except StopIteration as stop:
+		return stop.value
+
+class PathGraph(object):
+
+	### network: the edges (p1, p2) of the path network
+	### nodes: node id -> pathnode (x, y)
+	### ids: pathnode (x, y) -> node id
+	### edges: edge id -> (node id, node id)
+	### lengths: edge id -> length of the edge
+	### adjacency: node id -> list of (neighbor node id, edge id, edge length)
+
+	### edgeIds: (node id, node id) -> id of the shortest edge between them
+	### shortestPaths: (dist, next) all-pairs tables, see getShortestPaths()
+	### pathCache: paths already found on this graph, see cachedPath()
+	### flowFields: flow fields already computed on this graph, see getFlowField()
+	### gateEdges: line -> frozenset of the ids of the edges that line blocks, see blockedEdges()
+
+	def __init__(self, network):
+		self.network = network
+		self.nodes = []
+		self.ids = {}
+		self.edges = []
+		self.lengths = []
+		self.adjacency = []
+		self.edgeIds = {}
+		self.shortestPaths = None
+		self.pathCache = PathCache()
+		self.flowFields = PathCache(FLOWFIELDCACHESIZE)
+		self.gateEdges = {}
+		for p1, p2 in network:
+			a = self.addNode(p1)
+			b = self.addNode(p2)
+			e = len(self.edges)
+			length = distance(p1, p2)
+			self.edges.append((a, b))
+			self.lengths.append(length)
+			self.adjacency[a].append((b, e, length))
+			self.adjacency[b].append((a, e, length))
+			if (a, b) not in self.edgeIds or length < self.lengths[self.edgeIds[(a, b)]]:
+				self.edgeIds[(a, b)] = e
+				self.edgeIds[(b, a)] = e
+
+	def addNode(self, point):
+		key = tuple(point)
+		if key not in self.ids:
+			self.ids[key] = len(self.nodes)
+			self.nodes.append(point)
+			self.adjacency.append([])
+		return self.ids[key]
+
+	### Returns the node id of a pathnode, or None if it is not in the network
+	def getId(self, point):
+		return self.ids.get(tuple(point))
+
+	def getEdgeLine(self, e):
+		a, b = self.edges[e]
+		return (self.nodes[a], self.nodes[b])
+
+	### Returns the ids of the edges that intersect any of the lines (e.g., the world's gates) as a frozenset.
+	### The edges a line blocks are ray traced once per line (all new lines in one batch) and remembered. Gates only ever
+	### appear on the world's potential gates, so after the first few gate flips this is just a union of stored sets, each
+	### as small as the number of edges the gate crosses.
+	def blockedEdges(self, lines):
+		keys = [(tuple(l[0]), tuple(l[1])) for l in lines]
+		missing = [k for k in set(keys) if k not in self.gateEdges]
+		if len(missing) > 0 and len(self.edges) > 0:
+			edges = [self.getEdgeLine(e) for e in range(len(self.edges))]
+			hits = rayTraceBatch(edges, missing)
+			for j, k in enumerate(missing):
+				self.gateEdges[k] = frozenset(numpy.nonzero(hits[:, j])[0].tolist())
+		return frozenset().union(*[self.gateEdges.get(k, ()) for k in keys])
+
+	### A* from init to goal, never crossing an edge whose id is in blocked (see blockedEdges()).
+	### Returns the path from init to goal (empty if there is none) and the closed list (the pathnodes expanded, in order).
+	def search(self, init, goal, blocked = None):
+		return finishSteps(self.searchSteps(init, goal, blocked, None))
+
+	### search() as a generator that pauses (yields) after every steps node expansions, so that it can be spread over
+	### several ticks (see PathScheduler). Returns the result of search() when it finishes. steps = None never pauses.
+	def searchSteps(self, init, goal, blocked = None, steps = PATHSEARCHSTEPS):
+		start = self.getId(init)
+		end = self.getId(goal)
+		if start is None or end is None:
+			return [], []
+		if blocked is None:
+			blocked = frozenset()
+		target = self.nodes[end]
+		g = {start: 0.0}
+		parent = {start: None}
+		closed = set()
+		close = []
+		counter = 0
+		open = [(distance(init, target), counter, start)]
+		while open:
+			f, _, current = heapq.heappop(open)
+			if current in closed:
+				# stale entry, a shorter way here was found after this one was pushed
+				continue
+			if current == end:
+				path = []
+				while current is not None:
+					path.append(self.nodes[current])
+					current = parent[current]
+				path.reverse()
+				return path, close
+			closed.add(current)
+			close.append(self.nodes[current])
+			if steps is not None and len(close) % steps == 0:
+				yield
+			for neighbor, e, length in self.adjacency[current]:
+				if neighbor not in closed and e not in blocked:
+					score = g[current] + length
+					if neighbor not in g or score < g[neighbor]:
+						g[neighbor] = score
+						parent[neighbor] = current
+						counter = counter + 1
+						heapq.heappush(open, (score + distance(self.nodes[neighbor], target), counter, neighbor))
+		return [], close
+
+	### All-pairs shortest paths over the whole network (Floyd-Warshall, one vectorized pass per node), computed the first
+	### time they are asked for and shared by everyone using this graph.
+	### Returns (dist, next): dist[i][j] is the length of the shortest path from node i to node j (inf if there is none)
+	### and next[i][j] is the node to go to from i on the way to j (-1 if there is none). Both arrays are read-only.
+	def getShortestPaths(self):
+		if self.shortestPaths is None:
+			n = len(self.nodes)
+			dist = numpy.full((n, n), numpy.inf)
+			next = numpy.full((n, n), -1, dtype = int)
+			for (a, b), length in zip(self.edges, self.lengths):
+				if length < dist[a, b]:
+					dist[a, b] = dist[b, a] = length
+					next[a, b] = b
+					next[b, a] = a
+			diagonal = numpy.arange(n)
+			dist[diagonal, diagonal] = 0.0
+			next[diagonal, diagonal] = diagonal
+			for k in range(n):
+				through = dist[:, k, None] + dist[None, k, :]
+				shorter = through < dist
+				dist = numpy.where(shorter, through, dist)
+				next = numpy.where(shorter, next[:, k, None], next)
+			dist.setflags(write = False)
+			next.setflags(write = False)
+			self.shortestPaths = (dist, next)
+		return self.shortestPaths
+
+	### The shortest path from init to goal read off the all-pairs tables in O(path length), in the same form as search()
+	### (the closed list is empty, nothing was searched). If the path would cross an edge in blocked, falls back to search().
+	def tablePath(self, init, goal, blocked = None):
+		return finishSteps(self.tablePathSteps(init, goal, blocked, None))
+
+	### tablePath() as a generator, see searchSteps()
+	def tablePathSteps(self, init, goal, blocked = None, steps = PATHSEARCHSTEPS):
+		start = self.getId(init)
+		end = self.getId(goal)
+		if start is None or end is None:
+			return [], []
+		dist, next = self.getShortestPaths()
+		if next[start, end] < 0:
+			return [], []
+		path = [self.nodes[start]]
+		current = start
+		while current != end:
+			following = int(next[current, end])
+			if blocked and self.edgeIds[(current, following)] in blocked:
+				return (yield from self.searchSteps(init, goal, blocked, steps))
+			current = following
+			path.append(self.nodes[current])
+		return path, []
+
+	### Like search() (or tablePath() if tables is True) with the edges crossing gates blocked, but answered from the path
+	### cache when the same query has been made before with the same gates up. Returns a fresh list that the caller may
+	### modify, and the closed list (empty when the path came from the cache).
+	def cachedPath(self, init, goal, gates, tables = False):
+		return finishSteps(self.cachedPathSteps(init, goal, gates, tables, None))
+
+	### cachedPath() as a generator, see searchSteps()
+	def cachedPathSteps(self, init, goal, gates, tables = False, steps = PATHSEARCHSTEPS):
+		start = self.getId(init)
+		end = self.getId(goal)
+		if start is None or end is None:
+			return [], []
+		gates = tuple(gates)
+		key = (start, end, gates, tables)
+		path = self.pathCache.get(key)
+		if path is not None:
+			return list(path), []
+		blocked = self.blockedEdges(gates)
+		if tables:
+			path, closed = yield from self.tablePathSteps(init, goal, blocked, steps)
+		else:
+			path, closed = yield from self.searchSteps(init, goal, blocked, steps)
+		self.pathCache.put(key, tuple(path))
+		return path, closed
+
+	### Returns the FlowField towards goal with the edges crossing gates blocked. Fields are remembered per goal and gate
+	### set, so every agent heading for the same pathnode shares one search.
+	def getFlowField(self, goal, gates):
+		end = self.getId(goal)
+		if end is None:
+			return None
+		gates = tuple(gates)
+		key = (end, gates)
+		field = self.flowFields.get(key)
+		if field is None:
+			field = FlowField(self, end, self.blockedEdges(gates))
+			self.flowFields.put(key, field)
+		return field
+
+
+############################
+### FlowField
+###
+### The shortest way to one pathnode from every other pathnode of a PathGraph, from a single Dijkstra search run
+### backwards from the goal. Any number of agents can then follow it: the next waypoint from a pathnode is a lookup.
+
+class FlowField(object):
+
+	### graph: the PathGraph
+	### goal: the node id of the goal
+	### next: node id -> the node id to go to next on the way to the goal (the goal for the goal, -1 if it can't be reached)
+	### dist: node id -> length of the shortest path to the goal (inf if it can't be reached)
+
+	### blocked: the ids of the edges that can't be crossed, see PathGraph.blockedEdges()
+	def __init__(self, graph, goal, blocked = None):
+		if blocked is None:
+			blocked = frozenset()
+		self.graph = graph
+		self.goal = goal
+		self.next = [-1] * len(graph.nodes)
+		self.dist = [INFINITY] * len(graph.nodes)
+		self.next[goal] = goal
+		self.dist[goal] = 0.0
+		closed = set()
+		open = [(0.0, goal)]
+		while open:
+			d, current = heapq.heappop(open)
+			if current in closed:
+				continue
+			closed.add(current)
+			for neighbor, e, length in graph.adjacency[current]:
+				if neighbor not in closed and e not in blocked and d + length < self.dist[neighbor]:
+					self.dist[neighbor] = d + length
+					self.next[neighbor] = current
+					heapq.heappush(open, (d + length, neighbor))
+
+	### Returns the pathnode to go to next from pathnode point, the goal if point is the goal, or None if the goal can't be reached
+	def getNext(self, point):
+		i = self.graph.getId(point)
+		if i is None or self.next[i] < 0:
+			return None
+		return self.graph.nodes[self.next[i]]
+
+	### Returns the length of the shortest path from pathnode point to the goal, or INFINITY
+	def getDistance(self, point):
+		i = self.graph.getId(point)
+		if i is None:
+			return INFINITY
+		return self.dist[i]
+
+	### Returns the path from pathnode point to the goal (both included) as a fresh list, or [] if the goal can't be reached
+	def pathFrom(self, point):
+		i = self.graph.getId(point)
+		if i is None or self.next[i] < 0:
+			return []
+		path = [self.graph.nodes[i]]
+		while i != self.goal:
+			i = self.next[i]
+			path.append(self.graph.nodes[i])
+		return path
+
+
+############################
+### PathCache
+###
+### Bounded least-recently-used map from path queries to the paths found for them, with hit and miss counters.
+
+class PathCache(object):
+
+	def __init__(self, size = PATHCACHESIZE):
+		self.size = size
+		self.paths = collections.OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	### Returns the path stored under key and marks it as recently used, or None if there isn't one
+	def get(self, key):
+		path = self.paths.get(key)
+		if path is None:
+			self.misses = self.misses + 1
+			return None
+		self.paths.move_to_end(key)
+		self.hits = self.hits + 1
+		return path
+
+	### Stores a path (it should be immutable, e.g. a tuple), evicting the least recently used paths beyond size
+	def put(self, key, path):
+		self.paths[key] = path
+		self.paths.move_to_end(key)
+		while len(self.paths) > self.size:
+			self.paths.popitem(last = False)
+
+	def clear(self):
+		self.paths.clear()
+
+
+### Compiled graphs of the most recently seen path networks, see getPathGraph()
+PATHGRAPHS = []
+PATHGRAPHCACHESIZE = 8
+
+### Returns the PathGraph for a path network, compiling it the first time the network is seen.
+### Navigators that share a pathnetwork (e.g., clones) share the compiled graph.
+def getPathGraph(network):
+	for graph in PATHGRAPHS:
+		if graph.network is network and len(graph.edges) == len(network):
+			return graph
+	graph = PathGraph(network)
+	PATHGRAPHS.insert(0, graph)
+	del PATHGRAPHS[PATHGRAPHCACHESIZE:]
+	return graph
+
+
+############################
+### NavMeshIndex
+###
+### Point location over nav mesh polygons. The bounding box of the mesh is cut into a uniform grid of about one cell per
+### polygon, and every cell lists the polygons whose bounding boxes overlap it. locate() hashes the point to its cell and
+### tests only those few polygons, with a plain crossing-number test instead of rayTrace.
+
+class NavMeshIndex(object):
+
+	### polygons: the nav mesh polygons (lists of points)
+	### bounds: the bounding box (minX, minY, maxX, maxY) of every polygon
+	### origin: the top left corner of the grid
+	### cellSize: the width and height of a grid cell
+	### columns, rows: the size of the grid
+	### cells: cell (column + row * columns) -> ids of the polygons that may contain points in the cell
+	### portals: portals[i] is a list of (j, left, right) for every polygon j sharing an edge with polygon i, where left
+	###     and right are the ends of the shared edge as seen by an agent crossing from i into j
+
+	def __init__(self, polygons, cellSize = None):
+		self.polygons = [list(p) for p in polygons]
+		self.bounds = []
+		for poly in self.polygons:
+			xs = [p[0] for p in poly]
+			ys = [p[1] for p in poly]
+			self.bounds.append((min(xs), min(ys), max(xs), max(ys)))
+		# Shared edges, found through a map from each directed polygon edge to its polygon
+		owner = {}
+		for i, poly in enumerate(self.polygons):
+			for k in range(len(poly)):
+				owner[(poly[k-1], poly[k])] = i
+		self.portals = [[] for _ in self.polygons]
+		for i, poly in enumerate(self.polygons):
+			counterclockwise = polygonArea(poly) > 0
+			for k in range(len(poly)):
+				a, b = poly[k-1], poly[k]
+				j = owner.get((b, a))
+				if j is not None and j != i:
+					if counterclockwise:
+						self.portals[i].append((j, b, a))
+					else:
+						self.portals[i].append((j, a, b))
+		if len(self.bounds) == 0:
+			self.bounds.append((0, 0, 0, 0))
+		minX = min(b[0] for b in self.bounds)
+		minY = min(b[1] for b in self.bounds)
+		maxX = max(b[2] for b in self.bounds)
+		maxY = max(b[3] for b in self.bounds)
+		if cellSize is None:
+			cellSize = math.sqrt(max(1.0, (maxX - minX) * (maxY - minY)) / max(1, len(self.polygons)))
+		self.origin = (minX, minY)
+		self.cellSize = max(1.0, float(cellSize))
+		self.columns = int((maxX - minX) / self.cellSize) + 1
+		self.rows = int((maxY - minY) / self.cellSize) + 1
+		self.cells = [[] for _ in range(self.columns * self.rows)]
+		for i, poly in enumerate(self.polygons):
+			x1, y1 = self.getCell((self.bounds[i][0] - EPSILON, self.bounds[i][1] - EPSILON))
+			x2, y2 = self.getCell((self.bounds[i][2] + EPSILON, self.bounds[i][3] + EPSILON))
+			for y in range(y1, y2 + 1):
+				for x in range(x1, x2 + 1):
+					self.cells[x + y * self.columns].append(i)
+
+	### The (column, row) of the cell holding point, clamped to the grid
+	def getCell(self, point):
+		x = int((point[0] - self.origin[0]) // self.cellSize)
+		y = int((point[1] - self.origin[1]) // self.cellSize)
+		return min(max(x, 0), self.columns - 1), min(max(y, 0), self.rows - 1)
+
+	### Returns the id (index into the polygon list) of a polygon containing point, or None. Points on a shared edge
+	### belong to either polygon.
+	def locate(self, point):
+		x, y = self.getCell(point)
+		for i in self.cells[x + y * self.columns]:
+			b = self.bounds[i]
+			if b[0] - EPSILON <= point[0] <= b[2] + EPSILON and b[1] - EPSILON <= point[1] <= b[3] + EPSILON:
+				if pointInPolygon(point, self.polygons[i]):
+					return i
+		return None
+
+	### Returns the polygon containing point, or None
+	def getPolygon(self, point):
+		i = self.locate(point)
+		if i is None:
+			return None
+		return self.polygons[i]
+
+	### Finds the corridor of polygons from the polygon containing start to the polygon containing goal (A* over the
+	### polygon adjacency graph, with costs measured between portal midpoints). Returns the list of portals (left, right)
+	### crossed along the way, or None if either point is off the mesh or no corridor connects them.
+	def findCorridor(self, start, goal):
+		first = self.locate(start)
+		last = self.locate(goal)
+		if first is None or last is None:
+			return None
+		# Queue entries: (estimate, cost so far, polygon, entry point)
+		queue = [(distance(start, goal), 0, first, start)]
+		costs = {first: 0}
+		parents = {first: None}
+		while len(queue) > 0:
+			f, g, i, entry = heapq.heappop(queue)
+			if i == last:
+				portals = []
+				while parents[i] is not None:
+					i, left, right = parents[i]
+					portals.append((left, right))
+				portals.reverse()
+				return portals
+			if g > costs[i]:
+				continue
+			for j, left, right in self.portals[i]:
+				midpoint = ((left[0]+right[0])/2.0, (left[1]+right[1])/2.0)
+				cost = g + distance(entry, midpoint)
+				if j not in costs or cost < costs[j]:
+					costs[j] = cost
+					parents[j] = (i, left, right)
+					heapq.heappush(queue, (cost + distance(midpoint, goal), cost, j, midpoint))
+		return None
+
+	### Returns the shortest path from start to goal through the nav mesh (including start and goal) that keeps radius
+	### away from the portal ends, or None if there is none.
+	def findPath(self, start, goal, radius = 0):
+		portals = self.findCorridor(start, goal)
+		if portals is None:
+			return None
+		return funnelPath(start, goal, portals, radius)
+
+### Twice the signed area of a polygon, positive if its points go counterclockwise (with y pointing up)
+def polygonArea(polygon):
+	area = 0
+	for k in range(len(polygon)):
+		area = area + polygon[k-1][0]*polygon[k][1] - polygon[k][0]*polygon[k-1][1]
+	return area
+
+### String pulling ("simple stupid funnel"). Given the portals (left, right) that a corridor crosses in order, returns
+### the shortest path from start to goal through them, as a list of points from start to goal. Each portal is first
+### narrowed by radius at both ends (or to its midpoint if it is narrower than the agent). Linear in the number of
+### portals, apart from restarts after a corner.
+def funnelPath(start, goal, portals, radius = 0):
+	gates = [(start, start)]
+	for left, right in portals:
+		length = distance(left, right)
+		if length <= radius * 2:
+			mid = ((left[0]+right[0])/2.0, (left[1]+right[1])/2.0)
+			gates.append((mid, mid))
+		elif radius > 0:
+			dx = (right[0] - left[0]) * radius / length
+			dy = (right[1] - left[1]) * radius / length
+			gates.append(((left[0]+dx, left[1]+dy), (right[0]-dx, right[1]-dy)))
+		else:
+			gates.append((left, right))
+	gates.append((goal, goal))
+	# cross > 0 if b is counterclockwise (to the left) of a, both relative to the apex
+	def cross(apex, a, b):
+		return (a[0]-apex[0])*(b[1]-apex[1]) - (a[1]-apex[1])*(b[0]-apex[0])
+	# True if b is on the inner side of a (sign 1: left of it, -1: right of it), or on the same ray from the apex as a
+	# and no farther: a point on the other side of the funnel but short of it doesn't cross over.
+	def within(apex, a, b, sign):
+		c = cross(apex, a, b) * sign
+		if abs(c) <= EPSILON:
+			return distance(apex, b) <= distance(apex, a)
+		return c > 0
+	path = [start]
+	apex = left = right = start
+	apexIndex = leftIndex = rightIndex = 0
+	i = 1
+	while i < len(gates):
+		newLeft, newRight = gates[i]
+		# Narrow the funnel from the right
+		if cross(apex, right, newRight) >= 0:
+			if apex == right or within(apex, left, newRight, -1):
+				right = newRight
+				rightIndex = i
+			else:
+				# The right side crossed over the left: the left end is a corner of the path
+				path.append(left)
+				apex = right = left
+				apexIndex = rightIndex = leftIndex
+				i = apexIndex + 1
+				continue
+		# Narrow the funnel from the left
+		if cross(apex, left, newLeft) <= 0:
+			if apex == left or within(apex, right, newLeft, 1):
+				left = newLeft
+				leftIndex = i
+			else:
+				path.append(right)
+				apex = left = right
+				apexIndex = leftIndex = rightIndex
+				i = apexIndex + 1
+				continue
+		i = i + 1
+	if path[-1] != goal:
+		path.append(goal)
+	return path
+
+### Crossing-number test: True if point is inside the polygon (a list of points) or within EPSILON of its boundary.
+def pointInPolygon(point, polygon):
+	px, py = point
+	inside = False
+	n = len(polygon)
+	for k in range(n):
+		x1, y1 = polygon[k-1]
+		x2, y2 = polygon[k]
+		# On the edge?
+		dx = x2 - x1
+		dy = y2 - y1
+		cross = dx * (py - y1) - dy * (px - x1)
+		if abs(cross) <= EPSILON * max(abs(dx), abs(dy), 1.0):
+			if min(x1, x2) - EPSILON <= px <= max(x1, x2) + EPSILON and min(y1, y2) - EPSILON <= py <= max(y1, y2) + EPSILON:
+				return True
+		if (y1 > py) != (y2 > py):
+			if px < x1 + (py - y1) * dx / dy:
+				inside = not inside
+	return inside
+
+
+############################
+### MapGenerator
+###
+### Seeded random worlds of any size, for measuring how the engine scales beyond the hand-made maps. Obstacles are
+### star-shaped polygons, each inside a bounding circle; circles are kept a corridor apart from each other (and from
+### the world's edges and any areas that must stay clear), so obstacles never overlap and agents can pass between them.
+### Pathnodes are a jittered grid, minus the points too close to a circle. The same seed and parameters always give the
+### same world: everything is drawn from a private random.Random, never from corerandom.
+
+### Fewest and most corners of a generated obstacle
+MAPOBSTACLESIDES = (5, 10)
+### Times to try placing each obstacle before giving up on it
+MAPPLACEMENTTRIES = 30
+
+class MapGenerator(object):
+
+	### dimensions: the size of the world
+	### seed: the seed the world was generated from
+	### corridor: the narrowest gap between two obstacles (or an obstacle and the edge of the world)
+	### obstacles: the obstacles, as lists of integer points
+	### circles: (center, radius) of the circle around each obstacle
+	### pathnodes: the pathnodes
+
+	### num: number of obstacles wanted (fewer are placed if the world fills up)
+	### radius: (smallest, largest) obstacle radius
+	### spacing: distance between pathnodes
+	### keepClear: (point, radius) areas no obstacle may reach into (e.g., around bases)
+	def __init__(self, dimensions, seed, num, radius = (50, 250), corridor = 120, spacing = 200, keepClear = []):
+		self.dimensions = dimensions
+		self.seed = seed
+		self.corridor = corridor
+		self.rand = random.Random(seed)
+		self.obstacles = []
+		self.circles = []
+		self.placeObstacles(num, radius, keepClear)
+		self.pathnodes = self.placePathNodes(spacing)
+
+	### Dart throwing with a uniform grid over the circles placed so far, so each try looks at a few neighbors only
+	def placeObstacles(self, num, radius, keepClear):
+		cell = 2.0 * radius[1] + self.corridor
+		grid = {}
+		for _ in range(num):
+			for _ in range(MAPPLACEMENTTRIES):
+				r = self.rand.uniform(radius[0], radius[1])
+				edge = r + self.corridor
+				if edge * 2 >= min(self.dimensions):
+					break
+				center = (self.rand.uniform(edge, self.dimensions[0] - edge), self.rand.uniform(edge, self.dimensions[1] - edge))
+				if any(distance(center, p) < r + self.corridor + clear for p, clear in keepClear):
+					continue
+				column, row = int(center[0] / cell), int(center[1] / cell)
+				near = [c for dx in (-1, 0, 1) for dy in (-1, 0, 1) for c in grid.get((column + dx, row + dy), [])]
+				if all(distance(center, c) >= r + cr + self.corridor for c, cr in near):
+					grid.setdefault((column, row), []).append((center, r))
+					self.circles.append((center, r))
+					self.obstacles.append(self.makeObstacle(center, r))
+					break
+
+	### A star-shaped polygon inside the circle: corners at jittered, increasing angles and random distances from the
+	### center, never less than half the radius (so the polygon doesn't intersect itself and keeps some bulk)
+	def makeObstacle(self, center, r):
+		sides = self.rand.randint(MAPOBSTACLESIDES[0], MAPOBSTACLESIDES[1])
+		turn = self.rand.uniform(0, 2.0 * math.pi)
+		points = []
+		for k in range(sides):
+			a = turn + (k + self.rand.uniform(-0.3, 0.3)) * 2.0 * math.pi / sides
+			d = self.rand.uniform(0.5, 1.0) * (r - 1)
+			points.append((int(round(center[0] + math.cos(a) * d)), int(round(center[1] + math.sin(a) * d))))
+		return points
+
+	### A pathnode every spacing pixels (jittered by up to a quarter of it), dropping the ones closer than half a corridor
+	### to a circle or to the edge of the world
+	def placePathNodes(self, spacing):
+		candidates = []
+		for y in numpy.arange(spacing / 2.0, self.dimensions[1], spacing):
+			for x in numpy.arange(spacing / 2.0, self.dimensions[0], spacing):
+				candidates.append((int(round(x + self.rand.uniform(-0.25, 0.25) * spacing)), int(round(y + self.rand.uniform(-0.25, 0.25) * spacing))))
+		if len(candidates) == 0:
+			return []
+		points = numpy.array(candidates, dtype = float)
+		margin = self.corridor / 2.0
+		keep = (points[:, 0] >= margin) & (points[:, 1] >= margin) & (points[:, 0] <= self.dimensions[0] - margin) & (points[:, 1] <= self.dimensions[1] - margin)
+		if len(self.circles) > 0:
+			centers = numpy.array([c for c, r in self.circles], dtype = float)
+			radii = numpy.array([r for c, r in self.circles], dtype = float)
+			for start in range(0, len(points), 1024):
+				chunk = points[start:start+1024]
+				gaps = numpy.hypot(chunk[:, None, 0] - centers[None, :, 0], chunk[:, None, 1] - centers[None, :, 1]) - radii[None, :]
+				keep[start:start+1024] &= gaps.min(axis = 1) >= margin
+		return [p for p, k in zip(candidates, keep) if k]
+
+	### True if a circle of radius r at center stays half a corridor away from every obstacle and inside the world
+	def isClear(self, center, r):
+		margin = self.corridor / 2.0
+		if center[0] - r < margin or center[1] - r < margin or center[0] + r > self.dimensions[0] - margin or center[1] + r > self.dimensions[1] - margin:
+			return False
+		return all(distance(center, c) >= cr + r + margin for c, cr in self.circles)
+
+	### Where to put the bases and towers of a MOBAWorld with two teams: team 1 in the top left corner and team 2 in the
+	### bottom right, each base inset from its corner, and towersPerLane towers on each of the three lanes out of the
+	### corner (the two edges and the diagonal) spread over the first 60% of the way to the middle. Returns
+	### {team: (base position, [tower positions])}. Static, so that the layout can be kept clear of obstacles (see
+	### mobaKeepClear()) when the generator is made.
+	@staticmethod
+	def mobaLayout(dimensions, towersPerLane = 1, inset = 75):
+		width, height = dimensions
+		reach = min(width, height) / 2.0 * 0.6
+		towers = []
+		for k in range(towersPerLane):
+			d = 175 + (reach - 175) * k / float(max(towersPerLane - 1, 1))
+			towers.append((inset + d, inset + 25))
+			towers.append((inset + 25, inset + d))
+			towers.append((inset + d * 0.7, inset + d * 0.7))
+		towers = [(int(round(x)), int(round(y))) for x, y in towers]
+		layout = {1: ((inset, inset), towers)}
+		layout[2] = ((width - inset, height - inset), [(width - x, height - y) for x, y in towers])
+		return layout
+
+	### The areas of a mobaLayout() that obstacles must stay out of
+	@staticmethod
+	def mobaKeepClear(layout, clearance = 150):
+		return [(p, clearance) for base, towers in layout.values() for p in [base] + towers]
+
+	### Where to put the places of an NPCWorld: num places (square, size pixels wide) in open ground, and doors that close
+	### the gap between two neighboring obstacles. A door is a gate from inside one obstacle to inside the other, so it
+	### shuts the passage between them, with its place beside the gate. Returns (places, doors): places are
+	### (label, position, width, height) with position the top left corner, as Place takes them; doors are
+	### (label, position, width, height, p1, p2), as DoorPlace takes them.
+	def placeLayout(self, num, doors = 0, size = 100):
+		half = size / 2.0
+		places = []
+		taken = []
+		for n in range(num):
+			for _ in range(MAPPLACEMENTTRIES):
+				center = (self.rand.uniform(0, self.dimensions[0]), self.rand.uniform(0, self.dimensions[1]))
+				if self.isClear(center, half * 1.5) and all(distance(center, t) >= size * 2 for t in taken):
+					taken.append(center)
+					places.append(("at_place%d" % len(places), (int(center[0] - half), int(center[1] - half)), size, size))
+					break
+		# Neighboring obstacles, in random order
+		pairs = []
+		for i, (c1, r1) in enumerate(self.circles):
+			for j in range(i + 1, len(self.circles)):
+				c2, r2 = self.circles[j]
+				gap = distance(c1, c2) - r1 - r2
+				if gap <= self.corridor * 3:
+					pairs.append((gap, i, j))
+		self.rand.shuffle(pairs)
+		gates = []
+		for gap, i, j in pairs:
+			if len(gates) >= doors:
+				break
+			(c1, r1), (c2, r2) = self.circles[i], self.circles[j]
+			d = distance(c1, c2)
+			u = ((c2[0] - c1[0]) / d, (c2[1] - c1[1]) / d)
+			# A quarter radius from the center is inside the obstacle (see makeObstacle())
+			p1 = (int(round(c1[0] + u[0] * r1 * 0.25)), int(round(c1[1] + u[1] * r1 * 0.25)))
+			p2 = (int(round(c2[0] - u[0] * r2 * 0.25)), int(round(c2[1] - u[1] * r2 * 0.25)))
+			middle = (c1[0] + u[0] * (r1 + gap / 2.0), c1[1] + u[1] * (r1 + gap / 2.0))
+			for side in (1, -1):
+				offset = half * 1.5 + self.corridor / 2.0
+				center = (middle[0] - u[1] * side * offset, middle[1] + u[0] * side * offset)
+				if self.isClear(center, half * 1.5) and all(distance(center, t) >= size * 2 for t in taken):
+					taken.append(center)
+					gates.append(("at_door%d" % len(gates), (int(center[0] - half), int(center[1] - half)), size, size, p1, p2))
+					break
+		return places, gates
+
+
 def drawCross(surface, point, color = (0, 0, 0), size = 2, width = 1):
 	pygame.draw.line(surface, color, (point[0]-size, point[1]-size), (point[0]+size, point[1]+size), width)
 	pygame.draw.line(surface, color, (point[0]+size, point[1]-size), (point[0]-size, point[1]+size), width)
@@ -23,16 +23,15 @@ from pygame.locals import *
 ############################
 ### HELPERS
 
-'''
+### Clones share the path network and the all-pairs shortest path tables (read-only) with the original
 def cloneAPSPNavigator(nav):
-	newnav = APSPNavigator()
+	newnav = nav.__class__()
 	newnav.world = nav.world
 	newnav.pathnodes = nav.pathnodes
 	newnav.pathnetwork = nav.pathnetwork
 	newnav.next = nav.next
 	newnav.dist = nav.dist
 	return newnav
-'''
 
 def cloneAStarNavigator(nav):
 	newnav = nav.__class__()
@@ -0,0 +1,66 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import sys, pygame, math, numpy, random, time, copy
+from pygame.locals import *
+
+from constants import *
+from utils import *
+from core import *
+
+
+###############################
+### FlowFieldNavigator
+###
+### Navigates a static path network with flow fields (see FlowField). All the agents heading for the same place (e.g.,
+### the minions of a team marching on the same tower) snap their destination to the same pathnode, so one backwards
+### search from that pathnode per gate set gives every one of them its path. Clone it with cloneAStarNavigator() so that
+### clones share the path network.
+
+class FlowFieldNavigator(PathNetworkNavigator):
+
+	### field: the FlowField being followed, or None
+
+	def __init__(self):
+		PathNetworkNavigator.__init__(self)
+		self.field = None
+
+	### Finds the shortest path from the source to the destination.
+	### self: the navigator object
+	### source: the place the agent is starting from (i.e., its current location)
+	### dest: the place the agent is told to go to
+	def computePath(self, source, dest):
+		self.setPath(None)
+		self.field = None
+		if self.agent != None and self.world != None and self.pathnetwork is not None:
+			self.source = source
+			self.destination = dest
+			if self.clearShot(source, dest):
+				# Nothing in the way, go straight there
+				self.agent.moveToTarget(dest)
+			else:
+				start = self.getOnPathNetwork(source)
+				end = self.getOnPathNetwork(dest)
+				if start != None and end != None:
+					self.field = getPathGraph(self.pathnetwork).getFlowField(end, self.world.getGates())
+					path = self.field.pathFrom(start)
+					if len(path) > 0:
+						self.setPath(path)
+						first = self.path.pop(0)
+						self.agent.moveToTarget(first)
+		return None
@@ -23,6 +23,7 @@ from constants import *
 from utils import *
 from core import *
 from agents import *
+from apspnavigator import *
 from clonenav import *
 
 
@@ -236,7 +237,10 @@ class Base(Mover):
 			#agent.rect = agent.rect.move(pos)
 			agent.move(pos)
 			if self.nav is not None:
-				newnav = cloneAStarNavigator(self.nav)
+				if isinstance(self.nav, APSPNavigator):
+					newnav = cloneAPSPNavigator(self.nav)
+				else:
+					newnav = cloneAStarNavigator(self.nav)
 				agent.setNavigator(newnav)
 			agent.setTeam(self.team)
 			agent.setOwner(self)
@@ -263,7 +267,7 @@ class Base(Mover):
 			heros = []
 			for npc in self.world.npcs + [self.world.agent]:
 				if npc.getTeam() == None or npc.getTeam() != self.getTeam() and distance(self.getLocation(), npc.getLocation()) < BASEBULLETRANGE:
-					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getLines())
+					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getSegmentGrid())
 					if hit == None:
 						if isinstance(npc, Minion):
 							minions.append(npc)
@@ -361,7 +365,7 @@ class Tower(Mover):
 			heros = []
 			for npc in self.world.npcs + [self.world.agent]:
 				if npc.getTeam() == None or npc.getTeam() != self.getTeam() and distance(self.getLocation(), npc.getLocation()) < TOWERBULLETRANGE:
-					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getLines())
+					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getSegmentGrid())
 					if hit == None:
 						if isinstance(npc, Minion):
 							minions.append(npc)
@@ -393,8 +397,8 @@ class MOBAWorld(GatedWorld):
 	### bases: the bases (one per team)
 	### towers: the towers (many per team)
 	
-	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm):
-		GatedWorld.__init__(self, seed, worlddimensions, screendimensions, numgates, alarm)
+	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless = False):
+		GatedWorld.__init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless)
 		self.bases = []
 		self.towers = []
 	
@@ -0,0 +1,89 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import sys, pygame, math, numpy, random, time, copy
+from pygame.locals import *
+
+from constants import *
+from utils import *
+from core import *
+
+############################
+### Collision benchmark
+###
+### Times GameWorld.worldCollisionTest per tick as the number of movers grows, and compares the
+### mover-vs-mover broadphase (collidingRectPairs) against testing every pair.
+### Usage: python runcollisionbenchmark.py [ticks]
+
+dims = (1200, 1200)
+
+obstacles = [[(400, 100), (1100, 100), (1100, 800), (1010, 875), (990, 875), (900, 750), (900, 500), (700, 300), (450, 300), (325, 210), (325, 190)]]
+mirror = list(map(lambda poly: list(map(lambda point: (dims[0]-point[0], dims[1]-point[1]), poly)), obstacles))
+obstacles = obstacles + mirror + [[(550, 570), (600, 550), (660, 570), (650, 630), (600, 650), (540, 630)]]
+
+MOVERCOUNTS = [10, 25, 50, 100, 200, 400]
+
+### The mover-vs-mover test as it was before the broadphase: every pair, list-based dedupe
+def allPairsCollisions(movers):
+	collisions = []
+	for m1 in movers:
+		for m2 in movers:
+			if m1 != m2:
+				if (m1, m2) not in collisions and (m2, m1) not in collisions:
+					if m1.rect.colliderect(m2.rect):
+						collisions.append((m1, m2))
+	return collisions
+
+### True if collidingRectPairs finds the same pairs of movers as allPairsCollisions
+def samePairs(movers):
+	movers = list(movers)
+	pairs = collidingRectPairs([m.rect for m in movers])
+	grid = set(frozenset((movers[i], movers[j])) for i in pairs for j in pairs[i])
+	return grid == set(frozenset(pair) for pair in allPairsCollisions(movers))
+
+def makeWorld(num):
+	world = GameWorld(SEED, dims, dims, True)
+	world.initializeTerrain(obstacles, (0, 0, 0), 4)
+	rand = random.Random(num)
+	agent = None
+	while len(world.movers) < num:
+		pos = (rand.randint(0, dims[0]), rand.randint(0, dims[1]))
+		if not insideObstacle(pos, world.getObstacles()):
+			a = Agent(NPC, pos, 0, SPEED, world)
+			if agent is None:
+				agent = a
+				world.setPlayerAgent(a)
+			else:
+				world.addNPC(a)
+	return world
+
+def timeIt(fn, ticks):
+	start = time.perf_counter()
+	for _ in range(ticks):
+		fn()
+	return (time.perf_counter() - start) * 1000.0 / ticks
+
+if __name__ == "__main__":
+	ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+	print("movers  worldCollisionTest(ms/tick)  allPairs(ms/tick)  broadphase(ms/tick)  same pairs")
+	for num in MOVERCOUNTS:
+		world = makeWorld(num)
+		full = timeIt(world.worldCollisionTest, ticks)
+		brute = timeIt(lambda: allPairsCollisions(world.movers), ticks)
+		grid = timeIt(lambda: collidingRectPairs([m.rect for m in world.movers]), ticks)
+		print("%6d  %27.3f  %17.3f  %19.3f  %10s" % (num, full, brute, grid, samePairs(world.movers)))
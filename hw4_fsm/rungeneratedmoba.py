@@ -0,0 +1,95 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import sys, pygame, math, numpy, random, time, copy, io, contextlib
+from pygame.locals import *
+
+from constants import *
+from utils import *
+from core import *
+from agents import *
+from moba import *
+from flowfieldnavigator import *
+from BaselineMinion import *
+from mybuildpathnetwork import *
+
+############################
+### Generated MOBA map
+###
+### Builds a MOBAWorld on a map made by MapGenerator (same seed, same map) and times each stage of setting it up and of
+### running the match headless, to see how the engine scales with the size of the world.
+### Usage: python rungeneratedmoba.py [size] [seed] [obstacles] [ticks] [towersPerLane]
+### Potential gates are only looked for when GATES is True: finding them is quadratic in the obstacle points.
+
+GATES = False
+
+class GeneratedHumanMinion(BaselineMinion):
+
+	def __init__(self, position, orientation, world, image = NPC, speed = SPEED, viewangle = 360, hitpoints = HITPOINTS, firerate = FIRERATE, bulletclass = SmallBullet):
+		BaselineMinion.__init__(self, position, orientation, world, image, speed, viewangle, hitpoints, firerate, bulletclass)
+
+class GeneratedAlienMinion(BaselineMinion):
+
+	def __init__(self, position, orientation, world, image = JACKAL, speed = SPEED, viewangle = 360, hitpoints = HITPOINTS, firerate = FIRERATE, bulletclass = SmallBullet):
+		BaselineMinion.__init__(self, position, orientation, world, image, speed, viewangle, hitpoints, firerate, bulletclass)
+
+### Runs fn, prints how long it took and returns its result
+def timed(label, fn):
+	start = time.perf_counter()
+	result = fn()
+	print("%-28s %10.3f s" % (label, time.perf_counter() - start), file = sys.__stdout__)
+	return result
+
+def makeWorld(size, seed, num, towersPerLane):
+	dims = (size, size)
+	layout = MapGenerator.mobaLayout(dims, towersPerLane)
+	generator = timed("generate map", lambda: MapGenerator(dims, seed, num, keepClear = MapGenerator.mobaKeepClear(layout)))
+	world = MOBAWorld(seed, dims, dims, 2, 60, headless = True)
+	agent = Hero((75, size - 75), 0, world)
+	agent.team = 0
+	world.setPlayerAgent(agent)
+	# ManualObstacle prints every polygon
+	with contextlib.redirect_stdout(io.StringIO()):
+		timed("initialize terrain", lambda: world.initializeTerrain(generator.obstacles, (0, 0, 0), 4))
+	agent.setNavigator(Navigator())
+	nav = FlowFieldNavigator()
+	nav.agent = agent
+	nav.setWorld(world)
+	nav.pathnodes = generator.pathnodes
+	nav.pathnetwork = timed("build path network", lambda: myBuildPathNetwork(generator.pathnodes, world, agent))
+	for team, minionType in ((1, GeneratedHumanMinion), (2, GeneratedAlienMinion)):
+		base, towers = layout[team]
+		b = Base(BASE, base, world, team, minionType)
+		b.setNavigator(nav)
+		world.addBase(b)
+		for t in towers:
+			world.addTower(Tower(TOWER, t, world, team))
+	if GATES:
+		timed("find potential gates", world.makePotentialGates)
+	print("%d obstacles, %d lines, %d pathnodes, %d path edges, %d towers" % (len(generator.obstacles), len(world.getLines()), len(generator.pathnodes), len(nav.pathnetwork), len(world.getTowers())))
+	return world
+
+if __name__ == "__main__":
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+	seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+	num = int(sys.argv[3]) if len(sys.argv) > 3 else size * size // 150000
+	ticks = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+	towersPerLane = int(sys.argv[5]) if len(sys.argv) > 5 else 2
+	world = makeWorld(size, seed, num, towersPerLane)
+	timed("run %d ticks" % ticks, lambda: world.step(ticks))
+	print("%d npcs, %d bullets after %d ticks" % (len(world.getNPCs()), len(world.bullets), world.ticks))
@@ -24,6 +24,7 @@ from constants import *
 from utils import *
 from core import *
 from astarnavigator2 import *
+from flowfieldnavigator import *
 from agents import *
 from moba import *
 from MyMinion import *
@@ -96,12 +97,17 @@ world.addTower(t21)
 t22 = Tower(TOWER, (950, 1100), world, 2)
 world.addTower(t22)
 
+# Path network, potential gates and free locations are built once per map and then loaded from disk
+bundle = loadMapBundle(world, agent, pathnodes)
+world.setMapBundle(bundle)
+
 nav = AStarNavigator2()
+# nav = FlowFieldNavigator()
 nav.agent = agent
 nav.setWorld(world)
 
 nav.pathnodes = pathnodes
-nav.pathnetwork = myBuildPathNetwork(pathnodes, world, agent)
+nav.pathnetwork = bundle.get('pathnetwork', 'lines', lambda: myBuildPathNetwork(pathnodes, world, agent))
 
 
 b1.setNavigator(nav)
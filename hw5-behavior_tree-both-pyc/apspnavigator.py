@@ -0,0 +1,77 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import sys, pygame, math, numpy, random, time, copy
+from pygame.locals import *
+
+from constants import *
+from utils import *
+from core import *
+
+
+###############################
+### APSPNavigator
+###
+### Navigates a static path network with all-pairs shortest path tables. The tables are built once per path network
+### (the first time any navigator asks for them) and shared read-only by every navigator on that network, including clones
+### made with cloneAPSPNavigator(). A path is read off the next table instead of searched for. When gates block an edge
+### of the table path, the navigator falls back to A* on the same graph.
+
+class APSPNavigator(PathNetworkNavigator):
+
+	### next: next[i][j] is the node to go to from node i on the way to node j (shared, read-only)
+	### dist: dist[i][j] is the length of the shortest path from node i to node j (shared, read-only)
+
+	def __init__(self):
+		PathNetworkNavigator.__init__(self)
+		self.next = None
+		self.dist = None
+
+	### Returns the compiled path network, making sure the shortest path tables exist.
+	def getPathGraph(self):
+		graph = getPathGraph(self.pathnetwork)
+		self.dist, self.next = graph.getShortestPaths()
+		return graph
+
+	### Finds the shortest path from the source to the destination.
+	### self: the navigator object
+	### source: the place the agent is starting from (i.e., its current location)
+	### dest: the place the agent is told to go to
+	### The path is requested from the world's path scheduler, so it may arrive on a later tick (see GameWorld.setPathBudget()).
+	def computePath(self, source, dest):
+		self.setPath(None)
+		self.request = None
+		if self.agent != None and self.world != None and self.pathnetwork is not None:
+			self.source = source
+			self.destination = dest
+			if self.clearShot(source, dest):
+				# Nothing in the way, go straight there
+				self.agent.moveToTarget(dest)
+			else:
+				start = self.getOnPathNetwork(source)
+				end = self.getOnPathNetwork(dest)
+				if start != None and end != None:
+					self.requestPath(self.getPathGraph(), start, end, True, self.followPath)
+		return None
+
+	### Called with the path requested by computePath()
+	def followPath(self, path):
+		if len(path) > 0:
+			self.setPath(path)
+			first = self.path.pop(0)
+			self.agent.moveToTarget(first)
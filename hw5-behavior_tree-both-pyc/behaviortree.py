@@ -68,7 +68,12 @@ class BehaviorTree():
 	### Called every tick. Calls tree.execute(), which will return True for successful completion, False for failed execution, or None if execution should continue next tick. If the tree completes execution (i.e., returns True or False), then the tree is reset to begin again in the next tick.
 	def update(self, delta = 0):
 		if self.running and self.tree is not None:
+			# Timed by the world's profiler when the tree belongs to an agent
+			world = getattr(self, 'world', None)
+			start = world.profiler.begin() if world is not None else None
 			res = self.tree.execute(delta)
+			if start is not None:
+				world.profiler.end('execute', start)
 			if res is not None:
 				self.tree.reset()
 			return res
@@ -24,6 +24,7 @@ from utils import *
 from core import *
 from agents import *
 from astarnavigator2 import *
+from apspnavigator import *
 from clonenav import *
 
 
@@ -350,7 +351,10 @@ class Base(Mover):
 			#agent.rect = agent.rect.move(pos)
 			agent.move(pos)
 			if self.nav is not None:
-				newnav = cloneAStarNavigator(self.nav)
+				if isinstance(self.nav, APSPNavigator):
+					newnav = cloneAPSPNavigator(self.nav)
+				else:
+					newnav = cloneAStarNavigator(self.nav)
 				agent.setNavigator(newnav)
 			agent.setTeam(self.team)
 			agent.setOwner(self)
@@ -377,7 +381,7 @@ class Base(Mover):
 			heros = []
 			for npc in self.world.npcs + [self.world.agent]:
 				if npc.getTeam() == None or npc.getTeam() != self.getTeam() and distance(self.getLocation(), npc.getLocation()) < BASEBULLETRANGE:
-					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getLines())
+					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getSegmentGrid())
 					if hit == None:
 						if isinstance(npc, Minion):
 							minions.append(npc)
@@ -486,7 +490,7 @@ class Tower(Mover):
 			heros = []
 			for npc in self.world.npcs + [self.world.agent]:
 				if npc.getTeam() == None or npc.getTeam() != self.getTeam() and distance(self.getLocation(), npc.getLocation()) < TOWERBULLETRANGE:
-					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getLines())
+					hit = rayTraceWorld(self.getLocation(), npc.getLocation(), self.world.getSegmentGrid())
 					if hit == None:
 						if isinstance(npc, Minion):
 							minions.append(npc)
@@ -522,8 +526,8 @@ class MOBAWorld(GatedWorld):
 	### towers: the towers (many per team)
 	### score: dictionary with team symbol as key and team score as value. Score is amount of damage done to the hero.
 	
-	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm):
-		GatedWorld.__init__(self, seed, worlddimensions, screendimensions, numgates, alarm)
+	def __init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless = False):
+		GatedWorld.__init__(self, seed, worlddimensions, screendimensions, numgates, alarm, headless)
 		self.bases = []
 		self.towers = []
 		self.score = {}
@@ -123,12 +123,16 @@ world.addBase(b1)
 b2 = Base(BASE, (1125, 1125), world, 2, WanderingAlienMinion, MyAlienHero, BUILDRATE, 1000000)
 world.addBase(b2)
 
+# Path network, potential gates and free locations are built once per map and then loaded from disk
+bundle = loadMapBundle(world, agent, pathnodes)
+world.setMapBundle(bundle)
+
 nav = AStarNavigator2()
 nav.agent = agent
 nav.setWorld(world)
 
 nav.pathnodes = pathnodes
-nav.pathnetwork = myBuildPathNetwork(pathnodes, world, agent)
+nav.pathnetwork = bundle.get('pathnetwork', 'lines', lambda: myBuildPathNetwork(pathnodes, world, agent))
 
 
 b1.setNavigator(nav)
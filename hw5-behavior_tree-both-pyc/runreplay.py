@@ -0,0 +1,83 @@
+'''
+ * Copyright (c) 2014, 2015 Entertainment Intelligence Lab, Georgia Institute of Technology.
+ * Originally developed by Mark Riedl.
+ * Last edited by Mark Riedl 05/2015
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+
+import sys, pygame, math, numpy, random, time, copy, io, contextlib, argparse, runpy
+from pygame.locals import *
+
+from constants import *
+from utils import *
+from core import *
+
+############################
+### Match replays
+###
+### Records a match played with one of the run scripts, or replays a recorded match headless. A replay runs the same
+### ticks with the same seeds and the same inputs as the recorded match (see MatchRecorder in core.py), so it is a fixed
+### workload for timing engine changes before and after. The spawns of the replay are checked against the recording to
+### catch a replay that has drifted from the match.
+### Usage: python runreplay.py record log script [args]
+###        python runreplay.py play log [--profile prefix]
+
+### Plays script (with args) as usual, recording the match to filename
+def record(filename, script, args):
+	recordMatch(filename, script, args)
+	sys.argv = [script] + args
+	runpy.run_path(script, run_name = '__main__')
+
+### Sets the recorded match up by running its script up to (but not including) world.run(), then replays its ticks.
+### Returns the MatchReplay and the wall time taken by the ticks, in seconds. If profile is given, the world's phases are
+### timed and exported to profile.csv and profile.json (see TickProfiler).
+def play(filename, profile = None):
+	replay = replayMatch(filename)
+	script = replay.header['script']
+	sys.argv = [script] + replay.header['argv']
+	source = open(script).read()
+	source = source[:source.index('\nworld.run()')]
+	scope = {'__name__': '__main__'}
+	with contextlib.redirect_stdout(io.StringIO()):
+		exec(compile(source, script, 'exec'), scope)
+		if profile is not None:
+			replay.world.setProfiling(True, profile)
+		elapsed = replay.play()
+	return replay, elapsed
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Record a match, or replay a recorded match headless.")
+	commands = parser.add_subparsers(dest = 'command', required = True)
+	recorder = commands.add_parser('record', help = "play a run script and record the match")
+	recorder.add_argument('log', help = "file to write the match log to")
+	recorder.add_argument('script', help = "run script to play, e.g. runmoba.py")
+	recorder.add_argument('args', nargs = argparse.REMAINDER, help = "arguments for the run script")
+	player = commands.add_parser('play', help = "replay a recorded match headless and time it")
+	player.add_argument('log', help = "match log written by record")
+	player.add_argument('--profile', help = "export the tick profile to this prefix (.csv and .json)")
+	args = parser.parse_args()
+	if args.command == 'record':
+		record(args.log, args.script, args.args)
+	else:
+		replay, elapsed = play(args.log, args.profile)
+		ticks = replay.world.ticks
+		events = sum(len(tick[1]) for tick in replay.ticks)
+		spawns = len(replay.setup) + sum(len(tick[2]) for tick in replay.ticks)
+		print("%s: %s %s" % (args.log, replay.header['script'], ' '.join(replay.header['argv'])))
+		print("ticks %d  events %d  spawns %d  time %.3f s  %.3f ms/tick" % (ticks, events, spawns, elapsed, elapsed * 1000.0 / max(ticks, 1)))
+		if replay.divergence is not None:
+			tick, expected, replayed = replay.divergence
+			print("diverged at tick %d: recorded spawn %s, replayed spawn %s" % (tick, expected, replayed))
+			sys.exit(1)
@@ -41,7 +41,9 @@ class StateAgent(Agent, StateMachine):
 		
 	def update(self, delta):
 		Agent.update(self, delta)
+		start = self.world.profiler.begin()
 		StateMachine.update(self, delta)
+		self.world.profiler.end('execute', start)
 	
 	
 	def getStateType(self):
@@ -68,8 +70,10 @@ class VisionAgent(StateAgent):
 
 	def update(self, delta):
 		StateAgent.update(self, delta)
-		# Ask the world for what is visible (Movers) within the cone of vision
-		visible = self.world.getVisible(self.getLocation(), self.orientation, self.viewangle)
+		# Ask the world for what is visible (Movers) within the cone of vision. Line of sight is shared by all agents each tick.
+		start = self.world.profiler.begin()
+		visible = self.world.getVisibleFrom(self, self.viewangle)
+		self.world.profiler.end('getVisible', start)
 		self.visible = visible
 
 
@@ -66,7 +66,8 @@ class Place(Thing):
     self.center = (position[0]+width/2, position[1]+height/2)    # center point
     # Draw the rectangle
     s = pygame.Surface((width*2, height*2), pygame.SRCALPHA, 32)
-    s = s.convert_alpha()
+    if pygame.display.get_surface() is not None:
+      s = s.convert_alpha()
     pygame.draw.rect(s, color, (0,0,width,height), linewidth)
     self.surface = s
     self.font = pygame.font.SysFont("monospace", 15)
@@ -145,6 +146,7 @@ def threaded_draw_with_places():
     yield
     self.drawMousePosition()
     self.drawPlaces()
+    self.drawProfile()
     yield
     pygame.display.flip()
     yield
@@ -158,8 +160,8 @@ def threaded_draw_with_places():
 
 class NPCWorld(GatedWorld):
 
-  def __init__(self, seed, worlddimensions, screendimensions, initial_state):
-    GatedWorld.__init__(self, seed, worlddimensions, screendimensions, 0, 0)
+  def __init__(self, seed, worlddimensions, screendimensions, initial_state, headless = False):
+    GatedWorld.__init__(self, seed, worlddimensions, screendimensions, 0, 0, headless)
     self.world_state = initial_state # The world state (set of strings)
     self.places = []                 # list of places
 
@@ -177,11 +179,12 @@ class NPCWorld(GatedWorld):
     self.places.append(place)
 
   ### Overrides the run loop from GameWorld. Uses threading.
-  def run(self):
+  ### See GameWorld.run()
+  def run(self, ticks = None, until = None):
     global game_world
-    self.sprites = pygame.sprite.RenderPlain((self.agent))
-    for m in self.movers:
-      self.sprites.add(m)
+    if self.headless:
+      return self.runHeadless(ticks, until)
+    self.initializeSprites()
     clock = pygame.time.Clock()
     
     # Draw obstacles. 
@@ -195,14 +198,16 @@ class NPCWorld(GatedWorld):
     while True:
       clock.tick(TICK)
       delta = clock.get_rawtime()
-      self.handleEvents()
-      self.update(delta)
-      self.sprites.update(delta) 
+      self.runTick(delta)
 
+      start = self.profiler.begin()
       try:
         next(draw_iterator)
       except StopIteration:
         pass
+      self.profiler.end('draw', start)
+      self.profiler.endTick(self.ticks)
+      self.ticks = self.ticks + 1
 
   ### Called every tick. Updates all other objects in the world, including places.
   def update(self, delta = 0):
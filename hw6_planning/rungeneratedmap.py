@@ -0,0 +1,109 @@
+import sys, pygame, math, numpy, random, time, copy, io, contextlib
+from pygame.locals import * 
+
+from constants import *
+from utils import *
+from core import *
+from astarnavigator2 import *
+from planner import *
+from npcworld import *
+from mybuildpathnetwork import *
+
+#############################
+### Generated NPCWorld map
+###
+### Builds an NPCWorld on a map made by MapGenerator (same seed, same map) with generated places and doors, and a plan
+### that visits the places in a chain: place, door, place, door, ... Every door is locked and has to be opened before
+### the agent can move on from it. Times each stage of setting the world up and of running it headless, to see how the
+### engine scales with the size of the world.
+### Usage: python rungeneratedmap.py [size] [seed] [obstacles] [places] [doors] [ticks]
+
+### AStarNavigator2 stops the agent when a closed door crosses the straight line from the agent to the rest of its path,
+### even while the agent is headed for a waypoint that goes around the door (after smoothing). Doors on generated maps
+### sit between obstacles anywhere, so check the path from the waypoint the agent is actually headed for.
+class GeneratedMapNavigator(AStarNavigator2):
+
+  def update(self, delta):
+    if self.getPath() is not None:
+      gates = self.world.getGates()
+      last = self.agent.getLocation()
+      for p in [self.agent.moveTarget] + self.getPath() + [self.getDestination()]:
+        if p is not None:
+          if rayTraceWorld(last, p, gates) is not None:
+            self.setPath(None)
+            self.agent.stopMoving()
+            return None
+          last = p
+    return None
+
+### Runs fn, prints how long it took and returns its result
+def timed(label, fn):
+  start = time.perf_counter()
+  result = fn()
+  print("%-28s %10.3f s" % (label, time.perf_counter() - start), file = sys.__stdout__)
+  return result
+
+### Returns the places and doors in the order the plan visits them, the initial state and the actions of the plan
+def makeChain(places, doors):
+  chain = []
+  for n in range(max(len(places), len(doors))):
+    chain = chain + places[n:n+1] + doors[n:n+1]
+  init = [chain[0][0]]
+  actions = []
+  for here, there in zip(chain, chain[1:]):
+    path = 'path_%s_to_%s' % (here[0][3:], there[0][3:])
+    if len(here) > 4:
+      # A door: has to be opened first
+      locked = here[0][3:] + '_locked'
+      init.append(locked)
+      actions.append(DoorAction('open_' + here[0][3:], preconditions = [here[0], locked], add_list = [path], delete_list = [locked]))
+    else:
+      init.append(path)
+    actions.append(MoveAction('move_%s_to_%s' % (here[0][3:], there[0][3:]), preconditions = [here[0], path], add_list = [there[0]], delete_list = [here[0]]))
+  return chain, init, actions
+
+def makeWorld(size, seed, num, numPlaces, numDoors):
+  dims = (size, size)
+  generator = timed("generate map", lambda: MapGenerator(dims, seed, num))
+  places, doors = timed("generate places", lambda: generator.placeLayout(numPlaces, numDoors))
+  chain, init, actions = makeChain(places, doors)
+  init_state = State(propositions = init)
+  goal_state = State(propositions = [chain[-1][0]])
+  world = NPCWorld(seed, dims, dims, init_state.propositions, headless = True)
+  start = chain[0]
+  agent = NPCAgent(AGENT, (start[1][0] + start[2]/2, start[1][1] + start[3]/2), 0, SPEED, world)
+  agent.initial_state = init_state
+  agent.goal_state = goal_state
+  agent.actions = actions
+  # ManualObstacle prints every polygon
+  with contextlib.redirect_stdout(io.StringIO()):
+    timed("initialize terrain", lambda: world.initializeTerrain(generator.obstacles, (0, 0, 0), 4))
+  world.setPlayerAgent(agent)
+  for label, position, width, height in places:
+    world.add_place(Place(label, position, width, height, world, linewidth = 4))
+  for label, position, width, height, p1, p2 in doors:
+    place = DoorPlace(label, position, width, height, world, p1, p2, linewidth = 4)
+    place.possible_triggers = ['open_' + label[3:]]
+    world.add_place(place)
+  # A pathnode in the middle of every place, so that the last leg to a place never crosses a door
+  nav = GeneratedMapNavigator()
+  nav.pathnodes = generator.pathnodes + [(int(p.center[0]), int(p.center[1])) for p in world.places]
+  nav.pathnetwork = timed("build path network", lambda: myBuildPathNetwork(nav.pathnodes, world, agent))
+  nav.setWorld(world)
+  agent.setNavigator(nav)
+  with contextlib.redirect_stdout(io.StringIO()):
+    timed("plan", agent.start)
+  print("%d obstacles, %d lines, %d pathnodes, %d path edges, %d places, %d doors, plan of %d actions" % (len(generator.obstacles), len(world.getLines()), len(nav.pathnodes), len(nav.pathnetwork), len(places), len(doors), len(agent.the_plan or [])))
+  return world, agent
+
+if __name__ == "__main__":
+  size = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+  seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+  num = int(sys.argv[3]) if len(sys.argv) > 3 else size * size // 150000
+  numPlaces = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+  numDoors = int(sys.argv[5]) if len(sys.argv) > 5 else 3
+  ticks = int(sys.argv[6]) if len(sys.argv) > 6 else 300
+  world, agent = makeWorld(size, seed, num, numPlaces, numDoors)
+  with contextlib.redirect_stdout(io.StringIO()):
+    timed("run %d ticks" % ticks, lambda: world.step(ticks))
+  print("world state after %d ticks: %s" % (world.ticks, sorted(world.world_state)))
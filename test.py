@@ -0,0 +1,902 @@
+'''
+Tests for the shared engine utilities (utils.py and core.py, which are the same in every assignment that uses them).
+Run with: python test.py (or python -m pytest test.py)
+'''
+
+import sys, os, re, ast, math, random, time, unittest, tempfile, shutil, importlib, io, contextlib, json, struct
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENGINE = os.path.join(ROOT, 'hw4_fsm')
+sys.path.insert(0, ENGINE)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from utils import *
+import core
+
+
+### Distance between the segments (p1, p2) and (q1, q2)
+def segmentDistance(p1, p2, q1, q2):
+	if rayTrace(p1, p2, (q1, q2)) != None:
+		return 0.0
+	return min(minimumDistance((q1, q2), p1), minimumDistance((q1, q2), p2), minimumDistance((p1, p2), q1), minimumDistance((p1, p2), q2))
+
+### The clearance test InflatedLines replaced: four rays offset by the radius up, down, left and right
+def offsetRaysClear(p1, p2, lines, radius):
+	for dx, dy in ((0, radius), (0, -radius), (radius, 0), (-radius, 0)):
+		if rayTraceWorldNoEndPoints((p1[0]+dx, p1[1]+dy), (p2[0]+dx, p2[1]+dy), lines) != None:
+			return False
+	return True
+
+def randomLines(rand, num, size = 1000, length = 200):
+	lines = []
+	for _ in range(num):
+		a = (rand.uniform(0, size), rand.uniform(0, size))
+		angle = rand.uniform(0, 2 * math.pi)
+		l = rand.uniform(10, length)
+		lines.append((a, (a[0] + l * math.cos(angle), a[1] + l * math.sin(angle))))
+	return lines
+
+def randomRays(rand, num, size = 1000):
+	return [((rand.uniform(0, size), rand.uniform(0, size)), (rand.uniform(0, size), rand.uniform(0, size))) for _ in range(num)]
+
+
+############################
+### InflatedLines
+
+class TestInflatedLines(unittest.TestCase):
+
+	def setUp(self):
+		rand = random.Random(1)
+		self.radius = 15
+		self.lines = randomLines(rand, 30)
+		self.rays = randomRays(rand, 600)
+		self.inflated = InflatedLines(self.lines, self.radius)
+
+	### A ray starting within the radius of a wall must not pass through it
+	def testStartInsideOutlineThroughWall(self):
+		inflated = InflatedLines([((0, 0), (100, 0))], 10)
+		self.assertFalse(inflated.clear((50, 5), (50, -50)))
+		self.assertFalse(inflated.clearMany([((50, 5), (50, -50))])[0])
+		# Moving away from the wall is allowed
+		self.assertTrue(inflated.clear((50, 5), (50, 50)))
+		self.assertTrue(inflated.clearMany([((50, 5), (50, 50))])[0])
+
+	def testZeroRadius(self):
+		inflated = InflatedLines([((0, 0), (100, 0))], 0)
+		self.assertFalse(inflated.clear((50, 5), (50, -50)))
+		self.assertTrue(inflated.clear((50, 5), (50, 50)))
+
+	def testClearManyMatchesClear(self):
+		many = self.inflated.clearMany(self.rays)
+		self.assertEqual(list(many), [self.inflated.clear(p1, p2) for p1, p2 in self.rays])
+
+	### Spreading the chunks over worker processes gives the same answers
+	def testClearManyProcesses(self):
+		self.assertEqual(list(self.inflated.clearMany(self.rays, 100, 3)), list(self.inflated.clearMany(self.rays)))
+		self.assertEqual(len(self.inflated.clearMany([], 100, 3)), 0)
+
+	### Never clear through a line, wherever the ray starts
+	def testCrossingIsNeverClear(self):
+		many = self.inflated.clearMany(self.rays)
+		for (p1, p2), clear in zip(self.rays, many):
+			if rayTraceWorld(p1, p2, self.lines) != None:
+				self.assertFalse(clear)
+				self.assertFalse(self.inflated.clear(p1, p2))
+
+	### For rays that start and end clear of every line: clear means the agent never comes within the radius of a line,
+	### and anything the old four offset rays blocked is still blocked
+	def testAgainstOffsetRays(self):
+		many = self.inflated.clearMany(self.rays)
+		checked = 0
+		for (p1, p2), clear in zip(self.rays, many):
+			if min(minimumDistance(l, p) for l in self.lines for p in (p1, p2)) <= self.radius * 1.5:
+				continue
+			checked = checked + 1
+			closest = min(segmentDistance(p1, p2, l[0], l[1]) for l in self.lines)
+			if clear:
+				self.assertGreaterEqual(closest, self.radius - 0.01)
+			if not offsetRaysClear(p1, p2, self.lines, self.radius):
+				self.assertFalse(clear)
+		self.assertGreater(checked, 50)
+
+
+
+############################
+### collidingRectPairs
+
+class TestCollidingRectPairs(unittest.TestCase):
+
+	### The pairs every-pair colliderect tests find (what worldCollisionTest did before the broadphase)
+	def allPairs(self, rects):
+		return {(i, j) for i in range(len(rects)) for j in range(i + 1, len(rects)) if rects[i].colliderect(rects[j])}
+
+	def found(self, rects):
+		pairs = collidingRectPairs(rects)
+		for i, js in pairs.items():
+			self.assertEqual(js, sorted(js))
+		return {(i, j) for i, js in pairs.items() for j in js}
+
+	### Random movers, mostly agent sized with a few large ones, some off the map, some touching edge to edge
+	def testSameAsAllPairs(self):
+		rand = random.Random(12)
+		for trial in range(30):
+			rects = []
+			for _ in range(rand.randint(0, 150)):
+				size = rand.choice([rand.randint(0, 40)] * 9 + [rand.randint(100, 600)])
+				rects.append(pygame.Rect(rand.randint(-100, 1000), rand.randint(-100, 1000), size, rand.randint(max(0, size - 10), size + 10)))
+			for r in rects[:5]:
+				rects.append(pygame.Rect(r.right, r.top, 20, 20))
+			self.assertEqual(self.found(rects), self.allPairs(rects))
+
+	def testEmpty(self):
+		self.assertEqual(collidingRectPairs([]), {})
+
+
+############################
+### myBuildPathNetwork
+
+### The run scripts whose maps path networks are built for
+SHIPPEDMAPS = ['hw1_paths/run0.py', 'hw1_paths/run1.py', 'hw1_paths/run2.py', 'hw1_paths/run3.py', 'hw1_paths/run4.py',
+	'hw3_astar2/runastarnavigator2.py', 'hw4_fsm/runmoba.py', 'hw6_planning/rundoormap.py', 'hw6_planning/runbankmap.py']
+
+### Runs a run script headless up to the line that builds its path network, in its own directory. Returns the script's
+### globals (pathnodes, world, agent, myBuildPathNetwork, ...). Modules the script loads from its directory are unloaded
+### again, since every assignment has its own mybuildpathnetwork.py.
+def loadShippedMap(script):
+	path = os.path.join(ROOT, script)
+	directory = os.path.dirname(path)
+	with open(path) as f:
+		source = f.read()
+	source = source[:re.search(r'^nav.pathnetwork =', source, re.M).start()]
+	source = re.sub(r'^(world = [A-Za-z]*World\(.*)\)\s*$', r'\1, headless = True)', source, flags = re.M)
+	cwd = os.getcwd()
+	modules = set(sys.modules)
+	os.chdir(directory)
+	sys.path.insert(0, directory)
+	try:
+		namespace = {'__name__': 'shippedmap', '__file__': path}
+		# The scripts (and the obstacle constructor) print as they go
+		with contextlib.redirect_stdout(io.StringIO()):
+			exec(compile(source, path, 'exec'), namespace)
+		return namespace
+	finally:
+		os.chdir(cwd)
+		sys.path.remove(directory)
+		for name in set(sys.modules) - modules:
+			del sys.modules[name]
+
+### The path network builder before InflatedLines: a pair is connected if the line between the nodes, and the same line
+### offset by the agent's radius up, down, right and left, all miss every obstacle
+def offsetRayPathNetwork(pathnodes, world, agent):
+	radius = agent.getMaxRadius()
+	def hasObstacleBetween(p1, p2):
+		return any(rayTraceWorld(p1, p2, list(o.getLines())) is not None for o in world.obstacles)
+	lines = []
+	for i in range(len(pathnodes)):
+		for j in range(i + 1, len(pathnodes)):
+			a, b = pathnodes[i], pathnodes[j]
+			if not any(hasObstacleBetween((a[0]+dx, a[1]+dy), (b[0]+dx, b[1]+dy)) for dx, dy in ((0, 0), (0, radius), (0, -radius), (radius, 0), (-radius, 0))):
+				lines.append((a, b))
+	return lines
+
+class TestPathNetworkBuild(unittest.TestCase):
+
+	### On the shipped maps the built network is the offset-ray network, less the edges along which the agent would
+	### touch an obstacle (which the offset rays miss)
+	def testAgainstOffsetRays(self):
+		dropped = 0
+		for script in SHIPPEDMAPS:
+			namespace = loadShippedMap(script)
+			pathnodes, world, agent = namespace['pathnodes'], namespace['world'], namespace['agent']
+			built = namespace['myBuildPathNetwork'](pathnodes, world, agent)
+			old = offsetRayPathNetwork(pathnodes, world, agent)
+			self.assertEqual(len(built), len(set(built)))
+			self.assertLessEqual(set(built), set(old), script)
+			lines = [l for o in world.obstacles for l in o.getLines()]
+			for a, b in set(old) - set(built):
+				self.assertLess(min(segmentDistance(a, b, l[0], l[1]) for l in lines), agent.getMaxRadius(), script)
+				dropped = dropped + 1
+			self.assertEqual(built, [e for e in old if e in set(built)], script)
+		self.assertLessEqual(dropped, 1)
+
+
+############################
+### PathNodeTable
+
+class TestPathNodeTable(unittest.TestCase):
+
+	def makeTable(self, seed, size, nodes, lines, radius = 20):
+		rand = random.Random(seed)
+		self.lines = randomLines(rand, lines, size, 300)
+		self.nodes = [(rand.uniform(0, size), rand.uniform(0, size)) for _ in range(nodes)]
+		self.inflated = InflatedLines(self.lines, radius)
+		self.points = [(rand.uniform(-50, size + 50), rand.uniform(-50, size + 50)) for _ in range(100)]
+		return PathNodeTable(self.nodes, self.inflated, (size, size))
+
+	### The closest clear node, by testing every node (what getOnPathNetwork did before the table)
+	def fullScan(self, point):
+		best = None
+		bestDist = 0
+		for node in self.nodes:
+			d = distance(point, node)
+			if (best is None or d < bestDist) and self.inflated.clear(point, node):
+				best = node
+				bestDist = d
+		return best
+
+	def testSameAsFullScan(self):
+		for seed, size, nodes, lines in [(1, 1000, 40, 20), (2, 3000, 131, 200), (3, 600, 5, 40)]:
+			table = self.makeTable(seed, size, nodes, lines)
+			for p in self.points:
+				self.assertEqual(table.closest(p), self.fullScan(p))
+
+	def testNoNodes(self):
+		table = PathNodeTable([], InflatedLines([], 10), (100, 100))
+		self.assertIsNone(table.closest((50, 50)))
+
+	def testNoClearNode(self):
+		table = PathNodeTable([(50, 150)], InflatedLines([((0, 100), (100, 100))], 10), (100, 200))
+		self.assertIsNone(table.closest((50, 50)))
+		self.assertEqual(table.closest((50, 180)), (50, 150))
+
+	### On a large map the table ray tests only the few nodes nearest each query, where a full scan tests every node that
+	### is nearer than the best one found so far
+	def testFewerClearanceTests(self):
+		table = self.makeTable(4, 10000, 1366, 1500)
+		clear = self.inflated.clear
+		calls = [0]
+		def counted(p1, p2):
+			calls[0] = calls[0] + 1
+			return clear(p1, p2)
+		self.inflated.clear = counted
+		answers = [table.closest(p) for p in self.points]
+		tableCalls = calls[0]
+		calls[0] = 0
+		scanned = [self.fullScan(p) for p in self.points]
+		self.assertEqual(answers, scanned)
+		self.assertLess(tableCalls, calls[0] / 5.0)
+
+
+
+############################
+### Nav mesh paths (NavMeshIndex, funnelPath)
+
+def pathLength(path):
+	return sum(distance(path[i], path[i+1]) for i in range(len(path) - 1))
+
+### Triangles of a grid of squares (jittered by jitter pixels), with about a fifth of the squares left out as obstacles.
+### Unjittered grids are full of collinear portal ends.
+def gridMesh(rand, columns, rows, size, jitter):
+	points = {}
+	for x in range(columns + 1):
+		for y in range(rows + 1):
+			points[(x, y)] = (x * size + rand.uniform(-jitter, jitter), y * size + rand.uniform(-jitter, jitter))
+	polygons = []
+	for x in range(columns):
+		for y in range(rows):
+			if rand.random() < 0.2:
+				continue
+			a, b, c, d = points[(x, y)], points[(x+1, y)], points[(x+1, y+1)], points[(x, y+1)]
+			if rand.random() < 0.5:
+				polygons.extend([[a, b, c], [a, c, d]])
+			else:
+				polygons.extend([[a, b, d], [b, c, d]])
+	return polygons
+
+### A random point inside a triangle
+def pointInTriangle(rand, triangle):
+	u, v = rand.random(), rand.random()
+	if u + v > 1:
+		u, v = 1 - u, 1 - v
+	a, b, c = triangle
+	return (a[0] + u * (b[0] - a[0]) + v * (c[0] - a[0]), a[1] + u * (b[1] - a[1]) + v * (c[1] - a[1]))
+
+class TestFunnel(unittest.TestCase):
+
+	### Collinear portal ends used to make the funnel turn at the far end of a portal
+	def testCollinearPortals(self):
+		start, goal = (21.5, 78.8), (311.8, 357.4)
+		portals = [((0, 0), (5, 160)), ((5, 475), (5, 320)), ((220, 440), (5, 320))]
+		path = funnelPath(start, goal, portals)
+		self.assertEqual(path, [start, (5, 160), (5, 320), goal])
+
+	def testStraightCorridor(self):
+		portals = [((10, -5), (10, 5)), ((20, -5), (20, 5))]
+		self.assertEqual(funnelPath((0, 0), (30, 0), portals), [(0, 0), (30, 0)])
+
+	### The funnel path is never longer than the path through the portal midpoints of the same corridor, and crosses
+	### every portal
+	def testNotLongerThanMidpoints(self):
+		rand = random.Random(5)
+		checked = 0
+		for jitter in (0, 8):
+			polygons = gridMesh(rand, 12, 12, 40, jitter)
+			mesh = NavMeshIndex(polygons)
+			for _ in range(300):
+				start = pointInTriangle(rand, rand.choice(polygons))
+				goal = pointInTriangle(rand, rand.choice(polygons))
+				portals = mesh.findCorridor(start, goal)
+				if portals is None:
+					continue
+				checked = checked + 1
+				path = funnelPath(start, goal, portals)
+				midpoints = [start] + [((l[0]+r[0])/2.0, (l[1]+r[1])/2.0) for l, r in portals] + [goal]
+				self.assertLessEqual(pathLength(path), pathLength(midpoints) + 1e-6)
+				for left, right in portals:
+					self.assertTrue(any(rayTrace(path[i], path[i+1], (left, right)) != None for i in range(len(path) - 1)))
+		self.assertGreater(checked, 300)
+
+
+
+############################
+### Constrained triangulation (hw2_navmesh/triangulation.py)
+
+NAVMESHDIR = os.path.join(ROOT, 'hw2_navmesh')
+NAVMESHMAPS = ['run0.py', 'run1.py', 'run2.py', 'run3.py', 'run4.py']
+
+### Imports a module from an assignment directory against that assignment's own utils, constants and core, and puts
+### the engine modules the tests use back afterwards
+def loadAssignmentModule(directory, name):
+	engine = dict((m, sys.modules.pop(m)) for m in ('utils', 'constants', 'core') if m in sys.modules)
+	modules = set(sys.modules)
+	sys.path.insert(0, directory)
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			return importlib.import_module(name)
+	finally:
+		sys.path.remove(directory)
+		for m in set(sys.modules) - modules:
+			del sys.modules[m]
+		sys.modules.update(engine)
+
+### The world dimensions and obstacles (lists of points) a run script passes to GameWorld and initializeTerrain
+def shippedTerrain(script):
+	with open(os.path.join(NAVMESHDIR, script)) as f:
+		tree = ast.parse(f.read())
+	dimensions, obstacles = None, None
+	for node in ast.walk(tree):
+		if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'GameWorld':
+			dimensions = ast.literal_eval(node.args[1])
+		if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'initializeTerrain':
+			obstacles = ast.literal_eval(node.args[0])
+	return dimensions, obstacles
+
+### Twice the signed area of a polygon (positive if counterclockwise in the triangulation's orientation())
+def polygonArea2(points):
+	return sum(points[i-1][0] * points[i][1] - points[i][0] * points[i-1][1] for i in range(len(points)))
+
+### Crossing-number point in polygon test, for points that are not on an edge
+def insidePolygon(p, points):
+	inside = False
+	for i in range(len(points)):
+		a, b = points[i-1], points[i]
+		if (a[1] > p[1]) != (b[1] > p[1]) and p[0] < a[0] + (p[1] - a[1]) * (b[0] - a[0]) / float(b[1] - a[1]):
+			inside = not inside
+	return inside
+
+### True if the segments (p1, p2) and (q1, q2) cross at a point interior to both
+def properlyCross(p1, p2, q1, q2, orientation):
+	return (orientation(p1, p2, q1) * orientation(p1, p2, q2) < 0
+		and orientation(q1, q2, p1) * orientation(q1, q2, p2) < 0)
+
+class TestTriangulation(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.triangulation = loadAssignmentModule(NAVMESHDIR, 'triangulation')
+		cls.maps = []
+		for script in NAVMESHMAPS:
+			dimensions, obstacles = shippedTerrain(script)
+			mesh, triangles = cls.triangulation.triangulateFreeSpace(dimensions, obstacles)
+			polygons, adjacency = cls.triangulation.buildNavMesh(dimensions, obstacles)
+			cls.maps.append((script, dimensions, obstacles, mesh, triangles, polygons))
+
+	### Every obstacle edge is covered by constrained triangulation edges lying along it (an obstacle vertex on the edge
+	### splits it)
+	def testObstacleEdgesAreConstraints(self):
+		orientation = self.triangulation.orientation
+		for script, dimensions, obstacles, mesh, triangles, polygons in self.maps:
+			for (a, b) in mesh.constrained:
+				self.assertTrue((a, b) in mesh.apex or (b, a) in mesh.apex, script)
+			for obstacle in obstacles:
+				for i in range(len(obstacle)):
+					p, q = obstacle[i-1], obstacle[i]
+					def along(v):
+						r = mesh.points[v]
+						return orientation(p, q, r) == 0 and min(p[0], q[0]) <= r[0] <= max(p[0], q[0]) and min(p[1], q[1]) <= r[1] <= max(p[1], q[1])
+					length = sum(distance(mesh.points[a], mesh.points[b]) for a, b in mesh.constrained if along(a) and along(b))
+					self.assertAlmostEqual(length, distance(p, q), 6, (script, p, q))
+
+	### Nav mesh polygons are convex and counterclockwise, and neither cross an obstacle edge nor hold an obstacle vertex
+	### or sit inside an obstacle
+	def testPolygonsConvexAndOutsideObstacles(self):
+		orientation = self.triangulation.orientation
+		for script, dimensions, obstacles, mesh, triangles, polygons in self.maps:
+			for polygon in polygons:
+				self.assertGreater(polygonArea2(polygon), 0, script)
+				for k in range(len(polygon)):
+					self.assertGreaterEqual(orientation(polygon[k-2], polygon[k-1], polygon[k]), 0, (script, polygon))
+				centroid = (sum(p[0] for p in polygon) / float(len(polygon)), sum(p[1] for p in polygon) / float(len(polygon)))
+				for obstacle in obstacles:
+					self.assertFalse(insidePolygon(centroid, obstacle), (script, polygon))
+					for q in obstacle:
+						self.assertFalse(all(orientation(polygon[k-1], polygon[k], q) > 0 for k in range(len(polygon))), (script, polygon, q))
+					for k in range(len(polygon)):
+						for i in range(len(obstacle)):
+							self.assertFalse(properlyCross(polygon[k-1], polygon[k], obstacle[i-1], obstacle[i], orientation), (script, polygon))
+
+	### The polygons have the area of the free space, and every random point of the world is in exactly one polygon if
+	### it is outside the obstacles and in none if it is inside one
+	def testPolygonsCoverFreeSpace(self):
+		rand = random.Random(14)
+		for script, dimensions, obstacles, mesh, triangles, polygons in self.maps:
+			free = 2 * dimensions[0] * dimensions[1] - sum(abs(polygonArea2(o)) for o in obstacles)
+			self.assertEqual(sum(polygonArea2(p) for p in polygons), free, script)
+			for _ in range(500):
+				p = (rand.uniform(0, dimensions[0]), rand.uniform(0, dimensions[1]))
+				count = sum(1 for polygon in polygons if insidePolygon(p, polygon))
+				self.assertEqual(count, 0 if any(insidePolygon(p, o) for o in obstacles) else 1, (script, p))
+
+
+############################
+### PathGraph
+
+### A path network on a jittered grid of nodes, with the diagonals of some squares
+def gridNetwork(rand, columns, rows, size):
+	points = {}
+	for x in range(columns):
+		for y in range(rows):
+			points[(x, y)] = (x * size + rand.uniform(-size / 5.0, size / 5.0), y * size + rand.uniform(-size / 5.0, size / 5.0))
+	network = []
+	for x in range(columns):
+		for y in range(rows):
+			if x + 1 < columns:
+				network.append((points[(x, y)], points[(x+1, y)]))
+			if y + 1 < rows:
+				network.append((points[(x, y)], points[(x, y+1)]))
+			if x + 1 < columns and y + 1 < rows and rand.random() < 0.3:
+				network.append((points[(x, y)], points[(x+1, y+1)]))
+	return network
+
+### Walls across a grid network (crossing many edges, some with ids far past 64)
+def gridGates(columns, rows, size):
+	return [((size * 2.5, -size), (size * 2.5, size * (rows - 3.5))), ((size * (columns - 4.5), size * 3.5), (size * (columns - 4.5), size * rows))]
+
+class TestPathGraph(unittest.TestCase):
+
+	def setUp(self):
+		self.network = gridNetwork(random.Random(7), 15, 15, 40)
+		self.graph = PathGraph(self.network)
+		self.gates = gridGates(15, 15, 40)
+		self.rand = random.Random(8)
+
+	### The edges a line blocks are exactly the ones it crosses
+	def testBlockedEdges(self):
+		self.assertEqual(self.graph.blockedEdges([]), frozenset())
+		for gate in self.gates:
+			expected = frozenset(e for e in range(len(self.graph.edges)) if rayTrace(gate[0], gate[1], self.graph.getEdgeLine(e)) != None)
+			self.assertEqual(self.graph.blockedEdges([gate]), expected)
+			self.assertGreater(max(expected), 64)
+		self.assertEqual(self.graph.blockedEdges(self.gates), self.graph.blockedEdges(self.gates[:1]) | self.graph.blockedEdges(self.gates[1:]))
+
+	### Searches never cross a blocked edge, and the tables agree with search
+	def testSearchAroundBlockedEdges(self):
+		blocked = self.graph.blockedEdges(self.gates)
+		found = 0
+		for _ in range(100):
+			init, goal = self.rand.choice(self.graph.nodes), self.rand.choice(self.graph.nodes)
+			path, closed = self.graph.search(init, goal, blocked)
+			table, _ = self.graph.tablePath(init, goal, blocked)
+			self.assertAlmostEqual(pathLength(path), pathLength(table), places = 6)
+			if len(path) > 0:
+				found = found + 1
+				self.assertEqual((path[0], path[-1]), (init, goal))
+			for i in range(len(path) - 1):
+				a, b = self.graph.getId(path[i]), self.graph.getId(path[i+1])
+				self.assertNotIn(self.graph.edgeIds[(a, b)], blocked)
+		self.assertGreater(found, 50)
+
+
+############################
+### FlowField
+
+class TestFlowField(unittest.TestCase):
+
+	def setUp(self):
+		self.graph = PathGraph(gridNetwork(random.Random(9), 12, 12, 40))
+		self.rand = random.Random(10)
+
+	### The field gives every node the same distance as A*, and a path of that length. Returns the number of nodes that
+	### couldn't reach their goal.
+	def checkAgainstSearch(self, gates):
+		blocked = self.graph.blockedEdges(gates)
+		unreachable = 0
+		for _ in range(5):
+			goal = self.rand.choice(self.graph.nodes)
+			field = FlowField(self.graph, self.graph.getId(goal), blocked)
+			for start in self.graph.nodes:
+				path, _ = self.graph.search(start, goal, blocked)
+				if len(path) == 0:
+					self.assertEqual(field.getDistance(start), INFINITY)
+					self.assertIsNone(field.getNext(start))
+					self.assertEqual(field.pathFrom(start), [])
+					unreachable = unreachable + 1
+					continue
+				self.assertAlmostEqual(field.getDistance(start), pathLength(path), places = 6)
+				flow = field.pathFrom(start)
+				self.assertEqual((flow[0], flow[-1]), (start, goal))
+				self.assertAlmostEqual(pathLength(flow), pathLength(path), places = 6)
+				self.assertEqual(field.getNext(start), flow[1] if len(flow) > 1 else goal)
+		return unreachable
+
+	def testSameAsSearch(self):
+		self.checkAgainstSearch([])
+
+	def testSameAsSearchWithGates(self):
+		self.checkAgainstSearch(gridGates(12, 12, 40))
+
+	### A closed gate splits off part of the graph
+	def testUnreachable(self):
+		self.assertGreater(self.checkAgainstSearch([((200, -40), (200, 500))]), 0)
+
+	def testFieldsAreShared(self):
+		gates = gridGates(12, 12, 40)
+		goal = self.graph.nodes[3]
+		field = self.graph.getFlowField(goal, gates)
+		self.assertIs(self.graph.getFlowField(goal, list(gates)), field)
+		self.assertIsNot(self.graph.getFlowField(goal, []), field)
+		self.assertIsNone(self.graph.getFlowField((-1, -1), gates))
+
+
+############################
+### PathScheduler
+
+class TestPathScheduler(unittest.TestCase):
+
+	def setUp(self):
+		self.graph = PathGraph(gridNetwork(random.Random(11), 20, 20, 40))
+		self.gates = tuple(gridGates(20, 20, 40))
+		self.start, self.end = self.graph.nodes[0], self.graph.nodes[-1]
+		self.expected, _ = PathGraph(self.graph.network).search(self.start, self.end, self.graph.blockedEdges(self.gates))
+
+	def submit(self, scheduler, results, key = 'path'):
+		scheduler.submit(key, self.graph.cachedPathSteps(self.start, self.end, self.gates, False, 8), lambda result: results.append(result[0]))
+
+	### Without a budget, the callback is called before submit() returns
+	def testNoBudget(self):
+		scheduler = core.PathScheduler()
+		results = []
+		self.submit(scheduler, results)
+		self.assertGreater(len(self.expected), 0)
+		self.assertEqual(results, [self.expected])
+		self.assertEqual((scheduler.pending(), scheduler.completed), (0, 1))
+
+	### With a budget, a search is spread over updates and gives the same path
+	def testBudget(self):
+		scheduler = core.PathScheduler(1)
+		results = []
+		self.submit(scheduler, results)
+		self.assertEqual((results, scheduler.pending()), ([], 1))
+		updates = 0
+		while scheduler.pending() > 0:
+			scheduler.update()
+			updates = updates + 1
+		self.assertGreater(updates, 1)
+		self.assertEqual(results, [self.expected])
+
+	### Identical requests in flight share one search, and every requester gets the path
+	def testCoalescing(self):
+		scheduler = core.PathScheduler(1)
+		results = []
+		for _ in range(3):
+			self.submit(scheduler, results)
+		self.submit(scheduler, results, 'other')
+		self.assertEqual((scheduler.pending(), scheduler.coalesced), (2, 2))
+		while scheduler.pending() > 0:
+			scheduler.update()
+		self.assertEqual(results, [self.expected] * 4)
+		self.assertEqual(scheduler.completed, 2)
+
+	### Removing the budget finishes the requests in flight
+	def testRemoveBudget(self):
+		scheduler = core.PathScheduler(1)
+		results = []
+		self.submit(scheduler, results)
+		scheduler.setBudget(None)
+		self.assertEqual((results, scheduler.pending()), ([self.expected], 0))
+
+
+############################
+### DistanceField
+
+class TestDistanceField(unittest.TestCase):
+
+	def setUp(self):
+		rand = random.Random(6)
+		self.polygons = []
+		for _ in range(25):
+			cx, cy, r, n = rand.uniform(100, 900), rand.uniform(100, 900), rand.uniform(10, 60), rand.randint(3, 7)
+			self.polygons.append([(cx + r * math.cos(2 * math.pi * k / n), cy + r * math.sin(2 * math.pi * k / n)) for k in range(n)])
+		self.lines = [(p[k], p[(k+1) % len(p)]) for p in self.polygons for k in range(len(p))]
+		self.points = [(rand.uniform(-50, 1050), rand.uniform(-50, 1050)) for _ in range(400)]
+
+	### The signed distance from minimumDistance and a crossing-number inside test, one point and line at a time
+	def exact(self, point):
+		d = min(minimumDistance(l, point) for l in self.lines)
+		inside = False
+		for poly in self.polygons:
+			crossings = 0
+			for (x1, y1), (x2, y2) in zip(poly[-1:] + poly[:-1], poly):
+				if (y1 > point[1]) != (y2 > point[1]) and point[0] < x1 + (point[1] - y1) * (x2 - x1) / (y2 - y1):
+					crossings = crossings + 1
+			inside = inside or crossings % 2 == 1
+		return -d if inside else d
+
+	def testSignedDistancesExact(self):
+		expected = [self.exact(p) for p in self.points]
+		for block in (8, 64, 500):
+			distances = signedDistances(self.points, self.lines, self.polygons, block)
+			for d, e in zip(distances, expected):
+				self.assertAlmostEqual(d, e, places = 6)
+		self.assertTrue(any(e < 0 for e in expected))
+
+	def testFieldSamples(self):
+		field = DistanceField((1000, 1000), self.lines, self.polygons, 25)
+		rows, columns = field.field.shape
+		for row in range(0, rows, 3):
+			for column in range(0, columns, 3):
+				self.assertAlmostEqual(field.field[row, column], self.exact((column * 25.0, row * 25.0)), places = 6)
+
+	def testNoLines(self):
+		self.assertEqual(list(signedDistances([(1, 2), (3, 4)], [], [])), [INFINITY, INFINITY])
+		self.assertEqual(len(signedDistances([], self.lines, self.polygons)), 0)
+
+
+############################
+### MapBundle
+
+BUILDER = """
+from helper import scale
+
+def build():
+	return [(scale(1), 2.0)]
+"""
+
+HELPER = """
+def scale(x):
+	return x * %d
+"""
+
+class TestMapBundle(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		sys.path.insert(0, self.directory)
+		self.write('builder.py', BUILDER)
+		self.write('helper.py', HELPER % 1)
+
+	def tearDown(self):
+		sys.path.remove(self.directory)
+		for name in ('builder', 'helper'):
+			sys.modules.pop(name, None)
+		shutil.rmtree(self.directory)
+
+	def write(self, name, text):
+		with open(os.path.join(self.directory, name), 'w') as f:
+			f.write(text)
+
+	### Imports builder.py afresh, as a new run would
+	def importBuilder(self):
+		for name in ('builder', 'helper'):
+			sys.modules.pop(name, None)
+		importlib.invalidate_caches()
+		return importlib.import_module('builder')
+
+	def testBuilderKeyFollowsCalledCode(self):
+		builder = self.importBuilder()
+		key = core.builderKey(builder.build)
+		self.assertEqual(core.builderKey(builder.build), key)
+		self.assertEqual(core.builderKey(lambda: builder.build()), core.builderKey(lambda: builder.build()))
+		self.write('helper.py', HELPER % 3)
+		self.assertNotEqual(core.builderKey(self.importBuilder().build), key)
+
+	### The same code checked out somewhere else has the same key, so bundles can be shared between checkouts
+	def testBuilderKeyIgnoresLocation(self):
+		key = core.builderKey(self.importBuilder().build)
+		sys.path.remove(self.directory)
+		other = tempfile.mkdtemp()
+		try:
+			for name in ('builder.py', 'helper.py'):
+				shutil.copy(os.path.join(self.directory, name), other)
+			sys.path.insert(0, other)
+			self.assertEqual(core.builderKey(self.importBuilder().build), key)
+		finally:
+			sys.path.remove(other)
+			sys.path.insert(0, self.directory)
+			shutil.rmtree(other)
+
+	### Changing the code of a builder rebuilds the artifact on the next run, even though the terrain is the same
+	def testStaleArtifactIsRebuilt(self):
+		path = os.path.join(self.directory, 'bundle.npz')
+		bundle = core.MapBundle('terrain', path)
+		self.assertEqual(bundle.get('points', 'points', self.importBuilder().build), [(1.0, 2.0)])
+		bundle.save()
+		bundle = core.MapBundle('terrain', path)
+		self.assertEqual(bundle.get('points', 'points', self.importBuilder().build), [(1.0, 2.0)])
+		self.write('helper.py', HELPER % 3)
+		bundle = core.MapBundle('terrain', path)
+		self.assertFalse(bundle.has('points', self.importBuilder().build))
+		self.assertEqual(bundle.get('points', 'points', self.importBuilder().build), [(3.0, 2.0)])
+		bundle.save()
+		self.assertTrue(core.MapBundle('terrain', path).has('points', self.importBuilder().build))
+
+	### Artifacts are kept in memory until save(), which writes them all at once
+	def testOneWritePerSave(self):
+		path = os.path.join(self.directory, 'bundle.npz')
+		bundle = core.MapBundle('terrain', path)
+		bundle.put('nodes', 'points', [(1, 2), (3, 4)])
+		bundle.put('edges', 'lines', [((1, 2), (3, 4))])
+		bundle.put('mesh', 'polygons', [[(0, 0), (1, 0), (0, 1)]])
+		self.assertFalse(os.path.exists(path))
+		self.assertEqual(bundle.load('nodes', 'points'), [(1, 2), (3, 4)])
+		bundle.save()
+		written = os.path.getmtime(path)
+		os.utime(path, (written - 10, written - 10))
+		bundle.save()
+		self.assertEqual(os.path.getmtime(path), written - 10)
+		bundle = core.MapBundle('terrain', path)
+		self.assertEqual(bundle.load('edges', 'lines'), [((1, 2), (3, 4))])
+		self.assertEqual(bundle.load('mesh', 'polygons'), [[(0, 0), (1, 0), (0, 1)]])
+
+
+
+############################
+### Headless worlds
+
+class TestHeadlessRun(unittest.TestCase):
+
+	### The sprites are loaded relative to the assignment's directory
+	def setUp(self):
+		self.cwd = os.getcwd()
+		os.chdir(ENGINE)
+
+	def tearDown(self):
+		os.chdir(self.cwd)
+
+	def makeWorld(self):
+		world = core.GameWorld(1, (500, 500), (500, 500), headless = True)
+		agent = core.Agent(AGENT, (250, 250), 0, SPEED, world)
+		world.initializeTerrain([[(100, 100), (200, 100), (200, 200), (100, 200)]])
+		world.setPlayerAgent(agent)
+		return world
+
+	### A headless run() needs a way to end, and returns when it comes
+	def testRunReturns(self):
+		world = self.makeWorld()
+		self.assertRaises(ValueError, world.run)
+		self.assertFalse(world.run(ticks = 5))
+		self.assertEqual(world.ticks, 5)
+		self.assertTrue(world.run(until = lambda w: w.ticks >= 12))
+		self.assertEqual(world.ticks, 12)
+		self.assertFalse(world.run(3, lambda w: False))
+		self.assertEqual(world.ticks, 15)
+		self.assertTrue(world.run(100, lambda w: w.ticks >= 20))
+		self.assertEqual(world.ticks, 20)
+
+
+############################
+### Match logs (MatchRecorder, MatchReplay)
+
+### The bytes of a match log holding what a MatchReplay parsed. Within a tick the events are written before the spawns.
+def encodeMatchLog(replay):
+	kinds = {KEYDOWN: core.MATCHLOGKEY, MOUSEBUTTONUP: core.MATCHLOGMOUSE, QUIT: core.MATCHLOGQUIT}
+	def record(kind, *fields):
+		return bytes((kind,)) + core.MATCHLOGFIELDS[kind].pack(*fields)
+	header = json.dumps(replay.header).encode()
+	data = core.MATCHLOGMAGIC + struct.pack('<I', len(header)) + header
+	data = data + b''.join(record(core.MATCHLOGSPAWN, *spawn) for spawn in replay.setup)
+	for delta, events, spawns in replay.ticks:
+		data = data + record(core.MATCHLOGTICK, delta)
+		for type, code, mouse in events:
+			data = data + (record(kinds[type]) if type == QUIT else record(kinds[type], code, *mouse))
+		data = data + b''.join(record(core.MATCHLOGSPAWN, *spawn) for spawn in spawns)
+	return data
+
+class TestMatchReplay(unittest.TestCase):
+
+	TICKS = 200
+
+	def setUp(self):
+		self.cwd = os.getcwd()
+		os.chdir(ENGINE)
+		self.directory = tempfile.mkdtemp()
+		self.log = os.path.join(self.directory, 'match.log')
+
+	def tearDown(self):
+		core.match_log = None
+		os.chdir(self.cwd)
+		shutil.rmtree(self.directory)
+
+	### Two bases, a tower each and a square in the middle, with minions built every 30 ticks so that a short match spawns
+	### plenty. The minions print as they think.
+	def makeWorld(self):
+		import moba, MyMinion, astarnavigator2, mybuildpathnetwork
+		with contextlib.redirect_stdout(io.StringIO()):
+			world = moba.MOBAWorld(SEED, (600, 600), (600, 600), 0, 60, headless = True)
+			agent = moba.Hero((300, 300), 0, world)
+			agent.team = 0
+			world.setPlayerAgent(agent)
+			world.initializeTerrain([[(250, 250), (350, 250), (350, 350), (250, 350)]], (0, 0, 0), 4)
+			agent.setNavigator(core.Navigator())
+			nav = astarnavigator2.AStarNavigator2()
+			nav.agent = agent
+			nav.setWorld(world)
+			nav.pathnodes = [(100, 100), (500, 100), (500, 500), (100, 500)]
+			nav.pathnetwork = mybuildpathnetwork.myBuildPathNetwork(nav.pathnodes, world, agent)
+			for team, base, tower in ((1, (50, 50), (150, 60)), (2, (550, 550), (450, 540))):
+				b = moba.Base(BASE, base, world, team, MyMinion.MyMinion, 30)
+				b.setNavigator(nav)
+				world.addBase(b)
+				world.addTower(moba.Tower(TOWER, tower, world, team))
+		return world
+
+	### Wraps log.spawn() to also note (tick, spawn record) for every spawn
+	def noteSpawns(self, log):
+		spawns = []
+		spawn = log.spawn
+		def noted(npc):
+			spawns.append((npc.world.ticks, core.spawnRecord(npc)))
+			spawn(npc)
+		log.spawn = noted
+		return spawns
+
+	### A headless match replays to the same spawns, on the same ticks, and leaves every NPC where the match did
+	def testReplayMatchesRecording(self):
+		recorder = core.recordMatch(self.log, 'test.py', ['--small'])
+		recorded = self.noteSpawns(recorder)
+		world = self.makeWorld()
+		self.assertIs(recorder.world, world)
+		with contextlib.redirect_stdout(io.StringIO()):
+			world.run(self.TICKS)
+		recorder.close()
+		self.assertIsNone(core.match_log)
+		self.assertGreater(len(set(tick for tick, spawn in recorded)), 2)
+		replay = core.replayMatch(self.log)
+		replayed = self.noteSpawns(replay)
+		again = self.makeWorld()
+		with contextlib.redirect_stdout(io.StringIO()):
+			replay.play()
+		self.assertIs(replay.world, again)
+		self.assertIsNone(replay.divergence)
+		self.assertEqual(len(replay.ticks), self.TICKS)
+		self.assertEqual(again.ticks, self.TICKS)
+		self.assertEqual(replayed, recorded)
+		self.assertEqual([(type(npc), npc.getLocation()) for npc in again.npcs], [(type(npc), npc.getLocation()) for npc in world.npcs])
+
+	### A log parses back to what was written, and writing the parse again gives the same bytes
+	def testLogRoundTrips(self):
+		recorder = core.MatchRecorder(self.log, 'runmoba.py', ['2'])
+		recorder.attach(None, 7, 1234.5, True)
+		recorder.write(core.MATCHLOGSPAWN, 11, 75.0, 80.5)
+		recorder.startTick(16)
+		recorder.write(core.MATCHLOGKEY, K_d, 300, 200)
+		recorder.write(core.MATCHLOGSPAWN, 12, 1125.25, 1125.0)
+		recorder.startTick(70000)
+		recorder.write(core.MATCHLOGMOUSE, 3, -5, 899)
+		recorder.write(core.MATCHLOGQUIT)
+		recorder.close()
+		replay = core.MatchReplay(self.log)
+		self.assertEqual(replay.header, {'script': 'runmoba.py', 'argv': ['2'], 'seed': 7, 'time': 1234.5})
+		self.assertEqual(replay.setup, [(11, 75.0, 80.5)])
+		self.assertEqual(replay.ticks, [(16, [(KEYDOWN, K_d, (300, 200))], [(12, 1125.25, 1125.0)]),
+			(65535, [(MOUSEBUTTONUP, 3, (-5, 899)), (QUIT, None, (0, 0))], [])])
+		with open(self.log, 'rb') as f:
+			self.assertEqual(encodeMatchLog(replay), f.read())
+		with open(self.log, 'wb') as f:
+			f.write(b'not a log')
+		self.assertRaises(ValueError, core.MatchReplay, self.log)
+
+
+if __name__ == '__main__':
+	unittest.main()